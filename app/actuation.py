@@ -0,0 +1,288 @@
+"""
+Actuation Executor
+Runs switch changes on a small pool of dedicated threads, stops ahead of starts
+"""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_STOP = 0
+PRIORITY_START = 1
+PRIORITY_RECORD = 2
+
+# Enough that one Home Assistant call stuck in a timeout doesn't hold up other zones
+DEFAULT_WORKERS = int(os.getenv('ACTUATION_WORKERS', '4'))
+
+def percentiles(samples, points=(50, 95, 99)) -> Dict:
+    """Nearest-rank percentiles plus max of a sequence of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0}
+    result = {'count': len(ordered), 'max': round(ordered[-1], 2)}
+    for point in points:
+        index = min(len(ordered) - 1, max(0, int(round(point / 100 * len(ordered))) - 1))
+        result[f'p{point}'] = round(ordered[index], 2)
+    return result
+
+class ActuationExecutor:
+    """Bounded pool of threads for starting and stopping waterings
+
+    Web requests, the scheduler, sensor triggers and stop timers only enqueue
+    work here, so a slow dashboard query never holds up a pump turning off,
+    and zones due in the same minute start side by side rather than one
+    after another. Work submitted with the same key (a zone id) runs one item
+    at a time in submission order, so a zone can't start twice or stop before
+    it started. Each worker reserves its own database connection; Home
+    Assistant switch calls go through a reserved session sized to the pool.
+    With inline=True work runs on the caller's thread instead, which keeps
+    simulations deterministic.
+    """
+
+    def __init__(self, db=None, inline: bool = False, workers: int = DEFAULT_WORKERS):
+        self.db = db
+        self.inline = inline
+        self.workers = max(1, workers)
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        # Keys with an item running, and items waiting behind them
+        self._busy_keys = {}
+        self._keys_lock = threading.Lock()
+        self._queue_waits = deque(maxlen=1000)
+        self._stats_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'deferred': 0, 'peak_busy': 0}
+        self._busy = 0
+
+    def start(self):
+        with self._start_lock:
+            if self.inline or self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'actuation-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Actuation executor started with {self.workers} workers")
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_START, key: Hashable = None) -> Future:
+        """Queue func(*args); stops (PRIORITY_STOP) jump ahead of queued starts
+
+        Items sharing a key never run concurrently and run in the order they
+        were submitted.
+        """
+        future = Future()
+        with self._stats_lock:
+            self.stats['submitted'] += 1
+        if self.inline:
+            self._execute(func, args, future)
+            return future
+
+        self.start()
+        self._queue.put((priority, next(self._sequence), time.monotonic(), key, func, args, future))
+        return future
+
+    def _execute(self, func: Callable, args: tuple, future: Future):
+        try:
+            future.set_result(func(*args))
+            outcome = 'completed'
+        except Exception as e:
+            logger.exception(f"Actuation {getattr(func, '__name__', func)} failed: {e}")
+            future.set_exception(e)
+            outcome = 'failed'
+        with self._stats_lock:
+            self.stats[outcome] += 1
+
+    def _claim(self, item: tuple) -> bool:
+        """Mark an item's key busy, or park the item behind the one running"""
+        key = item[3]
+        if key is None:
+            return True
+        with self._keys_lock:
+            if key in self._busy_keys:
+                self._busy_keys[key].append(item)
+                with self._stats_lock:
+                    self.stats['deferred'] += 1
+                return False
+            self._busy_keys[key] = deque()
+            return True
+
+    def _next_for(self, key: Hashable):
+        """Take the next parked item for a key, or free the key if there is none"""
+        if key is None:
+            return None
+        with self._keys_lock:
+            waiting = self._busy_keys[key]
+            if waiting:
+                return waiting.popleft()
+            del self._busy_keys[key]
+            return None
+
+    def _run(self):
+        if self.db is not None:
+            self.db.reserve_connection()
+        while True:
+            item = self._queue.get()
+            if not self._claim(item):
+                continue
+            # Drain the key's parked items here so its order is kept
+            while item is not None:
+                _, _, enqueued_at, key, func, args, future = item
+                self._queue_waits.append((time.monotonic() - enqueued_at) * 1000)
+                with self._stats_lock:
+                    self._busy += 1
+                    self.stats['peak_busy'] = max(self.stats['peak_busy'], self._busy)
+                try:
+                    self._execute(func, args, future)
+                finally:
+                    with self._stats_lock:
+                        self._busy -= 1
+                item = self._next_for(key)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'inline': self.inline,
+            'workers': self.workers,
+            'busy': self._busy,
+            'queued': self._queue.qsize(),
+            'queue_wait_ms': percentiles(list(self._queue_waits))
+        }
+
+def benchmark(zones: int = 200, waterings: int = 200, readers: int = 32, read_limit: int = 4,
+              duration_s: float = 2.0) -> Dict:
+    """Measure stop-deadline overshoot while dashboard-style reads hammer the database
+
+    Runs the same batch of short waterings three ways: stops on the old
+    timer threads with unbounded readers, on the actuation pool with
+    unbounded readers, and on the actuation pool with readers behind an
+    admission gate of read_limit.
+    """
+    import tempfile
+    from admission import AdmissionGate
+    from database import IrrigationDatabase
+    from irrigation_controller import IrrigationController
+    from simulator import RecordingHomeAssistant, build_fixture
+    from clock import SystemClock
+
+    results = {'zones': zones, 'waterings': waterings, 'readers': readers, 'duration_s': duration_s}
+    with tempfile.TemporaryDirectory(prefix='irrigation-actuation-') as tmp:
+        db = IrrigationDatabase(os.path.join(tmp, 'irrigation.db'))
+        build_fixture(db, zones)
+        zone_ids = [zone.id for zone in db.get_zones()]
+        for zone_id in zone_ids:
+            db.log_water_usage(zone_id, db.get_zone(zone_id).room_id, 1.0, 1)
+
+        for label, inline, limit in (('timer_threads', True, None),
+                                     ('actuation_pool', False, None),
+                                     ('actuation_pool_admission', False, read_limit)):
+            clock = SystemClock()
+            controller = IrrigationController(
+                db=db, ha=RecordingHomeAssistant(clock), clock=clock,
+                actuator=ActuationExecutor(db, inline=inline)
+            )
+            controller.is_leader = True
+            gate = AdmissionGate(limit or readers, wait=0.05)
+            stop = threading.Event()
+            reads = {'served': 0}
+
+            def reader():
+                while not stop.is_set():
+                    if not gate.try_enter():
+                        time.sleep(0.05)
+                        continue
+                    try:
+                        controller.get_detailed_stats()
+                        controller.get_status()
+                        [zone.to_dict() for zone in controller.get_zones()]
+                        reads['served'] += 1
+                    finally:
+                        gate.leave()
+
+            threads = [threading.Thread(target=reader, daemon=True) for _ in range(readers)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+
+            for i in range(waterings):
+                zone_id = zone_ids[i % len(zone_ids)]
+                controller.request_watering(zone_id, duration_s / 60, 'manual')
+            deadline = time.monotonic() + duration_s + 30
+            while ((controller.get_actuation_stats()['stop_overshoot_ms']['count'] < waterings
+                    or controller.active_waterings) and time.monotonic() < deadline):
+                time.sleep(0.05)
+
+            stop.set()
+            for thread in threads:
+                thread.join()
+            results[label] = {
+                'stop_overshoot_ms': controller.get_actuation_stats()['stop_overshoot_ms'],
+                'reads_served': reads['served'],
+                'reads_rejected': gate.get_stats()['rejected']
+            }
+    return results
+
+def benchmark_skew(zones: int = 10, ha_latency: float = 0.1, stuck_seconds: float = 3.0,
+                   pool_sizes=(1, 4, 8)) -> Dict:
+    """Measure start lag and skew for zones scheduled in the same minute
+
+    Every switch call takes ha_latency seconds, and the first zone's solenoid
+    call hangs for stuck_seconds as if Home Assistant timed out. One worker is
+    the old behaviour of starting due zones one after another.
+    """
+    import tempfile
+    from database import IrrigationDatabase
+    from irrigation_controller import IrrigationController
+    from simulator import RecordingHomeAssistant, build_fixture
+    from clock import SystemClock
+
+    class SlowHomeAssistant(RecordingHomeAssistant):
+        def _switch(self, entity_id: str, action: str) -> bool:
+            time.sleep(stuck_seconds if entity_id == stuck_entity and action == 'turn_on' else ha_latency)
+            return super()._switch(entity_id, action)
+
+    results = {'zones': zones, 'ha_latency_s': ha_latency, 'stuck_seconds': stuck_seconds}
+    for workers in pool_sizes:
+        with tempfile.TemporaryDirectory(prefix='irrigation-skew-') as tmp:
+            db = IrrigationDatabase(os.path.join(tmp, 'irrigation.db'))
+            entity_zones = build_fixture(db, zones)
+            stuck_entity = next(iter(entity_zones))
+            zone_ids = [entity_zones[entity] for entity in entity_zones]
+
+            clock = SystemClock()
+            controller = IrrigationController(
+                db=db, ha=SlowHomeAssistant(clock), clock=clock,
+                actuator=ActuationExecutor(db, workers=workers)
+            )
+            controller.is_leader = True
+            due_at = clock.now()
+            for zone_id in zone_ids:
+                controller._fire_schedule({'zone_id': zone_id, 'duration': 60, 'fire_at': due_at})
+
+            deadline = time.monotonic() + zones * (stuck_seconds + 2 * ha_latency) + 10
+            while len(controller._start_lags) < zones and time.monotonic() < deadline:
+                time.sleep(0.02)
+            stats = controller.get_actuation_stats()
+            lags = sorted(lag for _, lag in controller._start_lags)
+            results[f'workers_{workers}'] = {
+                'started': len(lags),
+                'start_lag_ms': stats['start_lag_ms'],
+                'start_skew_ms': stats['start_skew_ms'].get('max'),
+                # Skew among the zones that weren't stuck
+                'start_skew_excluding_stuck_ms': round(lags[-2] - lags[0], 2) if len(lags) > 2 else None
+            }
+    return results
+
+if __name__ == '__main__':
+    import json
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps({'stop_overshoot': benchmark(), 'start_skew': benchmark_skew()}, indent=2))
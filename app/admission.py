@@ -0,0 +1,43 @@
+"""
+Admission control
+Bounds how many read requests run at once so they can't starve actuation
+"""
+
+import threading
+from typing import Dict
+
+class AdmissionGate:
+    """Counting gate for read endpoints
+
+    Up to `limit` requests run concurrently. A request that can't get a slot
+    within `wait` seconds is rejected so the caller can answer 503 rather than
+    piling up more threads.
+    """
+
+    def __init__(self, limit: int = 4, wait: float = 0.5):
+        self.limit = limit
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'admitted': 0, 'rejected': 0, 'peak_in_flight': 0}
+
+    def try_enter(self) -> bool:
+        if not self._slots.acquire(timeout=self.wait):
+            with self._lock:
+                self.stats['rejected'] += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'limit': self.limit, 'in_flight': self.in_flight}
@@ -0,0 +1,93 @@
+"""
+Static assets
+Resolves fingerprinted bundle names and serves precompressed variants
+"""
+
+import json
+import logging
+import mimetypes
+import os
+from flask import abort, request, send_file
+
+logger = logging.getLogger(__name__)
+
+# Hashed file names change whenever their contents do, so they can be cached forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+class AssetManifest:
+    """Maps source asset names to the hashed names emitted by www/build.js"""
+
+    def __init__(self, dist_dir: str = '/www/static/dist', src_dir: str = '/www/src'):
+        self.dist_dir = dist_dir
+        self.src_dir = src_dir
+        self._manifest = None
+        self._mtime = None
+
+    def _load(self) -> dict:
+        path = os.path.join(self.dist_dir, 'manifest.json')
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            if self._manifest is None:
+                logger.warning("No asset manifest found, serving unbundled sources from www/src")
+                self._manifest = {}
+            return self._manifest
+
+        if mtime != self._mtime:
+            with open(path) as f:
+                self._manifest = json.load(f)
+            self._mtime = mtime
+        return self._manifest
+
+    def url(self, name: str) -> str:
+        """Get the URL for an asset, falling back to the unbuilt source"""
+        hashed = self._load().get(name)
+        if hashed:
+            return f'/static/dist/{hashed}'
+        return f'/src/{name}'
+
+    def send_dist(self, filename: str):
+        """Serve a built asset, choosing a precompressed variant the client accepts"""
+        path = os.path.realpath(os.path.join(self.dist_dir, filename))
+        if not path.startswith(os.path.realpath(self.dist_dir) + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        accepted = request.headers.get('Accept-Encoding', '')
+
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                response = send_file(path + suffix, mimetype=mimetype, max_age=31536000, conditional=True)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_file(path, mimetype=mimetype, max_age=31536000, conditional=True)
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def send_named(self, name: str):
+        """Serve a built asset under its stable source name, for pages that can't read the manifest
+
+        Used by the dashboard cards, which live outside the add-on. The URL
+        doesn't change with the contents, so it is cached for a day only.
+        """
+        hashed = self._load().get(name)
+        if not hashed:
+            abort(404)
+        response = self.send_dist(hashed)
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+        return response
+
+    def send_src(self, filename: str):
+        """Serve an unbuilt source asset (development fallback), never cached"""
+        path = os.path.realpath(os.path.join(self.src_dir, filename))
+        if not path.startswith(os.path.realpath(self.src_dir) + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        response = send_file(path, max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,344 @@
+"""
+Database Backup
+Online, incremental backups of irrigation.db with rotation, verification and restore
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKUP_NAME = re.compile(r'^irrigation-(\d{8}-\d{6})(-[a-z0-9-]+)?\.db(\.gz)?$')
+
+# Tables a file must have before it can replace the live database
+REQUIRED_TABLES = ('rooms', 'zones', 'schedules', 'water_usage')
+
+class _TooManyRestarts(Exception):
+    pass
+
+class DatabaseBackup:
+    """Copies the live database to <root>/irrigation-YYYYmmdd-HHMMSS.db[.gz]
+
+    Copies go through SQLite's online backup API `pages` at a time, pausing
+    `sleep` seconds between steps so the scheduler and actuation thread can
+    write in between. A write from another connection makes SQLite restart the
+    copy; after `max_restarts` the remaining copy is done in a single step,
+    which in WAL mode still doesn't block writers. Every backup is checked
+    with PRAGMA integrity_check before it is kept, and only the newest `keep`
+    nightly and the newest `keep` pre-restore backups are retained.
+    """
+
+    def __init__(self, db_path: str, root: str = '/data/backups', keep: int = 7,
+                 compress: bool = True, pages: int = 64, sleep: float = 0.005, max_restarts: int = 5):
+        self.db_path = db_path
+        self.root = root
+        self.keep = keep
+        self.compress = compress
+        self.pages = pages
+        self.sleep = sleep
+        self.max_restarts = max_restarts
+        self._lock = threading.Lock()
+        self.last_result = None
+
+    def create(self, label: str = '', compress: bool = None, rotate: bool = True) -> Dict:
+        """Take a verified backup now and rotate old ones"""
+        compress = self.compress if compress is None else compress
+        label = re.sub(r'[^a-z0-9-]+', '-', label.lower()).strip('-')
+        with self._lock:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                name = f"irrigation-{datetime.now():%Y%m%d-%H%M%S}{'-' + label if label else ''}.db"
+                partial = os.path.join(self.root, name + '.partial')
+
+                started = time.monotonic()
+                copy = self._copy(partial)
+                check = self._integrity_check(partial)
+                if check != 'ok':
+                    os.remove(partial)
+                    return {'success': False, 'error': f'Backup failed integrity check: {check}'}
+
+                if compress:
+                    with open(partial, 'rb') as src, gzip.open(partial + '.gz', 'wb', compresslevel=6) as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    os.remove(partial)
+                    partial, name = partial + '.gz', name + '.gz'
+                os.replace(partial, os.path.join(self.root, name))
+
+                result = {
+                    'success': True,
+                    'backup': self._describe(name),
+                    'seconds': round(time.monotonic() - started, 3),
+                    **copy,
+                    'removed': self.rotate() if rotate else []
+                }
+                logger.info(f"Backed up database to {name} in {result['seconds']}s "
+                            f"({copy['steps']} steps, {copy['restarts']} restarts)")
+            except Exception as e:
+                logger.error(f"Error backing up database: {e}")
+                result = {'success': False, 'error': str(e)}
+            self.last_result = result
+            return result
+
+    def _copy(self, path: str) -> Dict:
+        """Copy the live database into path in small steps"""
+        progress = {'steps': 0, 'restarts': 0, 'remaining': None, 'pages': 0}
+
+        def on_progress(status, remaining, total):
+            progress['steps'] += 1
+            progress['pages'] = total
+            if progress['remaining'] is not None and remaining > progress['remaining']:
+                progress['restarts'] += 1
+                if progress['restarts'] > self.max_restarts:
+                    raise _TooManyRestarts()
+            progress['remaining'] = remaining
+
+        # Read-only source so a backup can never write to the live database
+        source = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=10)
+        target = sqlite3.connect(path)
+        try:
+            try:
+                source.backup(target, pages=self.pages, progress=on_progress, sleep=self.sleep)
+            except _TooManyRestarts:
+                logger.info("Database kept changing during backup, finishing in one step")
+                source.backup(target)
+            # Backups are single files; the live database's WAL mode is restored on restore
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+            source.close()
+        return {'steps': progress['steps'], 'restarts': progress['restarts'], 'pages': progress['pages']}
+
+    @staticmethod
+    def _integrity_check(path: str) -> str:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            rows = conn.execute('PRAGMA integrity_check').fetchall()
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+        problems = [row[0] for row in rows if row[0] != 'ok']
+        missing = [table for table in REQUIRED_TABLES if table not in tables]
+        if missing:
+            problems.append(f"missing tables: {', '.join(missing)}")
+        return '; '.join(problems[:5]) or 'ok'
+
+    def rotate(self) -> List[str]:
+        """Delete all but the newest `keep` scheduled and `keep` pre-restore backups
+
+        Other labelled backups (manual, uploaded) are kept until deleted.
+        """
+        backups = self.list_backups()
+        removed = []
+        for label in (None, 'pre-restore'):
+            removed += [b['name'] for b in backups if b['label'] == label][self.keep:]
+        for name in removed:
+            os.remove(os.path.join(self.root, name))
+            logger.info(f"Removed old backup {name}")
+        return removed
+
+    def _describe(self, name: str) -> Dict:
+        match = BACKUP_NAME.match(name)
+        stat = os.stat(os.path.join(self.root, name))
+        return {
+            'name': name,
+            'created_at': datetime.strptime(match.group(1), '%Y%m%d-%H%M%S').isoformat(),
+            'label': (match.group(2) or '').lstrip('-') or None,
+            'compressed': bool(match.group(3)),
+            'size': stat.st_size
+        }
+
+    def list_backups(self) -> List[Dict]:
+        """Backups on disk, newest first"""
+        try:
+            names = [name for name in os.listdir(self.root) if BACKUP_NAME.match(name)]
+        except FileNotFoundError:
+            return []
+        return sorted((self._describe(name) for name in names), key=lambda b: b['name'], reverse=True)
+
+    def path_for(self, name: str) -> Optional[str]:
+        """Full path of a backup by name, or None if it isn't a backup in root"""
+        if not BACKUP_NAME.match(name):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def delete(self, name: str) -> Dict:
+        path = self.path_for(name)
+        if not path:
+            return {'success': False, 'error': 'Backup not found'}
+        os.remove(path)
+        logger.info(f"Deleted backup {name}")
+        return {'success': True}
+
+    def add_upload(self, stream) -> Dict:
+        """Store an uploaded database or .db.gz file as a labelled backup after verifying it"""
+        os.makedirs(self.root, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.root, suffix='.upload', delete=False) as f:
+            shutil.copyfileobj(stream, f, 1024 * 1024)
+        try:
+            with open(f.name, 'rb') as check:
+                compressed = check.read(2) == b'\x1f\x8b'
+            result = self._verify_file(f.name, compressed)
+            if not result['success']:
+                return result
+            name = f"irrigation-{datetime.now():%Y%m%d-%H%M%S}-uploaded.db{'.gz' if compressed else ''}"
+            os.replace(f.name, os.path.join(self.root, name))
+            return {'success': True, 'backup': self._describe(name)}
+        finally:
+            if os.path.exists(f.name):
+                os.remove(f.name)
+
+    def verify(self, name: str) -> Dict:
+        """Run an integrity check on a stored backup"""
+        path = self.path_for(name)
+        if not path:
+            return {'success': False, 'error': 'Backup not found'}
+        return self._verify_file(path, name.endswith('.gz'))
+
+    def _verify_file(self, path: str, compressed: bool) -> Dict:
+        try:
+            with _Expanded(path, compressed, os.path.dirname(self.db_path)) as db_file:
+                check = self._integrity_check(db_file)
+        except (OSError, sqlite3.DatabaseError) as e:
+            return {'success': False, 'error': f'Not a usable database: {e}'}
+        if check != 'ok':
+            return {'success': False, 'error': f'Backup failed integrity check: {check}'}
+        return {'success': True, 'integrity': 'ok'}
+
+    def restore(self, name: str) -> Dict:
+        """Replace the live database's contents with a verified backup
+
+        The copy runs as one backup step into the live database, which SQLite
+        applies as a single write transaction, so other connections see either
+        the old contents or the new ones. The current database is backed up
+        first with the label 'pre-restore'.
+        """
+        path = self.path_for(name)
+        if not path:
+            return {'success': False, 'error': 'Backup not found'}
+
+        with _Expanded(path, name.endswith('.gz'), os.path.dirname(self.db_path)) as db_file:
+            check = self._integrity_check(db_file)
+            if check != 'ok':
+                return {'success': False, 'error': f'Backup failed integrity check: {check}'}
+
+            # Rotated after the copy, so it can't remove the backup being restored
+            safety = self.create(label='pre-restore', rotate=False)
+            if not safety['success']:
+                return {'success': False, 'error': f"Could not back up current database: {safety['error']}"}
+
+            with self._lock:
+                source = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+                target = sqlite3.connect(self.db_path, timeout=30)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                    source.close()
+                self.rotate()
+
+        logger.warning(f"Restored database from {name}")
+        return {'success': True, 'restored': name, 'pre_restore_backup': safety['backup']['name']}
+
+    def get_status(self) -> Dict:
+        backups = self.list_backups()
+        return {
+            'root': self.root,
+            'keep': self.keep,
+            'compress': self.compress,
+            'count': len(backups),
+            'total_bytes': sum(b['size'] for b in backups),
+            'latest': backups[0] if backups else None,
+            'last_result': self.last_result
+        }
+
+class _Expanded:
+    """Gunzips a backup to a temporary file next to the database, if needed"""
+
+    def __init__(self, path: str, compressed: bool, directory: str):
+        self.path = path
+        self.compressed = compressed
+        self.directory = directory
+        self._temp = None
+
+    def __enter__(self) -> str:
+        if not self.compressed:
+            return self.path
+        fd, self._temp = tempfile.mkstemp(dir=self.directory, suffix='.restore')
+        with os.fdopen(fd, 'wb') as dst, gzip.open(self.path, 'rb') as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return self._temp
+
+    def __exit__(self, *exc):
+        if self._temp and os.path.exists(self._temp):
+            os.remove(self._temp)
+
+def benchmark(zones: int = 1000, days: int = 90, writers_hz: float = 5.0) -> Dict:
+    """Back up a database with months of usage while a writer logs usage, and time the writes"""
+    import random
+    import uuid
+
+    from actuation import percentiles
+    from database import IrrigationDatabase
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory(prefix='irrigation-backup-') as tmp:
+        db = IrrigationDatabase(os.path.join(tmp, 'irrigation.db'))
+        room_id = str(uuid.uuid4())
+        zone_ids = [str(uuid.uuid4()) for _ in range(zones)]
+        db.bulk_import(
+            [{'id': room_id, 'name': 'Room', 'type': 'vegetative', 'description': ''}],
+            [{'id': zone_id, 'name': f'Zone {i}', 'room_id': room_id, 'plant_count': 4, 'pump_entity': '',
+              'solenoid_entity': '', 'flow_rate': 16.0, 'active': 1} for i, zone_id in enumerate(zone_ids)],
+            []
+        )
+        conn = db.get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO water_usage (zone_id, room_id, amount, duration, timestamp) "
+                "VALUES (?, ?, ?, ?, datetime('now', ?))",
+                [(rng.choice(zone_ids), room_id, 1.0, 5, f'-{rng.randint(0, days * 24 * 60)} minutes')
+                 for _ in range(zones * days * 4)]
+            )
+
+        results = {'zones': zones, 'usage_rows': zones * days * 4,
+                   'db_bytes': os.path.getsize(db.db_path)}
+        for label, pages in (('single_step', -1), ('incremental', 64)):
+            backup = DatabaseBackup(db.db_path, root=os.path.join(tmp, label), pages=pages, compress=True)
+            write_ms = []
+            done = threading.Event()
+
+            def writer():
+                while not done.is_set():
+                    start = time.perf_counter()
+                    db.log_water_usage(rng.choice(zone_ids), room_id, 1.0, 1)
+                    write_ms.append((time.perf_counter() - start) * 1000)
+                    time.sleep(1 / writers_hz)
+
+            thread = threading.Thread(target=writer, daemon=True)
+            thread.start()
+            result = backup.create()
+            done.set()
+            thread.join()
+            results[label] = {
+                'seconds': result.get('seconds'),
+                'steps': result.get('steps'),
+                'restarts': result.get('restarts'),
+                'backup_bytes': result['backup']['size'] if result['success'] else None,
+                'write_ms': percentiles(write_ms)
+            }
+        return results
+
+if __name__ == '__main__':
+    import json
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps(benchmark(), indent=2))
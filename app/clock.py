@@ -0,0 +1,140 @@
+"""
+Clocks
+Wall-clock time for production and a virtual clock for deterministic simulation
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class ClockTimer:
+    __slots__ = ('due', 'func', 'args', 'cancelled')
+
+    def __init__(self, due: float, func: Callable, args: tuple):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class SystemClock:
+    """Real time; timers share one daemon thread
+
+    Timers used to be a threading.Timer each, so every running watering held
+    a sleeping thread and its stack. Callbacks run on the timer thread and
+    should hand longer work to another thread, as the stop timers do.
+    """
+
+    def __init__(self):
+        self._timers = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def call_later(self, delay: float, func: Callable, *args) -> ClockTimer:
+        """Run func(*args) after delay seconds, returning a handle with cancel()"""
+        timer = ClockTimer(time.monotonic() + max(delay, 0.0), func, args)
+        with self._condition:
+            heapq.heappush(self._timers, (timer.due, next(self._sequence), timer))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_timers, name='clock-timers', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return timer
+
+    def _run_timers(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._timers:
+                        self._condition.wait()
+                        continue
+                    wait = self._timers[0][0] - time.monotonic()
+                    if wait <= 0:
+                        timer = heapq.heappop(self._timers)[2]
+                        break
+                    self._condition.wait(wait)
+            if timer.cancelled:
+                continue
+            try:
+                timer.func(*timer.args)
+            except Exception as e:
+                logger.exception(f"Timer {getattr(timer.func, '__name__', timer.func)} failed: {e}")
+
+    @property
+    def pending_timers(self) -> int:
+        with self._condition:
+            return sum(1 for _, _, timer in self._timers if not timer.cancelled)
+
+class VirtualClock:
+    """Simulated time that only moves when advanced
+
+    Timers are kept in a heap and run in due order on the thread that advances
+    the clock, with now() set to each timer's due time while it runs, so a
+    simulated week replays in seconds and always in the same order.
+    """
+
+    def __init__(self, start: datetime):
+        self._start = start
+        self._elapsed = 0.0
+        self._timers = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self._elapsed)
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def call_later(self, delay: float, func: Callable, *args) -> ClockTimer:
+        timer = ClockTimer(self._elapsed + max(delay, 0.0), func, args)
+        with self._lock:
+            heapq.heappush(self._timers, (timer.due, next(self._sequence), timer))
+        return timer
+
+    def advance(self, seconds: float) -> int:
+        """Move time forward, running every timer that falls due on the way"""
+        return self.advance_to(self.now() + timedelta(seconds=seconds))
+
+    def advance_to(self, moment: datetime) -> int:
+        """Move time forward to moment, returning how many timers ran"""
+        target = (moment - self._start).total_seconds()
+        ran = 0
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > target:
+                    break
+                due, _, timer = heapq.heappop(self._timers)
+            if timer.cancelled:
+                continue
+            self._elapsed = max(self._elapsed, due)
+            timer.func(*timer.args)
+            ran += 1
+        self._elapsed = max(self._elapsed, target)
+        return ran
+
+    @property
+    def pending_timers(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, timer in self._timers if not timer.cancelled)
@@ -0,0 +1,66 @@
+"""
+Process coordination
+Elects the single worker process that owns the scheduler and actuation
+"""
+
+import fcntl
+import logging
+import os
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class LeaderElection:
+    """Leader election using an exclusive lock on a file under /data
+
+    The operating system releases the lock when the owning process exits, so a
+    standby worker takes over if the leader dies. Only the leader runs
+    schedules, sensor triggers and the actuation queue.
+    """
+
+    def __init__(self, lock_path: str = '/data/scheduler.lock', retry_interval: float = 5.0):
+        self.lock_path = lock_path
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._lock_file = None
+        self._stop = threading.Event()
+
+    def try_acquire(self) -> bool:
+        """Try to become leader without blocking"""
+        if self.is_leader:
+            return True
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        self.is_leader = True
+        logger.info(f"Process {os.getpid()} elected scheduler leader")
+        return True
+
+    def wait_for_leadership(self, on_elected: Callable):
+        """Keep retrying in the background and call on_elected once we win"""
+        def run():
+            while not self._stop.wait(self.retry_interval):
+                if self.try_acquire():
+                    try:
+                        on_elected()
+                    except Exception as e:
+                        logger.exception(f"Error taking over as leader: {e}")
+                    return
+
+        logger.info(f"Process {os.getpid()} standing by as a web worker")
+        threading.Thread(target=run, name='leader-election', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
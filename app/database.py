@@ -7,15 +7,60 @@ import sqlite3
 import json
 import logging
 import os
-from datetime import datetime
+import threading
+import weakref
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 import uuid
 
+from models import Model, Room, Schedule, UsageEvent, Zone
+
 logger = logging.getLogger(__name__)
 
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Page cache per connection; every long-lived thread keeps one, and SQLite's 2MB default adds up on small boards
+CACHE_KIB = int(os.getenv('SQLITE_CACHE_KIB', '512'))
+
+def schedule_time_rows(schedule_id: str, frequency: str, times: List[str], days: List[str] = None) -> List[tuple]:
+    """Expand a schedule into (schedule_id, week_minute, weekday, minute_of_day) rows"""
+    if frequency == 'weekly':
+        weekdays = sorted({WEEKDAYS.index(day.lower()) for day in days or []})
+    else:
+        weekdays = range(7)
+    
+    rows = []
+    for time_str in times:
+        hour, minute = time_str.split(':')
+        minute_of_day = int(hour) * 60 + int(minute)
+        for weekday in weekdays:
+            rows.append((schedule_id, weekday * MINUTES_PER_DAY + minute_of_day, weekday, minute_of_day))
+    return rows
+
+def week_start(moment: datetime) -> datetime:
+    """Get midnight on the Monday of the week containing moment"""
+    return (moment - timedelta(days=moment.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def utc_to_local(timestamp: Optional[str]) -> Optional[str]:
+    """Convert a SQLite CURRENT_TIMESTAMP value to a local ISO timestamp"""
+    if not timestamp:
+        return None
+    utc = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return utc.astimezone().replace(tzinfo=None).isoformat()
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection that can be weakly referenced, so open ones can be counted"""
+
 class IrrigationDatabase:
     def __init__(self, db_path='/data/irrigation.db'):
         self.db_path = db_path
+        # Each thread's connection, closed when the thread exits
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        self._connections_opened = 0
         self.init_database()
     
     def init_database(self):
@@ -24,8 +69,10 @@ class IrrigationDatabase:
             # Ensure directory exists
             os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
                 conn.execute('PRAGMA foreign_keys = ON')
+                # WAL lets web workers read while the scheduler process writes
+                conn.execute('PRAGMA journal_mode = WAL')
                 
                 # Rooms table
                 conn.execute('''
@@ -87,6 +134,86 @@ class IrrigationDatabase:
                     )
                 ''')
                 
+                # Schedule firing times, one row per weekday and time of day.
+                # week_minute = weekday * 1440 + minute_of_day (Monday = 0)
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS schedule_times (
+                        schedule_id TEXT NOT NULL,
+                        week_minute INTEGER NOT NULL,
+                        weekday INTEGER NOT NULL,
+                        minute_of_day INTEGER NOT NULL,
+                        PRIMARY KEY (schedule_id, week_minute),
+                        FOREIGN KEY (schedule_id) REFERENCES schedules (id) ON DELETE CASCADE
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_schedule_times_week_minute ON schedule_times (week_minute)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_water_usage_timestamp ON water_usage (timestamp)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_water_usage_zone ON water_usage (zone_id, timestamp)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_water_usage_room ON water_usage (room_id, timestamp)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_zones_room ON zones (room_id)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_schedules_zone ON schedules (zone_id)')
+                
+                self._backfill_schedule_times(conn)
+                
+                # Soil moisture / EC sensors bound to zones for sensor-driven watering
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS zone_sensors (
+                        id TEXT PRIMARY KEY,
+                        zone_id TEXT NOT NULL,
+                        entity_id TEXT NOT NULL,
+                        kind TEXT NOT NULL,
+                        min_value REAL,
+                        max_value REAL,
+                        window INTEGER DEFAULT 30,
+                        duration INTEGER DEFAULT 5,
+                        cooldown INTEGER DEFAULT 60,
+                        active BOOLEAN DEFAULT 1,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (zone_id) REFERENCES zones (id) ON DELETE CASCADE
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_zone_sensors_zone ON zone_sensors (zone_id)')
+                
+                # Zones currently being watered. The primary key stops two
+                # processes from starting the same zone at once.
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS active_waterings (
+                        zone_id TEXT PRIMARY KEY,
+                        duration INTEGER NOT NULL,
+                        source TEXT NOT NULL,
+                        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Watering requests from web workers for the scheduler process
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS actuation_requests (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        zone_id TEXT NOT NULL,
+                        duration INTEGER NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Sensor samples pushed to web workers, for the leader to ingest
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS sensor_samples_inbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        entity_id TEXT NOT NULL,
+                        value REAL NOT NULL,
+                        timestamp REAL NOT NULL
+                    )
+                ''')
+                
+                # The leader's rolling sensor statistics, for every worker to serve
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS sensor_stats (
+                        entity_id TEXT PRIMARY KEY,
+                        stats TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
                 # System settings table
                 conn.execute('''
                     CREATE TABLE IF NOT EXISTS settings (
@@ -103,13 +230,71 @@ class IrrigationDatabase:
             logger.error(f"Error initializing database: {e}")
             raise
     
+    def _backfill_schedule_times(self, conn):
+        """Populate schedule_times for schedules created before the table existed"""
+        missing = conn.execute('''
+            SELECT id, frequency, times, days FROM schedules
+            WHERE id NOT IN (SELECT DISTINCT schedule_id FROM schedule_times)
+        ''').fetchall()
+        
+        rows = []
+        for schedule_id, frequency, times, days in missing:
+            rows.extend(schedule_time_rows(
+                schedule_id, frequency, json.loads(times), json.loads(days) if days else []
+            ))
+        
+        if rows:
+            conn.executemany('''
+                INSERT OR IGNORE INTO schedule_times (schedule_id, week_minute, weekday, minute_of_day)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+            logger.info(f"Indexed firing times for {len(missing)} existing schedules")
+    
     def get_connection(self):
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
+        """Get the calling thread's connection, opening it on first use
+        
+        Connections used to be opened per query and left for the garbage
+        collector; now each thread keeps one until it exits.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open_connection()
+        return conn
+    
+    def _open_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, factory=_Connection)
         conn.row_factory = sqlite3.Row
         conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_KIB}')
+        with self._connections_lock:
+            self._connections.add(conn)
+            self._connections_opened += 1
         return conn
     
+    def reserve_connection(self):
+        """Open the calling thread's connection now
+        
+        Actuation workers call this on start so turning a pump off never waits
+        on opening a connection alongside dashboard queries.
+        """
+        self.get_connection()
+    
+    def get_connection_stats(self) -> Dict:
+        with self._connections_lock:
+            return {'open': len(self._connections), 'opened': self._connections_opened}
+    
+    @staticmethod
+    def _fetch(conn, model, query: str, params: tuple = ()) -> List[Model]:
+        """Run a query whose columns are in the model's field order and build models directly"""
+        cursor = conn.cursor()
+        cursor.row_factory = model.row_factory
+        return cursor.execute(query, params).fetchall()
+    
+    @classmethod
+    def _fetch_one(cls, conn, model, query: str, params: tuple = ()) -> Optional[Model]:
+        rows = cls._fetch(conn, model, query, params)
+        return rows[0] if rows else None
+    
     # Room operations
     def create_room(self, name: str, room_type: str, description: str = '') -> Dict:
         """Create a new room"""
@@ -125,39 +310,58 @@ class IrrigationDatabase:
                 conn.commit()
                 
                 # Get the created room
-                room = conn.execute('''
-                    SELECT * FROM rooms WHERE id = ?
-                ''', (room_id,)).fetchone()
+                room = self._fetch_one(conn, Room, f'''
+                    SELECT {Room.columns('r')}, 0 FROM rooms r WHERE r.id = ?
+                ''', (room_id,))
                 
                 logger.info(f"Created room: {name}")
                 return {
                     'success': True,
-                    'room': {
-                        'id': room['id'],
-                        'name': room['name'],
-                        'type': room['type'],
-                        'description': room['description'],
-                        'created_at': room['created_at']
-                    }
+                    'room': room
                 }
                 
         except Exception as e:
             logger.error(f"Error creating room: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_rooms(self) -> List[Dict]:
-        """Get all rooms"""
+    def _list(self, model, select: str, order: tuple, filters: Dict[str, Any],
+              after: list = None, limit: int = None) -> List[Model]:
+        """Run a listing query with equality filters and optional keyset paging
+        
+        filters maps SQL columns to values, skipping None. order is the SQL sort
+        key, ending in a unique column, and after is the sort key of the last row
+        of the previous page, so deep pages cost the same as the first rather
+        than growing like OFFSET.
+        """
+        clauses, params = [], []
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if after:
+            clauses.append(f"({', '.join(order)}) > ({', '.join('?' * len(order))})")
+            params.extend(after)
+        
+        query = select
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY ' + ', '.join(order)
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        
+        with self.get_connection() as conn:
+            return self._fetch(conn, model, query, tuple(params))
+    
+    def get_rooms(self, room_type: str = None, after: list = None, limit: int = None) -> List[Room]:
+        """Get rooms, optionally filtered by type and paged after a sort key"""
         try:
-            with self.get_connection() as conn:
-                rooms = conn.execute('''
-                    SELECT r.*, COUNT(z.id) as zone_count
-                    FROM rooms r
-                    LEFT JOIN zones z ON r.id = z.room_id
-                    GROUP BY r.id
-                    ORDER BY r.created_at
-                ''').fetchall()
-                
-                return [dict(room) for room in rooms]
+            # Counting per room through idx_zones_room only touches the rooms on this page
+            return self._list(Room, f'''
+                SELECT {Room.columns('r')},
+                       (SELECT COUNT(*) FROM zones z WHERE z.room_id = r.id)
+                FROM rooms r
+            ''', ('r.created_at', 'r.id'), {'r.type': room_type}, after, limit)
                 
         except Exception as e:
             logger.error(f"Error getting rooms: {e}")
@@ -167,23 +371,27 @@ class IrrigationDatabase:
         """Update a room"""
         try:
             with self.get_connection() as conn:
-                conn.execute('''
+                cursor = conn.execute('''
                     UPDATE rooms 
                     SET name = ?, type = ?, description = ?, updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (name, room_type, description, room_id))
                 
-                if conn.total_changes == 0:
+                # total_changes counts the connection's whole life now connections are kept per thread
+                if cursor.rowcount == 0:
                     return {'success': False, 'error': 'Room not found'}
                 
                 conn.commit()
                 
                 # Get updated room
-                room = conn.execute('SELECT * FROM rooms WHERE id = ?', (room_id,)).fetchone()
+                room = self._fetch_one(conn, Room, f'''
+                    SELECT {Room.columns('r')}, (SELECT COUNT(*) FROM zones z WHERE z.room_id = r.id)
+                    FROM rooms r WHERE r.id = ?
+                ''', (room_id,))
                 
                 return {
                     'success': True,
-                    'room': dict(room)
+                    'room': room
                 }
                 
         except Exception as e:
@@ -232,39 +440,56 @@ class IrrigationDatabase:
                 conn.commit()
                 
                 # Get the created zone
-                zone = conn.execute('''
-                    SELECT z.*, r.name as room_name
+                zone = self._fetch_one(conn, Zone, f'''
+                    SELECT {Zone.columns('z')}, r.name, r.type
                     FROM zones z
                     JOIN rooms r ON z.room_id = r.id
                     WHERE z.id = ?
-                ''', (zone_id,)).fetchone()
+                ''', (zone_id,))
                 
                 logger.info(f"Created zone: {name}")
                 return {
                     'success': True,
-                    'zone': dict(zone)
+                    'zone': zone
                 }
                 
         except Exception as e:
             logger.error(f"Error creating zone: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_zones(self) -> List[Dict]:
-        """Get all zones with room information"""
+    def get_zones(self, room_id: str = None, room_type: str = None, active: int = None,
+                  pump_entity: str = None, after: list = None, limit: int = None) -> List[Zone]:
+        """Get zones with room information, optionally filtered and paged after a sort key"""
+        try:
+            return self._list(Zone, f'''
+                SELECT {Zone.columns('z')}, r.name, r.type
+                FROM zones z
+                JOIN rooms r ON z.room_id = r.id
+            ''', ('r.name', 'z.name', 'z.id'), {
+                'z.room_id': room_id,
+                'r.type': room_type,
+                'z.active': active,
+                'z.pump_entity': pump_entity
+            }, after, limit)
+                
+        except Exception as e:
+            logger.error(f"Error getting zones: {e}")
+            return []
+    
+    def get_zone(self, zone_id: str) -> Optional[Zone]:
+        """Get one zone with room information"""
         try:
             with self.get_connection() as conn:
-                zones = conn.execute('''
-                    SELECT z.*, r.name as room_name, r.type as room_type
+                return self._fetch_one(conn, Zone, f'''
+                    SELECT {Zone.columns('z')}, r.name, r.type
                     FROM zones z
                     JOIN rooms r ON z.room_id = r.id
-                    ORDER BY r.name, z.name
-                ''').fetchall()
-                
-                return [dict(zone) for zone in zones]
+                    WHERE z.id = ?
+                ''', (zone_id,))
                 
         except Exception as e:
-            logger.error(f"Error getting zones: {e}")
-            return []
+            logger.error(f"Error getting zone {zone_id}: {e}")
+            return None
     
     # Schedule operations
     def create_schedule(self, name: str, zone_id: str, duration: int, 
@@ -286,58 +511,455 @@ class IrrigationDatabase:
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (schedule_id, name, zone_id, duration, frequency, times_json, days_json))
                 
+                conn.executemany('''
+                    INSERT INTO schedule_times (schedule_id, week_minute, weekday, minute_of_day)
+                    VALUES (?, ?, ?, ?)
+                ''', schedule_time_rows(schedule_id, frequency, times, days))
+                
                 conn.commit()
                 
                 # Get the created schedule
-                schedule = conn.execute('''
-                    SELECT s.*, z.name as zone_name, r.name as room_name
+                schedule = self._fetch_one(conn, Schedule, f'''
+                    SELECT {Schedule.columns('s')}, z.name, r.name
                     FROM schedules s
                     JOIN zones z ON s.zone_id = z.id
                     JOIN rooms r ON z.room_id = r.id
                     WHERE s.id = ?
-                ''', (schedule_id,)).fetchone()
-                
-                schedule_dict = dict(schedule)
-                schedule_dict['times'] = json.loads(schedule_dict['times'])
-                if schedule_dict['days']:
-                    schedule_dict['days'] = json.loads(schedule_dict['days'])
+                ''', (schedule_id,))
                 
                 logger.info(f"Created schedule: {name}")
                 return {
                     'success': True,
-                    'schedule': schedule_dict
+                    'schedule': schedule
                 }
                 
         except Exception as e:
             logger.error(f"Error creating schedule: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_schedules(self) -> List[Dict]:
-        """Get all schedules"""
+    def get_schedules(self, zone_id: str = None, room_id: str = None, room_type: str = None,
+                      active: int = None, after: list = None, limit: int = None) -> List[Schedule]:
+        """Get schedules, optionally filtered and paged after a sort key"""
+        try:
+            return self._list(Schedule, f'''
+                SELECT {Schedule.columns('s')}, z.name, r.name
+                FROM schedules s
+                JOIN zones z ON s.zone_id = z.id
+                JOIN rooms r ON z.room_id = r.id
+            ''', ('s.name', 's.id'), {
+                's.zone_id': zone_id,
+                'z.room_id': room_id,
+                'r.type': room_type,
+                's.active': active
+            }, after, limit)
+                
+        except Exception as e:
+            logger.error(f"Error getting schedules: {e}")
+            return []
+    
+    # Bulk provisioning
+    def bulk_import(self, rooms: List[Dict], zones: List[Dict], schedules: List[Dict]) -> Dict:
+        """Insert or update rooms, zones and schedules in a single transaction
+        
+        Rows must already be validated and carry their ids.
+        """
         try:
             with self.get_connection() as conn:
+                conn.executemany('''
+                    INSERT INTO rooms (id, name, type, description)
+                    VALUES (:id, :name, :type, :description)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name, type = excluded.type,
+                        description = excluded.description, updated_at = CURRENT_TIMESTAMP
+                ''', rooms)
+                
+                conn.executemany('''
+                    INSERT INTO zones (id, name, room_id, plant_count, pump_entity, solenoid_entity, flow_rate, active)
+                    VALUES (:id, :name, :room_id, :plant_count, :pump_entity, :solenoid_entity, :flow_rate, :active)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name, room_id = excluded.room_id,
+                        plant_count = excluded.plant_count, pump_entity = excluded.pump_entity,
+                        solenoid_entity = excluded.solenoid_entity, flow_rate = excluded.flow_rate,
+                        active = excluded.active, updated_at = CURRENT_TIMESTAMP
+                ''', zones)
+                
+                conn.executemany('''
+                    INSERT INTO schedules (id, name, zone_id, duration, frequency, times, days, active)
+                    VALUES (:id, :name, :zone_id, :duration, :frequency, :times_json, :days_json, :active)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name, zone_id = excluded.zone_id,
+                        duration = excluded.duration, frequency = excluded.frequency,
+                        times = excluded.times, days = excluded.days,
+                        active = excluded.active, updated_at = CURRENT_TIMESTAMP
+                ''', [
+                    {**s, 'times_json': json.dumps(s['times']),
+                     'days_json': json.dumps(s['days']) if s['days'] else None}
+                    for s in schedules
+                ])
+                
+                conn.executemany('DELETE FROM schedule_times WHERE schedule_id = ?', [(s['id'],) for s in schedules])
+                conn.executemany('''
+                    INSERT INTO schedule_times (schedule_id, week_minute, weekday, minute_of_day)
+                    VALUES (?, ?, ?, ?)
+                ''', [
+                    row for s in schedules
+                    for row in schedule_time_rows(s['id'], s['frequency'], s['times'], s['days'])
+                ])
+                
+                conn.commit()
+                
+                logger.info(f"Imported {len(rooms)} rooms, {len(zones)} zones, {len(schedules)} schedules")
+                return {
+                    'success': True,
+                    'imported': {'rooms': len(rooms), 'zones': len(zones), 'schedules': len(schedules)}
+                }
+                
+        except Exception as e:
+            logger.error(f"Error importing configuration: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    def export_config(self) -> Dict:
+        """Export all rooms, zones and schedules"""
+        try:
+            with self.get_connection() as conn:
+                rooms = conn.execute('''
+                    SELECT id, name, type, description FROM rooms ORDER BY created_at
+                ''').fetchall()
+                zones = conn.execute('''
+                    SELECT id, name, room_id, plant_count, pump_entity, solenoid_entity, flow_rate, active
+                    FROM zones ORDER BY created_at
+                ''').fetchall()
                 schedules = conn.execute('''
-                    SELECT s.*, z.name as zone_name, r.name as room_name
-                    FROM schedules s
-                    JOIN zones z ON s.zone_id = z.id
-                    JOIN rooms r ON z.room_id = r.id
-                    ORDER BY s.name
+                    SELECT id, name, zone_id, duration, frequency, times, days, active
+                    FROM schedules ORDER BY created_at
                 ''').fetchall()
                 
-                result = []
+                schedule_list = []
                 for schedule in schedules:
                     schedule_dict = dict(schedule)
                     schedule_dict['times'] = json.loads(schedule_dict['times'])
-                    if schedule_dict['days']:
-                        schedule_dict['days'] = json.loads(schedule_dict['days'])
-                    result.append(schedule_dict)
+                    schedule_dict['days'] = json.loads(schedule_dict['days']) if schedule_dict['days'] else []
+                    schedule_dict['active'] = bool(schedule_dict['active'])
+                    schedule_list.append(schedule_dict)
+                
+                zone_list = []
+                for zone in zones:
+                    zone_dict = dict(zone)
+                    zone_dict['active'] = bool(zone_dict['active'])
+                    zone_list.append(zone_dict)
                 
-                return result
+                return {
+                    'rooms': [dict(room) for room in rooms],
+                    'zones': zone_list,
+                    'schedules': schedule_list
+                }
                 
         except Exception as e:
-            logger.error(f"Error getting schedules: {e}")
+            logger.error(f"Error exporting configuration: {e}")
+            return {'rooms': [], 'zones': [], 'schedules': []}
+    
+    def get_ids(self, table: str) -> Dict[str, str]:
+        """Get a map of id to name for all rows of a table"""
+        if table not in ('rooms', 'zones'):
+            raise ValueError(f"Unsupported table: {table}")
+        
+        with self.get_connection() as conn:
+            rows = conn.execute(f'SELECT id, name FROM {table}').fetchall()
+            return {row['id']: row['name'] for row in rows}
+    
+    # Schedule firing index
+    def get_next_firings(self, after: datetime, limit: int = 10) -> List[Dict]:
+        """Get the next firings of active schedules strictly after a moment
+        
+        Results cover at most one week, since the schedule pattern repeats weekly.
+        """
+        base = week_start(after)
+        start = int((after - base).total_seconds() // 60) + 1
+        query = '''
+            SELECT st.week_minute, s.id as schedule_id, s.zone_id, s.duration
+            FROM schedule_times st
+            JOIN schedules s ON st.schedule_id = s.id
+            JOIN zones z ON s.zone_id = z.id
+            WHERE st.week_minute {condition} AND s.active = 1 AND z.active = 1
+            ORDER BY st.week_minute
+            LIMIT ?
+        '''
+        
+        try:
+            with self.get_connection() as conn:
+                rows = [(0, row) for row in conn.execute(
+                    query.format(condition='>= ?'), (start, limit)
+                ).fetchall()]
+                if len(rows) < limit:
+                    # Wrap around into next week
+                    rows += [(1, row) for row in conn.execute(
+                        query.format(condition='< ?'), (start, limit - len(rows))
+                    ).fetchall()]
+                
+                return [self._firing(row, base + timedelta(weeks=weeks)) for weeks, row in rows]
+                
+        except Exception as e:
+            logger.error(f"Error getting next firings: {e}")
+            return []
+    
+    def get_firings_in_window(self, start: datetime, end: datetime) -> List[Dict]:
+        """Get all firings of active schedules with start <= fire time < end"""
+        firings = []
+        try:
+            with self.get_connection() as conn:
+                segment_start = start
+                while segment_start < end:
+                    base = week_start(segment_start)
+                    segment_end = min(end, base + timedelta(weeks=1))
+                    rows = conn.execute('''
+                        SELECT st.week_minute, s.id as schedule_id, s.zone_id, s.duration
+                        FROM schedule_times st
+                        JOIN schedules s ON st.schedule_id = s.id
+                        JOIN zones z ON s.zone_id = z.id
+                        WHERE st.week_minute >= ? AND st.week_minute < ?
+                          AND s.active = 1 AND z.active = 1
+                        ORDER BY st.week_minute
+                    ''', (self._ceil_week_minute(segment_start, base),
+                          self._ceil_week_minute(segment_end, base))).fetchall()
+                    firings.extend(self._firing(row, base) for row in rows)
+                    segment_start = segment_end
+                
+                return firings
+                
+        except Exception as e:
+            logger.error(f"Error getting firings in window: {e}")
             return []
     
+    def get_next_firing_by_zone(self, after: datetime) -> Dict[str, datetime]:
+        """Get the next firing time of each zone's active schedules"""
+        base = week_start(after)
+        start = int((after - base).total_seconds() // 60) + 1
+        query = '''
+            SELECT s.zone_id, MIN(st.week_minute) as week_minute
+            FROM schedule_times st
+            JOIN schedules s ON st.schedule_id = s.id
+            JOIN zones z ON s.zone_id = z.id
+            WHERE st.week_minute {condition} AND s.active = 1 AND z.active = 1
+            GROUP BY s.zone_id
+        '''
+        
+        with self.get_connection() as conn:
+            next_by_zone = {
+                row['zone_id']: base + timedelta(minutes=row['week_minute'])
+                for row in conn.execute(query.format(condition='>= ?'), (start,)).fetchall()
+            }
+            for row in conn.execute(query.format(condition='< ?'), (start,)).fetchall():
+                next_by_zone.setdefault(row['zone_id'], base + timedelta(weeks=1, minutes=row['week_minute']))
+            
+            return next_by_zone
+    
+    @staticmethod
+    def _ceil_week_minute(moment: datetime, base: datetime) -> int:
+        """Minutes since base, rounded up to the next whole minute"""
+        seconds = (moment - base).total_seconds()
+        return int(-(-seconds // 60))
+    
+    @staticmethod
+    def _firing(row, base: datetime) -> Dict:
+        return {
+            'schedule_id': row['schedule_id'],
+            'zone_id': row['zone_id'],
+            'duration': row['duration'],
+            'fire_at': base + timedelta(minutes=row['week_minute'])
+        }
+    
+    # Sensor bindings
+    def create_zone_sensor(self, zone_id: str, entity_id: str, kind: str,
+                           min_value: float = None, max_value: float = None, window: int = 30,
+                           duration: int = 5, cooldown: int = 60) -> Dict:
+        """Bind a Home Assistant sensor to a zone"""
+        try:
+            binding_id = str(uuid.uuid4())
+            
+            with self.get_connection() as conn:
+                zone = conn.execute('SELECT id FROM zones WHERE id = ?', (zone_id,)).fetchone()
+                if not zone:
+                    return {'success': False, 'error': 'Zone not found'}
+                
+                conn.execute('''
+                    INSERT INTO zone_sensors (id, zone_id, entity_id, kind, min_value, max_value, window, duration, cooldown)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (binding_id, zone_id, entity_id, kind, min_value, max_value, window, duration, cooldown))
+                self._bump_sensor_bindings_version(conn)
+                
+                conn.commit()
+                
+                binding = conn.execute('SELECT * FROM zone_sensors WHERE id = ?', (binding_id,)).fetchone()
+                
+                logger.info(f"Bound sensor {entity_id} to zone {zone_id}")
+                return {
+                    'success': True,
+                    'binding': dict(binding)
+                }
+                
+        except Exception as e:
+            logger.error(f"Error creating sensor binding: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    def get_zone_sensors(self, zone_id: str = None) -> List[Dict]:
+        """Get sensor bindings, optionally for one zone"""
+        try:
+            with self.get_connection() as conn:
+                if zone_id:
+                    bindings = conn.execute(
+                        'SELECT * FROM zone_sensors WHERE zone_id = ? ORDER BY created_at', (zone_id,)
+                    ).fetchall()
+                else:
+                    bindings = conn.execute('SELECT * FROM zone_sensors ORDER BY created_at').fetchall()
+                
+                return [dict(binding) for binding in bindings]
+                
+        except Exception as e:
+            logger.error(f"Error getting sensor bindings: {e}")
+            return []
+    
+    def delete_zone_sensor(self, binding_id: str) -> Dict:
+        """Remove a sensor binding"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute('DELETE FROM zone_sensors WHERE id = ?', (binding_id,))
+                if cursor.rowcount == 0:
+                    return {'success': False, 'error': 'Sensor binding not found'}
+                self._bump_sensor_bindings_version(conn)
+                
+                conn.commit()
+                return {'success': True}
+                
+        except Exception as e:
+            logger.error(f"Error deleting sensor binding: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def _bump_sensor_bindings_version(conn):
+        conn.execute('''
+            INSERT INTO settings (key, value) VALUES ('sensor_bindings_version', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, updated_at = CURRENT_TIMESTAMP
+        ''')
+    
+    def get_sensor_bindings_version(self) -> int:
+        """Counter bumped whenever any process adds or removes a binding"""
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'sensor_bindings_version'").fetchone()
+            return int(row['value']) if row else 0
+    
+    # Sensor samples and statistics shared between processes
+    def enqueue_sensor_samples(self, samples: List[tuple]) -> Dict:
+        """Queue (entity_id, value, timestamp) samples for the leader process"""
+        try:
+            with self.get_connection() as conn:
+                conn.executemany(
+                    'INSERT INTO sensor_samples_inbox (entity_id, value, timestamp) VALUES (?, ?, ?)', samples
+                )
+                conn.commit()
+                return {'success': True, 'queued': len(samples)}
+                
+        except Exception as e:
+            logger.error(f"Error queueing sensor samples: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    def take_sensor_samples(self) -> List[tuple]:
+        """Remove and return all queued sensor samples, oldest first"""
+        with self.get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                'SELECT id, entity_id, value, timestamp FROM sensor_samples_inbox ORDER BY id'
+            ).fetchall()
+            if rows:
+                conn.execute('DELETE FROM sensor_samples_inbox WHERE id <= ?', (rows[-1]['id'],))
+            conn.commit()
+            return [(row['entity_id'], row['value'], row['timestamp']) for row in rows]
+    
+    def save_sensor_stats(self, stats: Dict[str, Dict]):
+        """Store the leader's statistics per sensor"""
+        if not stats:
+            return
+        with self.get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO sensor_stats (entity_id, stats) VALUES (?, ?)
+                ON CONFLICT(entity_id) DO UPDATE SET stats = excluded.stats, updated_at = CURRENT_TIMESTAMP
+            ''', [(entity_id, json.dumps(entry)) for entity_id, entry in stats.items()])
+            conn.commit()
+    
+    def get_sensor_stats(self, entity_id: str) -> Optional[Dict]:
+        """The statistics the leader last stored for a sensor"""
+        with self.get_connection() as conn:
+            row = conn.execute('SELECT stats FROM sensor_stats WHERE entity_id = ?', (entity_id,)).fetchone()
+            return json.loads(row['stats']) if row else None
+    
+    # Active waterings shared between processes
+    def claim_active_watering(self, zone_id: str, duration: int, source: str) -> bool:
+        """Mark a zone as watering, returning False if it already is"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO active_waterings (zone_id, duration, source)
+                    VALUES (?, ?, ?)
+                ''', (zone_id, duration, source))
+                conn.commit()
+                return cursor.rowcount == 1
+                
+        except Exception as e:
+            logger.error(f"Error claiming watering for zone {zone_id}: {e}")
+            return False
+    
+    def release_active_watering(self, zone_id: str):
+        """Clear a zone's watering claim"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute('DELETE FROM active_waterings WHERE zone_id = ?', (zone_id,))
+                conn.commit()
+                
+        except Exception as e:
+            logger.error(f"Error releasing watering for zone {zone_id}: {e}")
+    
+    def get_active_watering_zone_ids(self) -> List[str]:
+        """Get the ids of zones currently watering"""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute('SELECT zone_id FROM active_waterings ORDER BY started_at').fetchall()
+                return [row['zone_id'] for row in rows]
+                
+        except Exception as e:
+            logger.error(f"Error getting active waterings: {e}")
+            return []
+    
+    def clear_active_waterings(self) -> List[str]:
+        """Remove all watering claims, returning the zones that had one"""
+        with self.get_connection() as conn:
+            rows = conn.execute('SELECT zone_id FROM active_waterings').fetchall()
+            conn.execute('DELETE FROM active_waterings')
+            conn.commit()
+            return [row['zone_id'] for row in rows]
+    
+    def enqueue_actuation(self, zone_id: str, duration: int) -> Dict:
+        """Queue a watering request for the scheduler process"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute('''
+                    INSERT INTO actuation_requests (zone_id, duration) VALUES (?, ?)
+                ''', (zone_id, duration))
+                conn.commit()
+                return {'success': True}
+                
+        except Exception as e:
+            logger.error(f"Error queueing watering request: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    def take_actuation_requests(self) -> List[Dict]:
+        """Remove and return all queued watering requests, oldest first"""
+        with self.get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT * FROM actuation_requests ORDER BY id').fetchall()
+            if rows:
+                conn.execute('DELETE FROM actuation_requests WHERE id <= ?', (rows[-1]['id'],))
+            conn.commit()
+            return [dict(row) for row in rows]
+    
     # Water usage tracking
     def log_water_usage(self, zone_id: str, room_id: str, amount: float, duration: int):
         """Log water usage"""
@@ -352,6 +974,33 @@ class IrrigationDatabase:
         except Exception as e:
             logger.error(f"Error logging water usage: {e}")
     
+    def get_usage_events(self, start: str = None, end: str = None, zone_id: str = None) -> List[UsageEvent]:
+        """Get logged waterings with start <= timestamp < end (UTC, SQLite format)"""
+        conditions, params = [], []
+        if start:
+            conditions.append('w.timestamp >= ?')
+            params.append(start)
+        if end:
+            conditions.append('w.timestamp < ?')
+            params.append(end)
+        if zone_id:
+            conditions.append('w.zone_id = ?')
+            params.append(zone_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        try:
+            with self.get_connection() as conn:
+                return self._fetch(conn, UsageEvent, f'''
+                    SELECT {UsageEvent.columns('w')}
+                    FROM water_usage w
+                    {where}
+                    ORDER BY w.timestamp, w.id
+                ''', tuple(params))
+                
+        except Exception as e:
+            logger.error(f"Error getting usage events: {e}")
+            return []
+    
     def get_water_usage_stats(self) -> Dict:
         """Get water usage statistics"""
         try:
@@ -393,8 +1042,8 @@ class IrrigationDatabase:
             logger.error(f"Error getting water usage stats: {e}")
             return {'total_water_today': 0, 'rooms': [], 'zones': []}
     
-    def get_system_status(self) -> Dict:
-        """Get system status"""
+    def get_system_status(self, now: Optional[datetime] = None) -> Dict:
+        """Get system status; next waterings are the first firings after now (local time)"""
         try:
             with self.get_connection() as conn:
                 # Count totals
@@ -410,18 +1059,60 @@ class IrrigationDatabase:
                     WHERE DATE(timestamp) = DATE('now')
                 ''').fetchone()['total']
                 
-                return {
-                    'system_active': True,
-                    'total_rooms': room_count,
-                    'total_zones': zone_count,
-                    'active_schedules': schedule_count,
-                    'total_plants': plant_count,
-                    'water_usage_today': float(water_today),
-                    'active_zones': [],  # Will be populated by active watering sessions
-                    'last_watering': None,
-                    'next_watering': None
+                # Last watering per zone and room (MAX per group uses the composite indexes)
+                last_by_zone = {
+                    row['zone_id']: utc_to_local(row['last'])
+                    for row in conn.execute(
+                        'SELECT zone_id, MAX(timestamp) as last FROM water_usage GROUP BY zone_id'
+                    ).fetchall()
                 }
-                
+                last_by_room = {
+                    row['room_id']: utc_to_local(row['last'])
+                    for row in conn.execute(
+                        'SELECT room_id, MAX(timestamp) as last FROM water_usage GROUP BY room_id'
+                    ).fetchall()
+                }
+                zone_rooms = {
+                    row['id']: row['room_id']
+                    for row in conn.execute('SELECT id, room_id FROM zones').fetchall()
+                }
+            
+            next_by_zone = self.get_next_firing_by_zone(now or datetime.now())
+            next_by_room = {}
+            for zone_id, fire_at in next_by_zone.items():
+                room_id = zone_rooms.get(zone_id)
+                if room_id and (room_id not in next_by_room or fire_at < next_by_room[room_id]):
+                    next_by_room[room_id] = fire_at
+            
+            zone_watering = {
+                zone_id: {
+                    'last_watering': last_by_zone.get(zone_id),
+                    'next_watering': next_by_zone[zone_id].isoformat() if zone_id in next_by_zone else None
+                }
+                for zone_id in zone_rooms
+            }
+            room_watering = {
+                room_id: {
+                    'last_watering': last_by_room.get(room_id),
+                    'next_watering': next_by_room[room_id].isoformat() if room_id in next_by_room else None
+                }
+                for room_id in set(zone_rooms.values())
+            }
+            
+            return {
+                'system_active': True,
+                'total_rooms': room_count,
+                'total_zones': zone_count,
+                'active_schedules': schedule_count,
+                'total_plants': plant_count,
+                'water_usage_today': float(water_today),
+                'active_zones': [],  # Will be populated by active watering sessions
+                'last_watering': max(last_by_zone.values(), default=None),
+                'next_watering': min(next_by_zone.values()).isoformat() if next_by_zone else None,
+                'zone_watering': zone_watering,
+                'room_watering': room_watering
+            }
+            
         except Exception as e:
             logger.error(f"Error getting system status: {e}")
             return {
@@ -433,5 +1124,7 @@ class IrrigationDatabase:
                 'water_usage_today': 0,
                 'active_zones': [],
                 'last_watering': None,
-                'next_watering': None
+                'next_watering': None,
+                'zone_watering': {},
+                'room_watering': {}
             }
\ No newline at end of file
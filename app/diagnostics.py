@@ -0,0 +1,150 @@
+"""
+Memory Diagnostics
+Resident memory, per-subsystem counters and tracemalloc snapshots for small hosts
+"""
+
+import gc
+import os
+import re
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import schedule
+
+def rss_bytes() -> int:
+    """Current resident set size, from /proc on Linux"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Peak rather than current, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def thread_counts() -> Dict[str, int]:
+    """Live threads grouped by name with worker numbers stripped, e.g. 'actuation'"""
+    return dict(Counter(re.sub(r'[-_ ]?\(?\d+\)?$', '', thread.name) or thread.name
+                        for thread in threading.enumerate()))
+
+def subsystem_counters(controller, **extra) -> Dict:
+    """Sizes of the things that grow with zones, waterings and requests"""
+    counters = {
+        'threads': thread_counts(),
+        'db_connections': controller.db.get_connection_stats(),
+        'active_waterings': len(controller.active_waterings),
+        'pending_timers': controller.clock.pending_timers,
+        'actuation_queued': controller.actuator.get_stats()['queued'],
+        'schedule_jobs': len(schedule.jobs),
+        'sensor_store': controller.sensor_store.summary(),
+        'sensor_publisher': controller.publisher.get_stats(),
+        'ha_cached_states': len(getattr(controller.ha, 'cached_states', ())),
+        'gc_counts': gc.get_count(),
+        'gc_tracked_objects': len(gc.get_objects())
+    }
+    counters.update(extra)
+    return counters
+
+class MemoryTracer:
+    """Named tracemalloc snapshots and diffs between them
+
+    Tracing costs memory and CPU, so it is off until started. Only the most
+    recent `max_snapshots` snapshots are kept.
+    """
+
+    GROUP_BY = ('lineno', 'filename', 'traceback')
+
+    def __init__(self, max_snapshots: int = 4):
+        self.max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def start(self, frames: int = 10) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> Dict:
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def status(self) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            names = list(self._snapshots)
+        return {
+            'tracing': tracing,
+            'frames': tracemalloc.get_traceback_limit() if tracing else None,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'overhead_bytes': tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            'snapshots': names
+        }
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>')
+        ))
+
+    def snapshot(self, name: Optional[str] = None) -> Dict:
+        """Take and keep a named snapshot"""
+        if not tracemalloc.is_tracing():
+            return {'success': False, 'error': 'tracemalloc is not running'}
+        snapshot = self._take()
+        with self._lock:
+            self._counter += 1
+            name = name or f'snapshot-{self._counter}'
+            self._snapshots[name] = snapshot
+            self._snapshots.move_to_end(name)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        total = sum(stat.size for stat in snapshot.statistics('filename'))
+        return {'success': True, 'name': name, 'traced_bytes': total}
+
+    def diff(self, first: str, second: Optional[str] = None, group_by: str = 'lineno',
+             limit: int = 20) -> Dict:
+        """Top allocation growth from snapshot `first` to `second`, or to now"""
+        if group_by not in self.GROUP_BY:
+            return {'success': False, 'error': f"group_by must be one of {', '.join(self.GROUP_BY)}"}
+        with self._lock:
+            before = self._snapshots.get(first)
+            after = self._snapshots.get(second) if second else None
+        if before is None or (second and after is None):
+            return {'success': False, 'error': 'Snapshot not found'}
+        if after is None:
+            if not tracemalloc.is_tracing():
+                return {'success': False, 'error': 'tracemalloc is not running'}
+            after = self._take()
+
+        stats = after.compare_to(before, group_by)
+        return {
+            'success': True,
+            'from': first,
+            'to': second or 'now',
+            'size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'top': [self._describe(stat, group_by) for stat in stats[:limit]]
+        }
+
+    @staticmethod
+    def _describe(stat, group_by: str) -> Dict:
+        frames = stat.traceback.format() if group_by == 'traceback' else None
+        frame = stat.traceback[0]
+        return {
+            'location': f'{frame.filename}:{frame.lineno}' if group_by != 'filename' else frame.filename,
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'count': stat.count,
+            **({'traceback': frames} if frames else {})
+        }
+
+def top_growth(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int = 10) -> List[Dict]:
+    """Largest allocation growth by line between two snapshots"""
+    return [MemoryTracer._describe(stat, 'lineno') for stat in after.compare_to(before, 'lineno')[:limit]]
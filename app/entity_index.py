@@ -0,0 +1,271 @@
+"""
+Entity Index
+In-memory prefix/trigram search over Home Assistant switch-like entities
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Domains a zone can drive; ha_integration.SWITCH_SERVICES maps each to its on/off services
+INDEXED_DOMAINS = ('switch', 'valve', 'input_boolean')
+
+_TOKEN_SPLIT = re.compile(r'[^a-z0-9]+')
+
+# Match ranks, best first
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class _Entry:
+    __slots__ = ('entity_id', 'object_id', 'name', 'domain', 'state', 'text', 'tokens', 'whole')
+
+    def __init__(self, entity_id: str, name: str, state: str):
+        self.entity_id = entity_id
+        self.domain, _, self.object_id = entity_id.partition('.')
+        self.name = name
+        self.state = state
+        self.text = f'{entity_id} {name}'.lower()
+        # Whole-field tokens; a query that prefixes one of these outranks a word match
+        self.whole = (entity_id.lower(), self.object_id.lower(), name.lower())
+        self.tokens = {token for token in _TOKEN_SPLIT.split(self.text) if token}
+        self.tokens.update(self.whole)
+
+    def to_dict(self) -> Dict:
+        return {'id': self.entity_id, 'name': self.name, 'domain': self.domain, 'state': self.state}
+
+class EntityIndex:
+    """Searchable copy of the entities a zone can switch
+
+    Entries are kept per entity and only re-indexed when an entity appears,
+    disappears or is renamed; state changes just update the entry. Once the
+    index is older than `max_age` a search kicks off a background refresh and
+    answers from the current entries, so only the first search waits on Home
+    Assistant. An empty state list means Home Assistant couldn't be reached
+    (get_states falls back to the last states it had, if any), so it leaves
+    the index as it was and is retried after `max_age`.
+    """
+
+    def __init__(self, ha, max_age: float = 30.0, domains: Iterable[str] = INDEXED_DOMAINS):
+        self.ha = ha
+        self.max_age = max_age
+        self.domains = tuple(domains)
+        self._entries: Dict[str, _Entry] = {}
+        self._trigrams = defaultdict(set)
+        self._tokens: List[tuple] = []  # sorted (token, entity_id)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.refreshed_at = None
+        self._attempted_at = None
+        self.stats = {'refreshes': 0, 'failed_refreshes': 0, 'added': 0, 'renamed': 0, 'removed': 0,
+                      'searches': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def apply(self, states: List[Dict]):
+        """Bring the index in line with a full list of Home Assistant states"""
+        seen = set()
+        with self._lock:
+            for state in states:
+                entity_id = state.get('entity_id', '')
+                if entity_id.partition('.')[0] not in self.domains:
+                    continue
+                seen.add(entity_id)
+                name = (state.get('attributes') or {}).get('friendly_name') or entity_id
+                current = self._entries.get(entity_id)
+                if current is None:
+                    self._add(_Entry(entity_id, name, state.get('state')))
+                    self.stats['added'] += 1
+                elif current.name != name:
+                    self._remove(current)
+                    self._add(_Entry(entity_id, name, state.get('state')))
+                    self.stats['renamed'] += 1
+                else:
+                    current.state = state.get('state')
+
+            for entity_id in [entity_id for entity_id in self._entries if entity_id not in seen]:
+                self._remove(self._entries[entity_id])
+                self.stats['removed'] += 1
+
+            self.refreshed_at = time.monotonic()
+            self.stats['refreshes'] += 1
+
+    def _add(self, entry: _Entry):
+        self._entries[entry.entity_id] = entry
+        for gram in trigrams(entry.text):
+            self._trigrams[gram].add(entry.entity_id)
+        for token in entry.tokens:
+            bisect.insort(self._tokens, (token, entry.entity_id))
+
+    def _remove(self, entry: _Entry):
+        del self._entries[entry.entity_id]
+        for gram in trigrams(entry.text):
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(entry.entity_id)
+                if not postings:
+                    del self._trigrams[gram]
+        for token in entry.tokens:
+            i = bisect.bisect_left(self._tokens, (token, entry.entity_id))
+            if i < len(self._tokens) and self._tokens[i] == (token, entry.entity_id):
+                del self._tokens[i]
+
+    def refresh(self) -> bool:
+        """Fetch all states from Home Assistant and apply the differences
+
+        Returns False, keeping the current entries, if no states came back.
+        """
+        with self._refresh_lock:
+            self._attempted_at = time.monotonic()
+            states = self.ha.get_states()
+            if not states:
+                self.stats['failed_refreshes'] += 1
+                logger.warning("No entity states from Home Assistant, keeping the entity index")
+                return False
+            self.apply(states)
+            return True
+
+    def _ensure_fresh(self):
+        if self._attempted_at is None:
+            self.refresh()
+        elif time.monotonic() - self._attempted_at > self.max_age and not self._refresh_lock.locked():
+            self.refresh_in_background()
+
+    def refresh_in_background(self):
+        threading.Thread(target=self._refresh_quietly, name='entity-index', daemon=True).start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing entity index: {e}")
+
+    def search(self, query: str = '', domains: Optional[Iterable[str]] = None,
+               limit: int = 20, offset: int = 0) -> Dict:
+        """Page through entities matching a query, best matches first
+
+        Queries match the start of entity_id, object id, friendly name or any
+        word in them; queries of three or more characters also match anywhere
+        via the trigram postings.
+        """
+        self._ensure_fresh()
+        query = query.strip().lower()
+        domains = set(domains) if domains else None
+
+        with self._lock:
+            self.stats['searches'] += 1
+            if not query:
+                ranked = {entity_id: RANK_EXACT for entity_id in self._entries}
+            else:
+                ranked = self._match(query)
+
+            entries = [self._entries[entity_id] for entity_id in ranked]
+            if domains:
+                entries = [entry for entry in entries if entry.domain in domains]
+            entries.sort(key=lambda entry: (ranked[entry.entity_id], entry.entity_id))
+            page = [entry.to_dict() for entry in entries[offset:offset + limit]]
+
+        total = len(entries)
+        return {
+            'entities': page,
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': offset + limit if offset + limit < total else None
+        }
+
+    def _match(self, query: str) -> Dict[str, int]:
+        ranked = {}
+        i = bisect.bisect_left(self._tokens, (query, ''))
+        while i < len(self._tokens) and self._tokens[i][0].startswith(query):
+            token, entity_id = self._tokens[i]
+            i += 1
+            if token in self._entries[entity_id].whole:
+                rank = RANK_EXACT if token == query else RANK_PREFIX
+            else:
+                rank = RANK_WORD_PREFIX
+            if rank < ranked.get(entity_id, RANK_SUBSTRING):
+                ranked[entity_id] = rank
+
+        if len(query) >= 3:
+            postings = sorted((self._trigrams.get(gram, set()) for gram in trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings and postings[0] else set()
+            for entity_id in candidates:
+                if entity_id not in ranked and query in self._entries[entity_id].text:
+                    ranked[entity_id] = RANK_SUBSTRING
+        return ranked
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'entities': len(self._entries),
+            'age_seconds': round(time.monotonic() - self.refreshed_at, 1) if self.refreshed_at else None
+        }
+
+def benchmark(entities: int = 2000, searches: int = 1000) -> Dict:
+    """Compare per-request list building with the index for a 2000 entity install
+
+    The old endpoint also fetched every state from Home Assistant per request,
+    which isn't counted in per_request_search_ms.
+    """
+    import random
+
+    rng = random.Random(0)
+    words = ['pump', 'valve', 'solenoid', 'light', 'fan', 'heater', 'drip', 'flood', 'mister', 'relay']
+    rooms = ['veg', 'flower', 'dry', 'clone', 'mother', 'garage', 'kitchen', 'patio']
+    states = []
+    for i in range(entities):
+        domain = rng.choice(('switch', 'switch', 'light', 'sensor', 'valve', 'input_boolean'))
+        room, word = rng.choice(rooms), rng.choice(words)
+        states.append({
+            'entity_id': f'{domain}.{room}_{word}_{i}',
+            'state': rng.choice(('on', 'off')),
+            'attributes': {'friendly_name': f'{room.title()} {word.title()} {i}'}
+        })
+
+    class StaticStates:
+        def get_states(self):
+            return states
+
+    def per_request(query):
+        switches = [s for s in states if s['entity_id'].startswith('switch.')]
+        listing = [{'id': s['entity_id'], 'name': s['attributes'].get('friendly_name', s['entity_id'])}
+                   for s in switches]
+        return [item for item in listing if query in item['id'] or query in item['name'].lower()][:20]
+
+    index = EntityIndex(StaticStates())
+    start = time.perf_counter()
+    index.refresh()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    for state in rng.sample(states, 10):
+        state['attributes'] = {'friendly_name': state['attributes']['friendly_name'] + ' renamed'}
+    start = time.perf_counter()
+    index.refresh()
+    incremental_ms = (time.perf_counter() - start) * 1000
+
+    queries = [rng.choice(words + rooms)[:rng.randint(2, 6)] for _ in range(searches)]
+    results = {'entities': entities, 'indexed': len(index),
+               'build_ms': round(build_ms, 2), 'incremental_refresh_ms': round(incremental_ms, 2)}
+    for label, run in (('per_request', per_request),
+                       ('index', lambda query: index.search(query, limit=20))):
+        start = time.perf_counter()
+        for query in queries:
+            run(query)
+        results[f'{label}_search_ms'] = round((time.perf_counter() - start) / searches * 1000, 3)
+    return results
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
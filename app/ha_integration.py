@@ -4,20 +4,213 @@ Handles communication with Home Assistant API
 """
 
 import os
+import sqlite3
+import threading
+import time
 import requests
 import logging
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from actuation import DEFAULT_WORKERS as ACTUATION_WORKERS
 
 logger = logging.getLogger(__name__)
 
+# (connect, read) timeouts for Home Assistant calls
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Service called per entity domain for each switch action; valves open and close rather than turn on and off
+SWITCH_SERVICES = {
+    'switch': {'turn_on': 'switch/turn_on', 'turn_off': 'switch/turn_off'},
+    'input_boolean': {'turn_on': 'input_boolean/turn_on', 'turn_off': 'input_boolean/turn_off'},
+    'valve': {'turn_on': 'valve/open_valve', 'turn_off': 'valve/close_valve'}
+}
+
+def switch_service(entity_id: str, action: str) -> str:
+    """The service path that performs action on entity_id, falling back to homeassistant.turn_on/off"""
+    domain = entity_id.partition('.')[0]
+    return SWITCH_SERVICES.get(domain, {}).get(action, f'homeassistant/{action}')
+
+class HomeAssistantUnavailable(Exception):
+    """Raised instead of calling Home Assistant while the circuit is open"""
+
+class CircuitBreaker:
+    """Stops calling Home Assistant after repeated failures
+
+    closed -> open after failure_threshold consecutive failures. While open,
+    calls fail immediately; after reset_timeout one trial call is let through
+    (half_open) and its result closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """Check whether a call may be made now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+    
+    def record_success(self) -> bool:
+        """Record a successful call, returning True if this closed the circuit"""
+        with self._lock:
+            was_open = self.state != 'closed'
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+            return was_open
+    
+    def record_failure(self, error: Exception) -> bool:
+        """Record a failed call, returning True if this opened the circuit"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self._trial_in_flight = False
+            if self.state == 'half_open' or (
+                self.state == 'closed' and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                return True
+            return False
+    
+    def get_state(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'open_for_seconds': round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+                'last_error': self.last_error
+            }
+
+class CommandQueue:
+    """Durable queue of switch commands that could not be delivered
+
+    Stored in its own SQLite file so it survives restarts. Stop commands are
+    delivered before start commands, a queued stop cancels any queued start
+    for the same entity, and start commands expire so a pump is never turned
+    on long after its watering window.
+    """
+    
+    PRIORITY = {'turn_off': 0, 'turn_on': 1}
+    
+    def __init__(self, db_path: str = '/data/ha_commands.db', start_ttl: int = 120):
+        self.db_path = db_path
+        self.start_ttl = start_ttl
+        # One connection per thread, kept until the thread exits, as in IrrigationDatabase
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS commands (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    entity_id TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_commands_priority ON commands (priority, id)')
+            conn.commit()
+    
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+        return conn
+    
+    def enqueue(self, entity_id: str, action: str):
+        """Queue a command, replacing any queued command for the same entity"""
+        now = time.time()
+        expires_at = now + self.start_ttl if action == 'turn_on' else None
+        with self._connect() as conn:
+            conn.execute('DELETE FROM commands WHERE entity_id = ?', (entity_id,))
+            conn.execute('''
+                INSERT INTO commands (entity_id, action, priority, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (entity_id, action, self.PRIORITY[action], now, expires_at))
+            conn.commit()
+        logger.warning(f"Queued {action} for {entity_id} until Home Assistant is reachable")
+    
+    def pending(self) -> List[Dict]:
+        """Get unexpired commands, stops first"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM commands WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time(),))
+            conn.commit()
+            rows = conn.execute('SELECT * FROM commands ORDER BY priority, id').fetchall()
+            return [dict(row) for row in rows]
+    
+    def requeue(self, command: Dict):
+        """Put back a claimed command that couldn't be delivered
+
+        It keeps its id and expiry, so a start still lapses at the end of its
+        original window, and is dropped if a newer command for the same entity
+        was queued in the meantime.
+        """
+        if command['expires_at'] is not None and command['expires_at'] < time.time():
+            return
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO commands (id, entity_id, action, priority, created_at, expires_at)
+                SELECT ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM commands WHERE entity_id = ?)
+            ''', (command['id'], command['entity_id'], command['action'], command['priority'],
+                  command['created_at'], command['expires_at'], command['entity_id']))
+            conn.commit()
+    
+    def claim(self, command_id: int) -> bool:
+        """Remove a command before sending it, False if another process took it"""
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM commands WHERE id = ?', (command_id,))
+            conn.commit()
+            return cursor.rowcount == 1
+    
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM commands').fetchone()[0]
+
 class HomeAssistantIntegration:
-    def __init__(self):
+    def __init__(self, queue_path: str = '/data/ha_commands.db', probe_interval: float = 5.0):
         self.ha_url = os.getenv('SUPERVISOR_TOKEN') and 'http://supervisor/core' or 'http://homeassistant:8123'
         self.token = self._get_token()
         self.headers = {
             'Authorization': f'Bearer {self.token}',
             'Content-Type': 'application/json'
         }
+        # Reuse keep-alive connections for all calls to Home Assistant. Switch
+        # commands get their own session so they never queue for a connection
+        # behind state listings and sensor writes.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.actuation_session = requests.Session()
+        self.actuation_session.headers.update(self.headers)
+        # One keep-alive connection per actuation worker
+        self.actuation_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1,
+                                                                              pool_maxsize=ACTUATION_WORKERS))
+        self.breaker = CircuitBreaker()
+        self.command_queue = CommandQueue(queue_path)
+        self.probe_interval = probe_interval
+        self._probe_thread = None
+        self._probe_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._last_states = []
+        self.last_success = None
     
     def _get_token(self) -> str:
         """Get Home Assistant access token"""
@@ -35,76 +228,157 @@ class HomeAssistantIntegration:
         logger.warning("No Home Assistant token found. Please configure authentication.")
         return ""
     
-    def turn_on_switch(self, entity_id: str) -> bool:
-        """Turn on a Home Assistant switch"""
+    def _request(self, method: str, path: str, session: requests.Session = None, **kwargs) -> requests.Response:
+        """Call the Home Assistant API through the circuit breaker"""
+        if not self.breaker.allow():
+            raise HomeAssistantUnavailable('Home Assistant circuit is open')
+        
         try:
-            url = f"{self.ha_url}/api/services/switch/turn_on"
-            data = {"entity_id": entity_id}
-            
-            response = requests.post(url, json=data, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            logger.info(f"Turned on switch: {entity_id}")
+            response = (session or self.session).request(
+                method, f"{self.ha_url}{path}", timeout=REQUEST_TIMEOUT, **kwargs
+            )
+            if response.status_code >= 500:
+                response.raise_for_status()
+        except Exception as e:
+            if self.breaker.record_failure(e):
+                logger.error(f"Home Assistant unreachable, failing fast: {e}")
+                self._start_probe()
+            raise
+        
+        # 4xx means HA is up but rejected this call, which shouldn't trip the breaker
+        self.last_success = datetime.now()
+        if self.breaker.record_success():
+            logger.info("Home Assistant reachable again")
+            self._drain_in_background()
+        response.raise_for_status()
+        return response
+    
+    def _start_probe(self):
+        """Probe Home Assistant in the background until the circuit closes"""
+        with self._probe_lock:
+            if self._probe_thread and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe, name='ha-health-probe', daemon=True)
+            self._probe_thread.start()
+    
+    def _probe(self):
+        while self.breaker.get_state()['state'] != 'closed':
+            time.sleep(self.probe_interval)
+            try:
+                self._request('GET', '/api/')
+            except Exception:
+                continue
+    
+    def _drain_in_background(self):
+        if self.command_queue.count():
+            threading.Thread(target=self.drain_command_queue, name='ha-drain', daemon=True).start()
+    
+    def drain_command_queue(self) -> int:
+        """Deliver queued switch commands, stops first"""
+        delivered = 0
+        with self._drain_lock:
+            for command in self.command_queue.pending():
+                if not self.command_queue.claim(command['id']):
+                    continue
+                if not self._switch(command['entity_id'], command['action'], queued=command):
+                    break
+                delivered += 1
+        
+        if delivered:
+            logger.info(f"Delivered {delivered} queued switch commands")
+        return delivered
+    
+    def check_connection(self) -> bool:
+        """Check that the Home Assistant API is reachable"""
+        try:
+            self._request('GET', '/api/')
+            logger.info("Connected to Home Assistant API")
+            self._drain_in_background()
             return True
             
         except Exception as e:
-            logger.error(f"Failed to turn on switch {entity_id}: {e}")
+            logger.warning(f"Home Assistant API not reachable yet: {e}")
             return False
     
-    def turn_off_switch(self, entity_id: str) -> bool:
-        """Turn off a Home Assistant switch"""
+    def _switch(self, entity_id: str, action: str, queued: Optional[Dict] = None) -> bool:
+        """Send a switch command, queueing it for retry if HA is unavailable
+
+        A command being delivered from the queue is passed as `queued` and put
+        back as it was rather than queued afresh.
+        """
         try:
-            url = f"{self.ha_url}/api/services/switch/turn_off"
-            data = {"entity_id": entity_id}
-            
-            response = requests.post(url, json=data, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            logger.info(f"Turned off switch: {entity_id}")
+            self._request('POST', f'/api/services/{switch_service(entity_id, action)}',
+                          session=self.actuation_session, json={"entity_id": entity_id})
+            logger.info(f"{'Turned on' if action == 'turn_on' else 'Turned off'} switch: {entity_id}")
             return True
             
+        except (HomeAssistantUnavailable, requests.ConnectionError, requests.Timeout) as e:
+            logger.error(f"Failed to {action.replace('_', ' ')} switch {entity_id}: {e}")
+            if queued:
+                self.command_queue.requeue(queued)
+            else:
+                self.command_queue.enqueue(entity_id, action)
+            return False
+        
         except Exception as e:
-            logger.error(f"Failed to turn off switch {entity_id}: {e}")
+            logger.error(f"Failed to {action.replace('_', ' ')} switch {entity_id}: {e}")
             return False
     
+    def turn_on_switch(self, entity_id: str) -> bool:
+        """Turn on a Home Assistant switch"""
+        return self._switch(entity_id, 'turn_on')
+    
+    def turn_off_switch(self, entity_id: str) -> bool:
+        """Turn off a Home Assistant switch"""
+        return self._switch(entity_id, 'turn_off')
+    
     def get_switch_state(self, entity_id: str) -> Dict[str, Any]:
         """Get the state of a Home Assistant switch"""
         try:
-            url = f"{self.ha_url}/api/states/{entity_id}"
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            return response.json()
+            return self._request('GET', f'/api/states/{entity_id}').json()
             
         except Exception as e:
             logger.error(f"Failed to get switch state {entity_id}: {e}")
             return {}
     
-    def get_all_switches(self) -> list:
-        """Get all available switches from Home Assistant"""
+    def get_states(self) -> list:
+        """Get the state of every entity, or the last known states while HA is down"""
         try:
-            url = f"{self.ha_url}/api/states"
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            states = response.json()
-            switches = [
-                state for state in states 
-                if state['entity_id'].startswith('switch.')
-            ]
-            
-            return switches
+            self._last_states = [self._slim_state(state)
+                                 for state in self._request('GET', '/api/states').json()]
+            return self._last_states
             
+        except HomeAssistantUnavailable:
+            return self._last_states
+        
         except Exception as e:
-            logger.error(f"Failed to get switches: {e}")
-            return []
+            logger.error(f"Failed to get states: {e}")
+            return self._last_states
+    
+    @staticmethod
+    def _slim_state(state: Dict) -> Dict:
+        """Keep only what callers read; attributes like forecasts and history dwarf the rest"""
+        slim = {'entity_id': state.get('entity_id', ''), 'state': state.get('state')}
+        name = (state.get('attributes') or {}).get('friendly_name')
+        if name is not None:
+            slim['attributes'] = {'friendly_name': name}
+        return slim
+
+    @property
+    def cached_states(self) -> list:
+        """States from the last successful fetch"""
+        return self._last_states
+
+    def get_all_switches(self) -> list:
+        """Get all available switches from Home Assistant"""
+        return [
+            state for state in self.get_states()
+            if state['entity_id'].startswith('switch.')
+        ]
     
     def create_sensor(self, sensor_id: str, name: str, state: Any, attributes: Dict = None) -> bool:
         """Create or update a sensor in Home Assistant"""
         try:
-            url = f"{self.ha_url}/api/states/sensor.{sensor_id}"
             data = {
                 "state": state,
                 "attributes": {
@@ -115,12 +389,22 @@ class HomeAssistantIntegration:
                 }
             }
             
-            response = requests.post(url, json=data, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            self._request('POST', f'/api/states/sensor.{sensor_id}', json=data)
             
-            logger.info(f"Created/updated sensor: sensor.{sensor_id}")
+            logger.debug(f"Created/updated sensor: sensor.{sensor_id}")
             return True
             
+        except HomeAssistantUnavailable:
+            return False
+        
         except Exception as e:
             logger.error(f"Failed to create sensor {sensor_id}: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def get_health(self) -> Dict:
+        """Get Home Assistant connection health"""
+        return {
+            **self.breaker.get_state(),
+            'last_success': self.last_success.isoformat() if self.last_success else None,
+            'queued_commands': self.command_queue.count()
+        }
@@ -3,24 +3,287 @@ Irrigation Controller - Core logic for managing irrigation systems
 """
 
 import logging
+import os
+import re
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 import schedule
-import time
 import threading
-from database import IrrigationDatabase
+from collections import defaultdict, deque
+from actuation import ActuationExecutor, PRIORITY_RECORD, PRIORITY_STOP, percentiles
+from backup import DatabaseBackup
+from clock import SystemClock
+from database import IrrigationDatabase, WEEKDAYS
+from ha_integration import HomeAssistantIntegration
+from models import Room, Schedule, Zone
+from scheduler import ScheduleRunner
+from sensor_publisher import SensorPublisher
+from sensor_store import SensorStore, SensorMonitor
+from usage_archive import UsageArchive
 
 logger = logging.getLogger(__name__)
 
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
 class IrrigationController:
-    def __init__(self):
-        self.db = IrrigationDatabase()
+    def __init__(self, db: IrrigationDatabase = None, ha: HomeAssistantIntegration = None, clock=None,
+                 actuator: ActuationExecutor = None):
+        self.db = db or IrrigationDatabase()
+        self.ha = ha or HomeAssistantIntegration()
+        # Swapped for a VirtualClock by the simulator
+        self.clock = clock or SystemClock()
+        # All watering starts and stops run here, never on request threads
+        self.actuator = actuator or ActuationExecutor(self.db)
         self.active_waterings = {}
+        self._stop_overshoots = deque(maxlen=1000)
+        # (due_at, ms from due to switched on) for scheduled starts
+        self._start_lags = deque(maxlen=1000)
+        self.schedule_runner = ScheduleRunner(self.db, self.clock, self._fire_schedule)
+        self.publisher = SensorPublisher(self.ha)
+        self.sensor_store = SensorStore()
+        self.sensor_monitor = SensorMonitor(self, self.sensor_store)
+        # Archive and backups sit next to the database, under /data in the add-on
+        data_dir = os.path.dirname(os.path.abspath(self.db.db_path))
+        self.usage_archive = UsageArchive(self.db.db_path, os.path.join(data_dir, 'archive', 'water_usage'))
+        self.backups = DatabaseBackup(
+            self.db.db_path,
+            os.path.join(data_dir, 'backups'),
+            keep=int(os.getenv('BACKUP_KEEP', '7')),
+            compress=os.getenv('BACKUP_COMPRESS', 'true') == 'true'
+        )
+        self._sensor_refresh_timer = None
+        self._sensor_refresh_lock = threading.Lock()
+        # Only the elected leader process runs schedules and drives switches
+        self.is_leader = False
+        # Called after watering starts or stops, e.g. to push Socket.IO updates
+        self.on_change = None
         logger.info("Irrigation controller initialized with database")
     
-    def get_rooms(self) -> List[Dict]:
-        """Get all configured rooms"""
-        return self.db.get_rooms()
+    def become_leader(self, run_phase=None):
+        """Take ownership of schedules, sensor triggers and actuation"""
+        run_phase = run_phase or (lambda name, func: func())
+        self.is_leader = True
+        run_phase('actuation', self.actuator.start)
+        run_phase('recover_waterings', self.recover_active_waterings)
+        run_phase('schedules', self.load_schedules)
+        run_phase('sensor_publisher', self.start_sensor_publishing)
+        run_phase('sensor_monitor', self.sensor_monitor.start)
+        run_phase('usage_archive', self.start_usage_archive)
+        run_phase('backups', self.start_backups)
+        run_phase('scheduler', self.start_scheduler)
+    
+    def recover_active_waterings(self) -> int:
+        """Turn off zones left watering by a previous leader that exited mid-run"""
+        zone_ids = self.db.clear_active_waterings()
+        if not zone_ids:
+            return 0
+        
+        zones = {z.id: z for z in self.db.get_zones()}
+        for zone_id in zone_ids:
+            zone = zones.get(zone_id)
+            if not zone:
+                continue
+            logger.warning(f"Turning off zone {zone.name} left running by a previous process")
+            if zone.pump_entity:
+                self.ha.turn_off_switch(zone.pump_entity)
+            if zone.solenoid_entity:
+                self.ha.turn_off_switch(zone.solenoid_entity)
+        
+        return len(zone_ids)
+    
+    def start_usage_archive(self):
+        """Archive closed days of water usage now and every night"""
+        if not self.usage_archive.available:
+            logger.info("pyarrow not installed, usage archive disabled")
+            return
+        schedule.every().day.at('00:15').do(self._archive_usage_in_background).tag('usage_archive')
+        self._archive_usage_in_background()
+    
+    def _archive_usage_in_background(self):
+        threading.Thread(target=self.usage_archive.archive_closed_days, name='usage-archive', daemon=True).start()
+    
+    def start_backups(self):
+        """Back up the database every night"""
+        schedule.every().day.at('03:30').do(self._backup_in_background).tag('backups')
+    
+    def _backup_in_background(self):
+        threading.Thread(target=self.backups.create, name='backup', daemon=True).start()
+    
+    def restore_backup(self, name: str) -> Dict:
+        """Replace the database with a stored backup and reload state from it"""
+        if self.active_waterings or self.db.get_active_watering_zone_ids():
+            return {'success': False, 'error': 'Wait for active waterings to finish before restoring'}
+        
+        result = self.backups.restore(name)
+        if result['success']:
+            self.usage_archive.reconcile()
+            self.reload_state()
+        return result
+    
+    def reload_state(self):
+        """Re-read state cached from the database after it was replaced"""
+        # Brings older backups up to the current schema and schedule index
+        self.db.init_database()
+        # Claims in the backup are from whenever it was taken
+        self.db.clear_active_waterings()
+        if self.is_leader:
+            self.sensor_monitor.reload_bindings()
+            if self.publisher.running:
+                self.publish_sensors()
+        self._notify_change()
+        logger.info("Reloaded controller state from the database")
+    
+    def start_scheduler(self):
+        """Start the thread that runs due schedules and queued watering requests"""
+        threading.Thread(target=self._run_scheduler, name='scheduler', daemon=True).start()
+        logger.info("Schedule runner started")
+    
+    def _run_scheduler(self):
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Error in schedule runner: {e}")
+            self.clock.sleep(1)
+    
+    def run_pending(self):
+        """Run due housekeeping jobs, due schedules, and queued watering requests and sensor samples"""
+        schedule.run_pending()
+        self.schedule_runner.tick()
+        self.sensor_monitor.sync()
+        for request in self.db.take_actuation_requests():
+            self.actuator.submit(self._execute_watering, request['zone_id'], request['duration'], 'manual',
+                                 key=request['zone_id'])
+    
+    def _fire_schedule(self, firing: Dict):
+        self.actuator.submit(self._execute_watering, firing['zone_id'], firing['duration'], 'schedule',
+                             firing['fire_at'], key=firing['zone_id'])
+    
+    def request_watering(self, zone_id: str, duration: int, source: str) -> Dict:
+        """Water a zone here if this is the leader, otherwise hand it to the leader"""
+        if self.is_leader:
+            self.actuator.submit(self._execute_watering, zone_id, duration, source, key=zone_id)
+            return {'success': True}
+        return self.db.enqueue_actuation(zone_id, duration)
+    
+    def _notify_change(self):
+        if self.on_change:
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"Error notifying status change: {e}")
+    
+    def start_sensor_publishing(self):
+        """Start publishing zone and room sensors to Home Assistant"""
+        self.publisher.start()
+        schedule.every(1).minutes.do(self.publish_sensors).tag('sensors')
+        self.publish_sensors()
+    
+    def publish_sensors(self):
+        """Queue the current state of every zone and room sensor"""
+        stats = self.db.get_water_usage_stats()
+        next_by_zone = self.db.get_next_firing_by_zone(self.clock.now())
+        zones = self.db.get_zones()
+        
+        next_by_room = {}
+        for zone in zones:
+            fire_at = next_by_zone.get(zone.id)
+            if fire_at and (zone.room_id not in next_by_room or fire_at < next_by_room[zone.room_id]):
+                next_by_room[zone.room_id] = fire_at
+        
+        zone_water = {z['id']: z['water_used'] for z in stats['zones']}
+        for zone in zones:
+            self._publish_zone_watering(zone)
+            fire_at = next_by_zone.get(zone.id)
+            self.publisher.publish(
+                f"{self._sensor_prefix('zone', zone.id)}_water_today",
+                f"{zone.name} Water Today",
+                round(zone_water.get(zone.id, 0), 2),
+                {'unit': 'L', 'device_class': 'water', 'zone_id': zone.id}
+            )
+            self.publisher.publish(
+                f"{self._sensor_prefix('zone', zone.id)}_next_run",
+                f"{zone.name} Next Run",
+                fire_at.astimezone().isoformat() if fire_at else 'unknown',
+                {'device_class': 'timestamp', 'zone_id': zone.id}
+            )
+        
+        for room in stats['rooms']:
+            self._publish_room_watering(room['id'], room['name'])
+            fire_at = next_by_room.get(room['id'])
+            self.publisher.publish(
+                f"{self._sensor_prefix('room', room['id'])}_water_today",
+                f"{room['name']} Water Today",
+                round(room['water_used'], 2),
+                {'unit': 'L', 'device_class': 'water', 'room_id': room['id']}
+            )
+            self.publisher.publish(
+                f"{self._sensor_prefix('room', room['id'])}_next_run",
+                f"{room['name']} Next Run",
+                fire_at.astimezone().isoformat() if fire_at else 'unknown',
+                {'device_class': 'timestamp', 'room_id': room['id']}
+            )
+    
+    def _publish_zone_watering(self, zone: Zone):
+        """Queue the watering state sensor for a zone"""
+        self.publisher.publish(
+            f"{self._sensor_prefix('zone', zone.id)}_watering",
+            f"{zone.name} Watering",
+            'on' if zone.id in self.active_waterings else 'off',
+            {'zone_id': zone.id, 'room_id': zone.room_id}
+        )
+    
+    def _publish_room_watering(self, room_id: str, room_name: str):
+        """Queue the watering state sensor for a room"""
+        active_count = sum(
+            1 for watering in list(self.active_waterings.values())
+            if watering['zone'].room_id == room_id
+        )
+        self.publisher.publish(
+            f"{self._sensor_prefix('room', room_id)}_watering",
+            f"{room_name} Watering",
+            'on' if active_count else 'off',
+            {'room_id': room_id, 'active_zones': active_count}
+        )
+    
+    def _schedule_sensor_refresh(self, delay: float = 2.0):
+        """Refresh all sensors shortly, folding bursts of changes into one refresh"""
+        if not self.publisher.running:
+            return
+        with self._sensor_refresh_lock:
+            if self._sensor_refresh_timer is not None:
+                return
+            
+            def refresh():
+                with self._sensor_refresh_lock:
+                    self._sensor_refresh_timer = None
+                try:
+                    self.publish_sensors()
+                except Exception as e:
+                    logger.error(f"Error refreshing sensors: {e}")
+            
+            def queue_refresh():
+                # Off the shared timer thread so stop timers aren't held up
+                self.actuator.submit(refresh, priority=PRIORITY_RECORD)
+            
+            self._sensor_refresh_timer = self.clock.call_later(delay, queue_refresh)
+    
+    @staticmethod
+    def _sensor_prefix(kind: str, item_id: str) -> str:
+        return f"irrigation_{kind}_{item_id.replace('-', '')[:8]}"
+    
+    def load_schedules(self) -> int:
+        """Start firing active schedules from the schedule_times index"""
+        schedules = [s for s in self.db.get_schedules() if s.active]
+        self.schedule_runner.start()
+        logger.info(f"Loaded {len(schedules)} schedules")
+        return len(schedules)
+    
+    def get_rooms(self, **query) -> List[Room]:
+        """Get configured rooms, optionally filtered and paged"""
+        return self.db.get_rooms(**query)
     
     def create_room(self, room_data: Dict) -> Dict:
         """Create a new room"""
@@ -47,9 +310,9 @@ class IrrigationController:
         """Delete a room"""
         return self.db.delete_room(room_id)
     
-    def get_zones(self) -> List[Dict]:
-        """Get all irrigation zones"""
-        return self.db.get_zones()
+    def get_zones(self, **query) -> List[Zone]:
+        """Get irrigation zones, optionally filtered and paged"""
+        return self.db.get_zones(**query)
     
     def create_zone(self, zone_data: Dict) -> Dict:
         """Create a new irrigation zone"""
@@ -64,9 +327,9 @@ class IrrigationController:
         
         return self.db.create_zone(name, room_id, plant_count, pump_entity, solenoid_entity)
     
-    def get_schedules(self) -> List[Dict]:
-        """Get all irrigation schedules"""
-        return self.db.get_schedules()
+    def get_schedules(self, **query) -> List[Schedule]:
+        """Get irrigation schedules, optionally filtered and paged"""
+        return self.db.get_schedules(**query)
     
     def create_schedule(self, schedule_data: Dict) -> Dict:
         """Create a new irrigation schedule"""
@@ -80,119 +343,366 @@ class IrrigationController:
         if not name or not zone_id or not times:
             return {'success': False, 'error': 'Schedule name, zone, and times are required'}
         
-        result = self.db.create_schedule(name, zone_id, duration, frequency, times, days)
+        # The schedule runner picks it up from schedule_times on its next tick
+        return self.db.create_schedule(name, zone_id, duration, frequency, times, days)
+    
+    def get_zone_sensors(self, zone_id: str = None) -> List[Dict]:
+        """Get sensor bindings, optionally for one zone"""
+        return self.db.get_zone_sensors(zone_id)
+    
+    def create_zone_sensor(self, zone_id: str, binding_data: Dict) -> Dict:
+        """Bind a moisture or EC sensor to a zone"""
+        entity_id = binding_data.get('entity_id', '')
+        kind = binding_data.get('kind', 'moisture')
+        min_value = binding_data.get('min_value')
+        max_value = binding_data.get('max_value')
         
-        if result['success']:
-            # Register with scheduler
-            self._register_schedule(result['schedule'])
+        if not entity_id.startswith('sensor.'):
+            return {'success': False, 'error': 'A sensor entity is required'}
+        if kind not in ('moisture', 'ec'):
+            return {'success': False, 'error': "Sensor kind must be 'moisture' or 'ec'"}
+        if min_value is None and max_value is None:
+            return {'success': False, 'error': 'At least one of min_value or max_value is required'}
+        
+        result = self.db.create_zone_sensor(
+            zone_id, entity_id, kind, min_value, max_value,
+            binding_data.get('window', 30), binding_data.get('duration', 5), binding_data.get('cooldown', 60)
+        )
+        
+        # Other workers' changes reach the leader through the bindings version
+        if result['success'] and self.is_leader:
+            self.sensor_monitor.reload_bindings()
         
         return result
     
-    def _register_schedule(self, schedule_config: Dict):
-        """Register schedule with the scheduler"""
-        zone_id = schedule_config['zone_id']
-        duration = schedule_config['duration']
-        
-        for time_str in schedule_config['times']:
-            if schedule_config['frequency'] == 'daily':
-                schedule.every().day.at(time_str).do(
-                    self._execute_watering, zone_id, duration
-                )
-            elif schedule_config['frequency'] == 'weekly':
-                for day in schedule_config['days']:
-                    getattr(schedule.every(), day.lower()).at(time_str).do(
-                        self._execute_watering, zone_id, duration
-                    )
-    
-    def _execute_watering(self, zone_id: str, duration: int):
-        """Execute watering for a zone"""
-        zones = self.db.get_zones()
-        zone = next((z for z in zones if z['id'] == zone_id), None)
+    def delete_zone_sensor(self, binding_id: str) -> Dict:
+        """Remove a sensor binding"""
+        result = self.db.delete_zone_sensor(binding_id)
+        # Other workers' changes reach the leader through the bindings version
+        if result['success'] and self.is_leader:
+            self.sensor_monitor.reload_bindings()
+        return result
+    
+    def get_sensor_stats(self, entity_id: str) -> Dict:
+        """Get rolling statistics for a sensor, as the leader last stored them on other workers"""
+        if self.is_leader:
+            return self.sensor_store.stats(entity_id)
+        return self.db.get_sensor_stats(entity_id)
+    
+    def ingest_sensor_samples(self, samples: List[Dict]) -> Dict:
+        """Record pushed sensor samples and evaluate watering triggers, or hand them to the leader"""
+        try:
+            rows = [
+                (sample['entity_id'], float(sample['value']),
+                 float(sample['timestamp']) if sample.get('timestamp') is not None else None)
+                for sample in samples
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            return {'success': False, 'error': f'Invalid sample: {e}'}
+        
+        if not self.is_leader:
+            # Stamped now so samples keep their time while they wait in the queue
+            now = time.time()
+            return self.db.enqueue_sensor_samples([
+                (entity_id, value, timestamp if timestamp is not None else now)
+                for entity_id, value, timestamp in rows
+            ])
+        
+        count = self.sensor_store.ingest_many(rows)
+        self.sensor_monitor.share_stats(entity_id for entity_id, _, _ in rows)
+        triggered = self.sensor_monitor.evaluate()
+        return {'success': True, 'ingested': count, 'triggered_zones': triggered}
+    
+    def get_upcoming_waterings(self, limit: int = 10, after: datetime = None) -> List[Dict]:
+        """Get the next scheduled waterings across all zones"""
+        firings = self.db.get_next_firings(after or self.clock.now(), limit)
+        return [{**firing, 'fire_at': firing['fire_at'].isoformat()} for firing in firings]
+    
+    def import_config(self, config: Dict, dry_run: bool = False) -> Dict:
+        """Validate and import rooms, zones and schedules in one transaction
+        
+        Zones may reference rooms by `room_id` or by `room` name, and schedules
+        may reference zones by `zone_id` or `zone` name. Everything is validated
+        before anything is written.
+        """
+        rooms_in = config.get('rooms') or []
+        zones_in = config.get('zones') or []
+        schedules_in = config.get('schedules') or []
+        errors = []
+        
+        if not isinstance(rooms_in, list) or not isinstance(zones_in, list) or not isinstance(schedules_in, list):
+            return {'success': False, 'errors': ['rooms, zones and schedules must be lists']}
+        
+        room_names = self.db.get_ids('rooms')
+        zone_names = self.db.get_ids('zones')
+        
+        rooms = []
+        for i, room in enumerate(rooms_in):
+            if not isinstance(room, dict) or not room.get('name'):
+                errors.append(f"rooms[{i}]: Room name is required")
+                continue
+            room_id = room.get('id') or str(uuid.uuid4())
+            room_names[room_id] = room['name']
+            rooms.append({
+                'id': room_id,
+                'name': room['name'],
+                'type': room.get('type', 'vegetative'),
+                'description': room.get('description', '')
+            })
+        
+        zones = []
+        for i, zone in enumerate(zones_in):
+            if not isinstance(zone, dict) or not zone.get('name'):
+                errors.append(f"zones[{i}]: Zone name is required")
+                continue
+            room_id, error = self._resolve_reference(zone, 'room', room_names)
+            if error:
+                errors.append(f"zones[{i}]: {error}")
+                continue
+            plant_count = zone.get('plant_count', 1)
+            if not isinstance(plant_count, int) or plant_count < 1:
+                errors.append(f"zones[{i}]: plant_count must be a positive integer")
+                continue
+            zone_id = zone.get('id') or str(uuid.uuid4())
+            zone_names[zone_id] = zone['name']
+            zones.append({
+                'id': zone_id,
+                'name': zone['name'],
+                'room_id': room_id,
+                'plant_count': plant_count,
+                'pump_entity': zone.get('pump_entity', ''),
+                'solenoid_entity': zone.get('solenoid_entity', ''),
+                'flow_rate': zone.get('flow_rate', 2.0 * 2 * plant_count),
+                'active': 1 if zone.get('active', True) else 0
+            })
+        
+        schedules = []
+        for i, schedule_data in enumerate(schedules_in):
+            if not isinstance(schedule_data, dict) or not schedule_data.get('name'):
+                errors.append(f"schedules[{i}]: Schedule name is required")
+                continue
+            zone_id, error = self._resolve_reference(schedule_data, 'zone', zone_names)
+            if error:
+                errors.append(f"schedules[{i}]: {error}")
+                continue
+            error = self._validate_schedule_timing(schedule_data)
+            if error:
+                errors.append(f"schedules[{i}]: {error}")
+                continue
+            schedules.append({
+                'id': schedule_data.get('id') or str(uuid.uuid4()),
+                'name': schedule_data['name'],
+                'zone_id': zone_id,
+                'duration': schedule_data.get('duration', 5),
+                'frequency': schedule_data.get('frequency', 'daily'),
+                'times': list(schedule_data['times']),
+                'days': [day.lower() for day in schedule_data.get('days') or []],
+                'active': 1 if schedule_data.get('active', True) else 0
+            })
+        
+        if errors:
+            return {'success': False, 'errors': errors}
+        
+        if dry_run:
+            return {
+                'success': True,
+                'dry_run': True,
+                'imported': {'rooms': len(rooms), 'zones': len(zones), 'schedules': len(schedules)}
+            }
+        
+        return self.db.bulk_import(rooms, zones, schedules)
+    
+    def export_config(self) -> Dict:
+        """Export rooms, zones and schedules in the import format"""
+        config = self.db.export_config()
+        config['version'] = 1
+        return config
+    
+    def _resolve_reference(self, item: Dict, kind: str, names: Dict[str, str]):
+        """Resolve a `<kind>_id` or `<kind>` name reference to an id"""
+        ref_id = item.get(f'{kind}_id')
+        if ref_id:
+            if ref_id not in names:
+                return None, f"{kind.capitalize()} {ref_id} not found"
+            return ref_id, None
+        
+        ref_name = item.get(kind)
+        if not ref_name:
+            return None, f"{kind.capitalize()} is required"
+        
+        matches = [id_ for id_, name in names.items() if name == ref_name]
+        if not matches:
+            return None, f"{kind.capitalize()} '{ref_name}' not found"
+        if len(matches) > 1:
+            return None, f"{kind.capitalize()} name '{ref_name}' is ambiguous, use {kind}_id"
+        return matches[0], None
+    
+    def _validate_schedule_timing(self, schedule_data: Dict) -> str:
+        """Validate schedule times, days, frequency and duration"""
+        times = schedule_data.get('times')
+        if not times or not isinstance(times, list):
+            return 'Schedule times are required'
+        bad_times = [t for t in times if not isinstance(t, str) or not TIME_PATTERN.match(t)]
+        if bad_times:
+            return f"Invalid times {bad_times}, expected HH:MM"
+        
+        frequency = schedule_data.get('frequency', 'daily')
+        if frequency not in ('daily', 'weekly'):
+            return f"Invalid frequency '{frequency}'"
+        
+        days = schedule_data.get('days') or []
+        if frequency == 'weekly' and not days:
+            return 'Weekly schedules require days'
+        bad_days = [d for d in days if not isinstance(d, str) or d.lower() not in WEEKDAYS]
+        if bad_days:
+            return f"Invalid days {bad_days}"
+        
+        duration = schedule_data.get('duration', 5)
+        if not isinstance(duration, (int, float)) or duration <= 0:
+            return 'Duration must be a positive number'
+        
+        return None
+    
+    def _execute_watering(self, zone_id: str, duration: int, source: str = 'schedule', due_at: datetime = None):
+        """Execute watering for a zone; due_at is when a scheduled firing was due"""
+        zone = self.db.get_zone(zone_id)
         
         if not zone:
             logger.error(f"Zone {zone_id} not found")
             return
         
-        if not zone['active']:
-            logger.info(f"Zone {zone['name']} is inactive, skipping watering")
+        if not zone.active:
+            logger.info(f"Zone {zone.name} is inactive, skipping watering")
+            return
+        
+        if not self.db.claim_active_watering(zone_id, duration, source):
+            logger.info(f"Zone {zone.name} is already watering, skipping {source} watering")
             return
         
-        logger.info(f"Starting watering for zone {zone['name']} for {duration} minutes")
+        logger.info(f"Starting watering for zone {zone.name} for {duration} minutes")
         
         # Start watering
         self.active_waterings[zone_id] = {
-            'start_time': datetime.now(),
+            'start_time': self.clock.now(),
+            'stop_deadline': self.clock.monotonic() + duration * 60,
             'duration': duration,
             'zone': zone
         }
         
         # Turn on pump and solenoid via Home Assistant
-        from ha_integration import HomeAssistantIntegration
-        ha = HomeAssistantIntegration()
+        if zone.pump_entity:
+            self.ha.turn_on_switch(zone.pump_entity)
+        if zone.solenoid_entity:
+            self.ha.turn_on_switch(zone.solenoid_entity)
+        if due_at:
+            self._start_lags.append((due_at, (self.clock.now() - due_at).total_seconds() * 1000))
         
-        if zone['pump_entity']:
-            ha.turn_on_switch(zone['pump_entity'])
-        if zone['solenoid_entity']:
-            ha.turn_on_switch(zone['solenoid_entity'])
+        self._publish_zone_watering(zone)
+        self._publish_room_watering(zone.room_id, zone.room_name)
+        self._notify_change()
         
-        # Schedule stop
-        def stop_watering():
-            time.sleep(duration * 60)  # Convert to seconds
-            self._stop_watering(zone_id)
-        
-        threading.Thread(target=stop_watering, daemon=True).start()
+        self.clock.call_later(duration * 60, self._stop_when_due, zone_id)
+    
+    def _stop_when_due(self, zone_id: str):
+        """Timer callback: hand the stop to the actuation thread ahead of any queued starts"""
+        self.actuator.submit(self._stop_watering, zone_id, priority=PRIORITY_STOP, key=zone_id)
     
     def _stop_watering(self, zone_id: str):
         """Stop watering for a zone"""
-        if zone_id not in self.active_waterings:
+        watering = self.active_waterings.get(zone_id)
+        if not watering or watering.get('stopped'):
             return
-        
-        watering = self.active_waterings[zone_id]
+        watering['stopped'] = True
         zone = watering['zone']
         
-        logger.info(f"Stopping watering for zone {zone['name']}")
+        overshoot_ms = (self.clock.monotonic() - watering['stop_deadline']) * 1000
+        self._stop_overshoots.append(overshoot_ms)
+        logger.info(f"Stopping watering for zone {zone.name} ({overshoot_ms:.0f}ms after deadline)")
         
         # Turn off pump and solenoid
-        from ha_integration import HomeAssistantIntegration
-        ha = HomeAssistantIntegration()
+        if zone.pump_entity:
+            self.ha.turn_off_switch(zone.pump_entity)
+        if zone.solenoid_entity:
+            self.ha.turn_off_switch(zone.solenoid_entity)
         
-        if zone['pump_entity']:
-            ha.turn_off_switch(zone['pump_entity'])
-        if zone['solenoid_entity']:
-            ha.turn_off_switch(zone['solenoid_entity'])
+        # The valve is closed; bookkeeping can wait behind other stops and starts
+        self.actuator.submit(self._record_watering, zone_id, priority=PRIORITY_RECORD, key=zone_id)
+    
+    def _record_watering(self, zone_id: str):
+        """Log usage and release the zone once its switches are off"""
+        watering = self.active_waterings.get(zone_id)
+        if not watering:
+            return
+        zone = watering['zone']
         
         # Calculate water usage
         duration_hours = watering['duration'] / 60
-        water_used = zone['flow_rate'] * duration_hours
+        water_used = zone.flow_rate * duration_hours
         
         # Log water usage to database
-        self.db.log_water_usage(zone_id, zone['room_id'], water_used, watering['duration'])
+        self.db.log_water_usage(zone_id, zone.room_id, water_used, watering['duration'])
         
         # Remove from active waterings
         del self.active_waterings[zone_id]
+        self.db.release_active_watering(zone_id)
+        
+        self._publish_zone_watering(zone)
+        self._publish_room_watering(zone.room_id, zone.room_name)
+        self._schedule_sensor_refresh()
+        self._notify_change()
         
-        logger.info(f"Watering completed for zone {zone['name']}, used {water_used:.2f}L")
+        logger.info(f"Watering completed for zone {zone.name}, used {water_used:.2f}L")
     
     def manual_water(self, zone_id: str, duration: int) -> Dict:
         """Manually trigger watering"""
-        zones = self.db.get_zones()
-        zone = next((z for z in zones if z['id'] == zone_id), None)
-        
-        if not zone:
+        if not self.db.get_zone(zone_id):
             return {'success': False, 'error': 'Zone not found'}
         
-        if zone_id in self.active_waterings:
+        if zone_id in self.db.get_active_watering_zone_ids():
             return {'success': False, 'error': 'Zone is already watering'}
         
-        self._execute_watering(zone_id, duration)
+        result = self.request_watering(zone_id, duration, 'manual')
+        if not result['success']:
+            return result
         return {'success': True, 'message': f'Started manual watering for {duration} minutes'}
     
     def get_status(self) -> Dict:
         """Get current system status"""
-        status = self.db.get_system_status()
-        status['active_zones'] = list(self.active_waterings.keys())
+        status = self.db.get_system_status(self.clock.now())
+        status['active_zones'] = self.db.get_active_watering_zone_ids()
+        status['is_leader'] = self.is_leader
+        status['schedule_runner'] = self.schedule_runner.get_stats()
+        status['actuation'] = self.get_actuation_stats()
+        status['home_assistant'] = self.ha.get_health()
+        status['sensor_publisher'] = self.publisher.get_stats()
+        status['sensor_monitor'] = self.sensor_monitor.get_status()
         return status
     
+    def get_actuation_stats(self) -> Dict:
+        """Get actuation queue stats, how late recent starts and stops were, and start skew
+        
+        Skew is the spread of start lags among zones due in the same minute.
+        """
+        batches = defaultdict(list)
+        for due_at, lag_ms in list(self._start_lags):
+            batches[due_at].append(lag_ms)
+        return {
+            **self.actuator.get_stats(),
+            'start_lag_ms': percentiles([lag for lags in batches.values() for lag in lags]),
+            'start_skew_ms': percentiles([max(lags) - min(lags) for lags in batches.values() if len(lags) > 1]),
+            'stop_overshoot_ms': percentiles(list(self._stop_overshoots))
+        }
+    
+    def get_usage_analytics(self, group_by: str, start: str = None, end: str = None) -> Dict:
+        """Aggregate archived water usage"""
+        try:
+            start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+            end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+        except ValueError:
+            return {'success': False, 'error': 'Dates must be YYYY-MM-DD'}
+        
+        return self.usage_archive.query_usage(group_by, start_date, end_date)
+    
     def get_detailed_stats(self) -> Dict:
         """Get detailed statistics with room and zone breakdowns"""
         return self.db.get_water_usage_stats()
\ No newline at end of file
@@ -5,35 +5,88 @@ Main application entry point
 """
 
 import os
-import sys
-import json
-import yaml
 import logging
 import argparse
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify
+from datetime import datetime
+from flask import Flask, Response, g, render_template, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_socketio import SocketIO, emit
-import requests
-import schedule
-import time
 import threading
+import models
+from admission import AdmissionGate
+from assets import AssetManifest
+from coordination import LeaderElection
+from diagnostics import MemoryTracer, rss_bytes, subsystem_counters
+from entity_index import EntityIndex
+from startup import StartupTracker, start_services
 
 # Setup logging first
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ModelJSONProvider(DefaultJSONProvider):
+    """Serializes the slotted database models in API responses"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, models.Model):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+    
+    def dumps(self, obj, **kwargs):
+        return super().dumps(models.to_plain(obj), **kwargs)
+
 # Initialize Flask app
 app = Flask(__name__, template_folder='/www/templates', static_folder='/www/static')
+app.json = ModelJSONProvider(app)
 app.config['SECRET_KEY'] = 'irrigation_secret_key'
 
+# Fingerprinted bundles built by www/build.js; templates use asset_url('js/app.js')
+assets = AssetManifest()
+app.jinja_env.globals['asset_url'] = assets.url
+
+# Tracks startup phases; API routes are gated on it being ready
+startup_tracker = StartupTracker()
+
 # Add logging for static file requests
 @app.before_request
 def log_request_info():
-    if request.path.startswith('/static/'):
-        logger.info(f"Static file request: {request.path}")
+    if request.path.startswith('/static/') or request.path.startswith('/src/'):
+        logger.debug(f"Static file request: {request.path}")
     elif request.path.startswith('/api/'):
         logger.info(f"API request: {request.method} {request.path}")
 
+# Reject API calls until the controller is ready rather than returning empty data
+@app.before_request
+def require_ready():
+    if request.path.startswith('/api/') and not startup_tracker.is_ready:
+        report = startup_tracker.report()
+        response = jsonify({'success': False, 'error': 'Service is starting', 'status': report['status']})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+# Bound concurrent API reads so dashboards can't crowd out watering. Status
+# stays answerable under load (it reports the gate's own counters), as do the
+# /health probes, which are outside /api/.
+read_gate = AdmissionGate(limit=int(os.getenv('READ_CONCURRENCY', '4')))
+UNGATED_READS = {'/api/status'}
+
+@app.before_request
+def admit_reads():
+    if request.method == 'GET' and request.path.startswith('/api/') and request.path not in UNGATED_READS:
+        if not read_gate.try_enter():
+            response = jsonify({'success': False, 'error': 'Server busy, retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        g.read_admitted = True
+
+@app.teardown_request
+def release_read(exc):
+    if g.pop('read_admitted', False):
+        read_gate.leave()
+
 # Configure for Home Assistant ingress
 @app.after_request
 def after_request(response):
@@ -42,21 +95,15 @@ def after_request(response):
     response.headers['Content-Security-Policy'] = "frame-ancestors 'self'"
     return response
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Initialize SocketIO. With several worker processes a message queue relays
+# events emitted by the scheduler process to clients connected to any worker.
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'))
 
-# Global controller instance (initialize later to avoid startup delays)
+# Global controller instance (initialized by start_services in the background)
 controller = None
 ha_integration = None
-
-# Import modules after Flask setup to catch any import errors
-try:
-    from irrigation_controller import IrrigationController
-    from ha_integration import HomeAssistantIntegration
-    logger.info("Successfully imported irrigation modules")
-except Exception as e:
-    logger.error(f"Error importing modules: {e}")
-    # Continue anyway to get basic web interface running
+entity_index = None
+memory_tracer = MemoryTracer()
 
 @app.route('/')
 def index():
@@ -68,12 +115,43 @@ def index():
         logger.error(f"Error rendering index template: {e}")
         return f"<h1>Smart Irrigation Controller</h1><p>Template error: {e}</p><p><a href='/health'>Health Check</a></p><p><a href='/test-js'>Test JavaScript</a></p>"
 
+@app.route('/static/dist/<path:filename>')
+def static_dist(filename):
+    """Serve built assets with immutable caching and precompressed encodings"""
+    return assets.send_dist(filename)
+
+@app.route('/vendor/socket.io.js')
+def vendor_socketio():
+    """Serve the bundled Socket.IO client at a fixed URL for the dashboard cards"""
+    return assets.send_named('js/socket.io.js')
+
+@app.route('/src/<path:filename>')
+def static_src(filename):
+    """Serve unbuilt assets when no build is present"""
+    return assets.send_src(filename)
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
     logger.info("Health check accessed")
     return {'status': 'ok', 'service': 'Smart Irrigation Controller', 'timestamp': datetime.now().isoformat()}
 
+@app.route('/health/live')
+def health_live():
+    """Liveness probe - the web server is up"""
+    return {'status': 'alive', 'timestamp': datetime.now().isoformat()}
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness probe - the controller can serve API requests"""
+    report = startup_tracker.report()
+    return jsonify(report), (200 if startup_tracker.is_ready else 503)
+
+@app.route('/health/startup')
+def health_startup():
+    """Startup phase timing report"""
+    return jsonify(startup_tracker.report())
+
 @app.route('/debug')
 def debug_menu():
     """Debug menu for troubleshooting"""
@@ -87,7 +165,9 @@ def debug_menu():
             <li><a href="/debug/test-db">Test Database Connection</a></li>
             <li><a href="/debug/create-test-room">Create Test Room</a></li>
             <li><a href="/debug/list-rooms">List All Rooms</a></li>
+            <li><a href="/debug/memory">Memory and Subsystem Counters</a></li>
             <li><a href="/health">Health Check</a></li>
+            <li><a href="/health/startup">Startup Timing Report</a></li>
             <li><a href="/">Back to Main App</a></li>
         </ul>
         <hr>
@@ -114,21 +194,56 @@ def debug_menu():
     </html>
     '''
 
+def active_arg():
+    value = request.args.get('active')
+    return None if value is None else int(value in ('1', 'true'))
+
+def list_response(model, fetch, **filters):
+    """Serve a listing, filtered and optionally paged, with optional sparse fields
+    
+    Without `limit` or `cursor` the whole list is returned as before. With
+    either, one page is returned as {items, next_cursor, limit}; pass
+    next_cursor back as `cursor` for the next page. `fields=id,name` limits
+    each item to those fields.
+    """
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    unknown = [field for field in fields if field not in model.__slots__]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    paged = 'limit' in request.args or 'cursor' in request.args
+    after, limit = None, None
+    if paged:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        if request.args.get('cursor'):
+            try:
+                after = models.decode_cursor(request.args['cursor'])
+            except ValueError:
+                after = None
+            if not after or len(after) != len(model.sort_fields):
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    
+    # One extra row tells whether there is a next page
+    items = fetch(**filters, after=after, limit=limit + 1 if limit else None)
+    next_cursor = None
+    if limit and len(items) > limit:
+        items = items[:limit]
+        next_cursor = models.encode_cursor(items[-1].sort_key())
+    
+    body = [item.to_dict(fields) for item in items] if fields else items
+    if not paged:
+        return jsonify(body)
+    return jsonify({'items': body, 'next_cursor': next_cursor, 'limit': limit})
+
 @app.route('/api/rooms', methods=['GET'])
 def get_rooms():
-    """Get all configured rooms"""
-    if controller is None:
-        return jsonify({'error': 'Controller not initialized yet', 'rooms': []})
-    return jsonify(controller.get_rooms())
+    """Get configured rooms (`type`, paging and `fields` are optional)"""
+    return list_response(models.Room, controller.get_rooms, room_type=request.args.get('type'))
 
 @app.route('/api/rooms', methods=['POST'])
 def create_room():
     """Create a new room"""
     logger.info("Create room API called")
-    if controller is None:
-        logger.error("Controller not initialized")
-        return jsonify({'success': False, 'error': 'Controller not initialized yet'})
-    
     data = request.json
     logger.info(f"Room data received: {data}")
     
@@ -142,41 +257,129 @@ def create_room():
 
 @app.route('/api/zones', methods=['GET'])
 def get_zones():
-    """Get all zones"""
-    if controller is None:
-        return jsonify([])
-    return jsonify(controller.get_zones())
+    """Get zones (`room_id`, `type`, `active`, `pump_entity`, paging and `fields` are optional)"""
+    return list_response(
+        models.Zone, controller.get_zones,
+        room_id=request.args.get('room_id'),
+        room_type=request.args.get('type'),
+        active=active_arg(),
+        pump_entity=request.args.get('pump_entity')
+    )
 
 @app.route('/api/zones', methods=['POST'])
 def create_zone():
     """Create a new irrigation zone"""
-    if controller is None:
-        return jsonify({'success': False, 'error': 'Controller not initialized yet'})
     data = request.json
     result = controller.create_zone(data)
     return jsonify(result)
 
 @app.route('/api/schedules', methods=['GET'])
 def get_schedules():
-    """Get all irrigation schedules"""
-    if controller is None:
-        return jsonify([])
-    return jsonify(controller.get_schedules())
+    """Get schedules (`zone_id`, `room_id`, `type`, `active`, paging and `fields` are optional)"""
+    return list_response(
+        models.Schedule, controller.get_schedules,
+        zone_id=request.args.get('zone_id'),
+        room_id=request.args.get('room_id'),
+        room_type=request.args.get('type'),
+        active=active_arg()
+    )
 
 @app.route('/api/schedules', methods=['POST'])
 def create_schedule():
     """Create a new irrigation schedule"""
-    if controller is None:
-        return jsonify({'success': False, 'error': 'Controller not initialized yet'})
     data = request.json
     result = controller.create_schedule(data)
     return jsonify(result)
 
+@app.route('/api/schedules/upcoming', methods=['GET'])
+def get_upcoming_waterings():
+    """Get the next scheduled waterings"""
+    limit = min(request.args.get('limit', 10, type=int), 500)
+    return jsonify(controller.get_upcoming_waterings(limit))
+
+@app.route('/api/zones/<zone_id>/sensors', methods=['GET'])
+def get_zone_sensors(zone_id):
+    """Get the sensors bound to a zone"""
+    return jsonify(controller.get_zone_sensors(zone_id))
+
+@app.route('/api/zones/<zone_id>/sensors', methods=['POST'])
+def create_zone_sensor(zone_id):
+    """Bind a moisture or EC sensor to a zone"""
+    data = request.json or {}
+    return jsonify(controller.create_zone_sensor(zone_id, data))
+
+@app.route('/api/sensor-bindings/<binding_id>', methods=['DELETE'])
+def delete_zone_sensor(binding_id):
+    """Remove a sensor binding"""
+    return jsonify(controller.delete_zone_sensor(binding_id))
+
+@app.route('/api/sensors/<entity_id>', methods=['GET'])
+def get_sensor_stats(entity_id):
+    """Get rolling mean/min/slope for a sensor"""
+    stats = controller.get_sensor_stats(entity_id)
+    if stats is None:
+        return jsonify({'error': 'No samples for sensor'}), 404
+    return jsonify(stats)
+
+@app.route('/api/sensors/ingest', methods=['POST'])
+def ingest_sensor_samples():
+    """Push sensor samples, e.g. from a Home Assistant automation"""
+    data = request.json or {}
+    result = controller.ingest_sensor_samples(data.get('samples', []))
+    return jsonify(result), (200 if result['success'] else 400)
+
+@app.route('/api/rooms/batch', methods=['POST'])
+def create_rooms_batch():
+    """Create or update many rooms in one transaction"""
+    data = request.json or {}
+    return jsonify(controller.import_config({'rooms': data.get('rooms', [])}))
+
+@app.route('/api/zones/batch', methods=['POST'])
+def create_zones_batch():
+    """Create or update many zones in one transaction"""
+    data = request.json or {}
+    return jsonify(controller.import_config({'zones': data.get('zones', [])}))
+
+@app.route('/api/schedules/batch', methods=['POST'])
+def create_schedules_batch():
+    """Create or update many schedules in one transaction"""
+    data = request.json or {}
+    return jsonify(controller.import_config({'schedules': data.get('schedules', [])}))
+
+@app.route('/api/config/export', methods=['GET'])
+def export_config():
+    """Export rooms, zones and schedules as JSON or YAML"""
+    config = controller.export_config()
+    if request.args.get('format') == 'yaml':
+        import yaml
+        return Response(
+            yaml.safe_dump(config, sort_keys=False),
+            mimetype='application/x-yaml',
+            headers={'Content-Disposition': 'attachment; filename=irrigation-config.yaml'}
+        )
+    return jsonify(config)
+
+@app.route('/api/config/import', methods=['POST'])
+def import_config():
+    """Import rooms, zones and schedules from a JSON or YAML document"""
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        if request.is_json:
+            config = request.json
+        else:
+            import yaml
+            config = yaml.safe_load(request.get_data(as_text=True))
+    except Exception as e:
+        return jsonify({'success': False, 'errors': [f'Could not parse configuration: {e}']})
+    
+    if not isinstance(config, dict):
+        return jsonify({'success': False, 'errors': ['Configuration must be a mapping']})
+    
+    return jsonify(controller.import_config(config, dry_run=dry_run))
+
 @app.route('/api/manual-water', methods=['POST'])
 def manual_water():
     """Manually trigger watering for a zone"""
-    if controller is None:
-        return jsonify({'success': False, 'error': 'Controller not initialized yet'})
     data = request.json
     zone_id = data.get('zone_id')
     duration = data.get('duration', 60)  # Default 1 minute
@@ -186,34 +389,89 @@ def manual_water():
 
 @app.route('/api/entities', methods=['GET'])
 def get_entities():
-    """Get Home Assistant switch entities"""
-    if ha_integration is None:
-        return jsonify({'switches': [], 'error': 'Home Assistant integration not initialized'})
-    
+    """Search Home Assistant entities a zone can switch, a page at a time"""
+    domains = [domain for domain in request.args.get('domain', '').split(',') if domain]
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    offset = max(0, request.args.get('offset', 0, type=int))
     try:
-        switches = ha_integration.get_all_switches()
-        # Format for dropdown
-        entities = [{'id': switch['entity_id'], 'name': switch['attributes'].get('friendly_name', switch['entity_id'])} 
-                   for switch in switches]
-        return jsonify({'switches': entities})
+        return jsonify(entity_index.search(request.args.get('q', ''), domains, limit, offset))
     except Exception as e:
         logger.error(f"Error getting entities: {e}")
-        return jsonify({'switches': [], 'error': str(e)})
+        return jsonify({'entities': [], 'total': 0, 'error': str(e)})
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get current system status"""
-    if controller is None:
-        return jsonify({'system_active': False, 'active_zones': [], 'water_usage_today': 0, 'status': 'initializing'})
-    return jsonify(controller.get_status())
+    status = controller.get_status()
+    status['read_admission'] = read_gate.get_stats()
+    if entity_index:
+        status['entity_index'] = entity_index.get_stats()
+    return jsonify(status)
 
 @app.route('/api/stats', methods=['GET'])
 def get_detailed_stats():
     """Get detailed statistics with room and zone breakdowns"""
-    if controller is None:
-        return jsonify({'total_water_today': 0, 'rooms': [], 'zones': []})
     return jsonify(controller.get_detailed_stats())
 
+@app.route('/api/analytics/usage', methods=['GET'])
+def get_usage_analytics():
+    """Aggregate archived water usage by room type, room, zone, weekday, month or date"""
+    return jsonify(controller.get_usage_analytics(
+        request.args.get('group_by', 'room_type'),
+        request.args.get('start'),
+        request.args.get('end')
+    ))
+
+@app.route('/api/analytics/archive', methods=['GET'])
+def get_archive_status():
+    """Get the usage archive summary"""
+    return jsonify(controller.usage_archive.get_status())
+
+@app.route('/api/analytics/archive', methods=['POST'])
+def run_archive():
+    """Archive closed days of water usage now"""
+    return jsonify(controller.usage_archive.archive_closed_days())
+
+@app.route('/api/backups', methods=['GET'])
+def get_backups():
+    """List database backups"""
+    return jsonify({'backups': controller.backups.list_backups(), **controller.backups.get_status()})
+
+@app.route('/api/backups', methods=['POST'])
+def create_backup():
+    """Back up the database now"""
+    data = request.get_json(silent=True) or {}
+    return jsonify(controller.backups.create(label=data.get('label', 'manual'), compress=data.get('compress')))
+
+@app.route('/api/backups/upload', methods=['POST'])
+def upload_backup():
+    """Store an uploaded irrigation.db (or .db.gz) as a backup after verifying it"""
+    upload = request.files.get('file')
+    return jsonify(controller.backups.add_upload(upload.stream if upload else request.stream))
+
+@app.route('/api/backups/<name>', methods=['GET'])
+def download_backup(name):
+    """Download a backup file"""
+    path = controller.backups.path_for(name)
+    if not path:
+        return jsonify({'success': False, 'error': 'Backup not found'}), 404
+    return send_file(path, as_attachment=True, download_name=name)
+
+@app.route('/api/backups/<name>', methods=['DELETE'])
+def delete_backup(name):
+    """Delete a backup"""
+    return jsonify(controller.backups.delete(name))
+
+@app.route('/api/backups/<name>/verify', methods=['POST'])
+def verify_backup(name):
+    """Run an integrity check on a backup"""
+    return jsonify(controller.backups.verify(name))
+
+@app.route('/api/backups/<name>/restore', methods=['POST'])
+def restore_backup(name):
+    """Replace the database with a backup and reload controller state"""
+    return jsonify(controller.restore_backup(name))
+
 @app.route('/debug/create-test-room')
 def debug_create_test_room():
     """Debug endpoint to test room creation"""
@@ -273,50 +531,96 @@ def debug_test_db():
         logger.error(f"Database test error: {e}")
         return jsonify({'database_connected': False, 'error': str(e)})
 
+@app.route('/debug/memory')
+def debug_memory():
+    """Resident memory, subsystem sizes and tracemalloc status"""
+    report = {'rss_bytes': rss_bytes(), 'tracemalloc': memory_tracer.status()}
+    if controller is not None:
+        report['subsystems'] = subsystem_counters(
+            controller, entity_index=len(entity_index) if entity_index else 0
+        )
+    return jsonify(report)
+
+@app.route('/debug/memory/tracemalloc/start', methods=['POST'])
+def debug_tracemalloc_start():
+    """Start tracing allocations; frames sets the traceback depth kept"""
+    frames = request.args.get('frames', 10, type=int)
+    if not 1 <= frames <= 100:
+        return jsonify({'success': False, 'error': 'frames must be between 1 and 100'}), 400
+    return jsonify({'success': True, **memory_tracer.start(frames)})
+
+@app.route('/debug/memory/tracemalloc/stop', methods=['POST'])
+def debug_tracemalloc_stop():
+    """Stop tracing and drop kept snapshots"""
+    return jsonify({'success': True, **memory_tracer.stop()})
+
+@app.route('/debug/memory/snapshots', methods=['POST'])
+def debug_memory_snapshot():
+    """Take a named tracemalloc snapshot"""
+    data = request.get_json(silent=True) or {}
+    result = memory_tracer.snapshot(data.get('name') or request.args.get('name'))
+    return jsonify(result), (200 if result['success'] else 409)
+
+@app.route('/debug/memory/diff')
+def debug_memory_diff():
+    """Allocation growth between two snapshots, or from one snapshot to now"""
+    first = request.args.get('from')
+    if not first:
+        return jsonify({'success': False, 'error': 'from is required'}), 400
+    result = memory_tracer.diff(
+        first, request.args.get('to'),
+        group_by=request.args.get('group_by', 'lineno'),
+        limit=min(max(request.args.get('limit', 20, type=int), 1), 200)
+    )
+    if result['success']:
+        return jsonify(result)
+    return jsonify(result), (404 if result['error'] == 'Snapshot not found' else 400)
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
     logger.info('Client connected')
     emit('status_update', controller.get_status() if controller else {})
 
-def schedule_runner():
-    """Background thread to run scheduled tasks"""
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+def broadcast_status():
+    """Push the current status to every connected client"""
+    socketio.emit('status_update', controller.get_status())
+
+def start_background_services(data_dir: str = '/data'):
+    """Initialize controllers in a separate thread so the web server can answer health probes"""
+    def initialize_controllers():
+        global controller, ha_integration, entity_index
+        try:
+            election = LeaderElection(os.path.join(data_dir, 'scheduler.lock'))
+            services = start_services(startup_tracker, election, data_dir)
+            controller = services['controller']
+            ha_integration = services['ha_integration']
+            entity_index = EntityIndex(ha_integration)
+            entity_index.refresh_in_background()
+            controller.on_change = broadcast_status
+            
+            startup_tracker.mark_ready()
+        except Exception as e:
+            logger.exception(f"Error initializing controllers: {e}")
+            startup_tracker.mark_failed(e)
+    
+    init_thread = threading.Thread(target=initialize_controllers, daemon=True)
+    init_thread.start()
 
 def main():
     parser = argparse.ArgumentParser(description='Smart Irrigation Controller')
     parser.add_argument('--log-level', default='info', help='Log level')
+    # Home Assistant ingress always uses port 8099 and /data; other values are for local checks
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--data-dir', default='/data')
     args = parser.parse_args()
-    
-    # For Home Assistant ingress, always use port 8099
-    port = 8099
+    port = args.port
     
     # Set log level
     log_level = getattr(logging, args.log_level.upper())
     logging.getLogger().setLevel(log_level)
     
-    # Initialize controllers in a separate thread to avoid blocking startup
-    def initialize_controllers():
-        global controller, ha_integration
-        try:
-            logger.info("Initializing irrigation controller...")
-            controller = IrrigationController()
-            logger.info("Initializing Home Assistant integration...")
-            ha_integration = HomeAssistantIntegration()
-            logger.info("Controllers initialized successfully")
-            
-            # Start schedule runner
-            schedule_thread = threading.Thread(target=schedule_runner, daemon=True)
-            schedule_thread.start()
-            logger.info("Schedule runner started")
-        except Exception as e:
-            logger.error(f"Error initializing controllers: {e}")
-    
-    # Start controller initialization in background
-    init_thread = threading.Thread(target=initialize_controllers, daemon=True)
-    init_thread.start()
+    start_background_services(args.data_dir)
     
     logger.info(f"Starting Smart Irrigation Controller on port {port}")
     logger.info("Flask app starting - this should resolve 503 errors")
@@ -0,0 +1,271 @@
+"""
+Models
+Slotted records built straight from SQLite rows, and the JSON serializer for them
+"""
+
+import base64
+import json
+from operator import attrgetter
+from typing import Any, List, Optional
+
+class Model:
+    """Base for the slotted models
+
+    Subclasses list their table columns first in `__slots__`, followed by any
+    joined columns, and queries select them in that order so the row factory
+    can pass the row tuple straight to `__init__`. Item access is kept so code
+    written against the old row dicts keeps working.
+    """
+
+    __slots__ = ()
+    table_columns = ()
+    # Attributes matching the listing's ORDER BY, ending in a unique one, for keyset paging
+    sort_fields = ('id',)
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+    @classmethod
+    def columns(cls, alias: str) -> str:
+        """SQL column list for the table-backed fields, e.g. 'z.id, z.name, ...'"""
+        return ', '.join(f'{alias}.{column}' for column in cls.table_columns)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self, fields: Optional[List[str]] = None) -> dict:
+        if fields:
+            return {field: getattr(self, field) for field in fields}
+        return dict(zip(self.__slots__, self._values(self)))
+
+    def sort_key(self) -> list:
+        return [getattr(self, field) for field in self.sort_fields]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r}, name={getattr(self, 'name', None)!r})"
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and self._values(self) == self._values(other)
+
+    __hash__ = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # One C-level call pulls every field out for serialization
+        getter = attrgetter(*cls.__slots__)
+        cls._values = staticmethod(getter if len(cls.__slots__) > 1 else lambda obj: (getter(obj),))
+
+class Room(Model):
+    __slots__ = ('id', 'name', 'type', 'description', 'created_at', 'updated_at', 'zone_count')
+    table_columns = __slots__[:6]
+    sort_fields = ('created_at', 'id')
+
+    def __init__(self, id: str, name: str, type: str, description: Optional[str],
+                 created_at: str, updated_at: str, zone_count: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.description = description
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.zone_count = zone_count
+
+class Zone(Model):
+    __slots__ = ('id', 'name', 'room_id', 'plant_count', 'pump_entity', 'solenoid_entity',
+                 'flow_rate', 'active', 'created_at', 'updated_at', 'room_name', 'room_type')
+    table_columns = __slots__[:10]
+    sort_fields = ('room_name', 'name', 'id')
+
+    def __init__(self, id: str, name: str, room_id: str, plant_count: int, pump_entity: Optional[str],
+                 solenoid_entity: Optional[str], flow_rate: float, active: int, created_at: str,
+                 updated_at: str, room_name: Optional[str] = None, room_type: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.room_id = room_id
+        self.plant_count = plant_count
+        self.pump_entity = pump_entity
+        self.solenoid_entity = solenoid_entity
+        self.flow_rate = flow_rate
+        self.active = active
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.room_name = room_name
+        self.room_type = room_type
+
+class Schedule(Model):
+    __slots__ = ('id', 'name', 'zone_id', 'duration', 'frequency', 'times', 'days', 'active',
+                 'created_at', 'updated_at', 'zone_name', 'room_name')
+    table_columns = __slots__[:10]
+    sort_fields = ('name', 'id')
+
+    def __init__(self, id: str, name: str, zone_id: str, duration: int, frequency: str,
+                 times, days, active: int, created_at: str, updated_at: str,
+                 zone_name: Optional[str] = None, room_name: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.zone_id = zone_id
+        self.duration = duration
+        self.frequency = frequency
+        # times/days are stored as JSON text
+        self.times = json.loads(times) if isinstance(times, str) else times
+        self.days = json.loads(days) if isinstance(days, str) and days else days
+        self.active = active
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.zone_name = zone_name
+        self.room_name = room_name
+
+class UsageEvent(Model):
+    __slots__ = ('id', 'zone_id', 'room_id', 'amount', 'duration', 'timestamp')
+    table_columns = __slots__
+
+    def __init__(self, id: int, zone_id: str, room_id: str, amount: float, duration: int, timestamp: str):
+        self.id = id
+        self.zone_id = zone_id
+        self.room_id = room_id
+        self.amount = amount
+        self.duration = duration
+        self.timestamp = timestamp
+
+    def __repr__(self) -> str:
+        return f"UsageEvent(id={self.id!r}, zone_id={self.zone_id!r}, amount={self.amount!r})"
+
+def to_jsonable(value: Any) -> Any:
+    """`default` hook for json.dumps that turns models into plain dicts"""
+    if isinstance(value, Model):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def to_plain(value: Any) -> Any:
+    """Convert a model or a listing of models to plain data before encoding
+
+    Doing listings up front is about twice as fast as letting the encoder call
+    back into `default` once per model. Building these dicts is still work the
+    old Row-to-dict listings did at load time, so serializing a listing of
+    models costs more than serializing a listing of dicts; see `benchmark`.
+    """
+    if isinstance(value, Model):
+        return value.to_dict()
+    if isinstance(value, list) and value and isinstance(value[0], Model):
+        cls = type(value[0])
+        if all(type(item) is cls for item in value):
+            # The class's slots and getter are shared by every row, so no per-field lookups
+            keys = cls.__slots__
+            return [dict(zip(keys, values)) for values in map(cls._values, value)]
+        return [item.to_dict() for item in value]
+    return value
+
+def encode_cursor(sort_key: list) -> str:
+    """Opaque page cursor holding the sort key of a page's last row"""
+    return base64.urlsafe_b64encode(json.dumps(sort_key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> list:
+    """Sort key from a page cursor; raises ValueError if it isn't one"""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(value, list):
+        raise ValueError('Invalid cursor')
+    return value
+
+def dumps(value: Any) -> str:
+    """Serialize API output, models included"""
+    return json.dumps(to_plain(value), default=to_jsonable, separators=(',', ':'))
+
+def benchmark(zones: int = 1000, rounds: int = 20) -> dict:
+    """Compare sqlite3.Row -> dict listings with slotted models for a zone listing
+
+    Models load faster and retain less memory; serializing them is slower,
+    because the dicts the encoder needs are built then rather than at load.
+    """
+    import sqlite3
+    import time
+    import tracemalloc
+    import uuid
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE rooms (id TEXT PRIMARY KEY, name TEXT, type TEXT, description TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+    ''')
+    conn.execute('''
+        CREATE TABLE zones (id TEXT PRIMARY KEY, name TEXT, room_id TEXT, plant_count INTEGER,
+                            pump_entity TEXT, solenoid_entity TEXT, flow_rate REAL, active BOOLEAN,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+    ''')
+    room_ids = [str(uuid.uuid4()) for _ in range(max(zones // 20, 1))]
+    conn.executemany('INSERT INTO rooms (id, name, type, description) VALUES (?, ?, ?, ?)',
+                     [(room_id, f'Room {i}', 'vegetative', '') for i, room_id in enumerate(room_ids)])
+    conn.executemany('''
+        INSERT INTO zones (id, name, room_id, plant_count, pump_entity, solenoid_entity, flow_rate, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+    ''', [(str(uuid.uuid4()), f'Zone {i}', room_ids[i % len(room_ids)], 4,
+           f'switch.pump_{i}', f'switch.valve_{i}', 16.0) for i in range(zones)])
+
+    dict_query = '''
+        SELECT z.*, r.name as room_name, r.type as room_type
+        FROM zones z JOIN rooms r ON z.room_id = r.id ORDER BY r.name, z.name
+    '''
+    model_query = f'''
+        SELECT {Zone.columns('z')}, r.name, r.type
+        FROM zones z JOIN rooms r ON z.room_id = r.id ORDER BY r.name, z.name
+    '''
+
+    def load_dicts():
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(dict_query).fetchall()]
+
+    def load_models():
+        conn.row_factory = Zone.row_factory
+        return conn.execute(model_query).fetchall()
+
+    results = {'zones': zones}
+    for label, load in (('dicts', load_dicts), ('models', load_models)):
+        load()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            rows = load()
+        load_ms = (time.perf_counter() - start) / rounds * 1000
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            body = dumps(rows)
+        serialize_ms = (time.perf_counter() - start) / rounds * 1000
+
+        del rows
+        tracemalloc.start()
+        rows = load()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Held until after the measurement so retained counts the listing
+        del rows
+
+        results[label] = {
+            'load_ms': round(load_ms, 3),
+            'serialize_ms': round(serialize_ms, 3),
+            'retained_bytes': retained,
+            'peak_bytes': peak,
+            'body_bytes': len(body)
+        }
+
+    conn.close()
+    return results
+
+if __name__ == '__main__':
+    print(json.dumps(benchmark(), indent=2))
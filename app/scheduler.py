@@ -0,0 +1,68 @@
+"""
+Schedule Runner
+Fires watering schedules from the schedule_times index on an injectable clock
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class ScheduleRunner:
+    """Fires every schedule whose time falls between the previous tick and now
+
+    Firing times come straight from the indexed schedule_times table, so new,
+    changed and deleted schedules take effect on the next tick without keeping
+    a second copy of them in memory. Firings missed by more than
+    max_catch_up (e.g. after the host was suspended) are skipped rather than
+    all starting at once.
+    """
+
+    def __init__(self, db, clock, on_fire: Callable[[Dict], None],
+                 max_catch_up: timedelta = timedelta(minutes=5)):
+        self.db = db
+        self.clock = clock
+        self.on_fire = on_fire
+        self.max_catch_up = max_catch_up
+        self._last_tick = None
+        self.stats = {'ticks': 0, 'fired': 0, 'skipped_late': 0, 'last_tick_ms': None}
+
+    def start(self, at: datetime = None):
+        """Start counting from now; earlier firings are never run"""
+        self._last_tick = at or self.clock.now()
+
+    def tick(self) -> List[Dict]:
+        """Fire all schedules due since the last tick"""
+        now = self.clock.now()
+        if self._last_tick is None:
+            self._last_tick = now
+            return []
+        if now <= self._last_tick:
+            return []
+
+        started = time.perf_counter()
+        window_start = self._last_tick
+        if now - window_start > self.max_catch_up:
+            skipped = self.db.get_firings_in_window(window_start, now - self.max_catch_up)
+            if skipped:
+                logger.warning(f"Skipping {len(skipped)} firings missed by more than {self.max_catch_up}")
+                self.stats['skipped_late'] += len(skipped)
+            window_start = now - self.max_catch_up
+
+        firings = self.db.get_firings_in_window(window_start, now)
+        self._last_tick = now
+        for firing in firings:
+            try:
+                self.on_fire(firing)
+            except Exception as e:
+                logger.error(f"Error firing schedule {firing['schedule_id']}: {e}")
+
+        self.stats['ticks'] += 1
+        self.stats['fired'] += len(firings)
+        self.stats['last_tick_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return firings
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
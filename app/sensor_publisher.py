@@ -0,0 +1,117 @@
+"""
+Sensor Publisher
+Coalesces irrigation state updates and publishes them to Home Assistant sensors
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+class SensorPublisher:
+    """Debounced, rate-limited publisher for Home Assistant sensor states
+
+    publish() only records the latest desired state of an entity. A background
+    thread flushes pending states in batches, skipping values identical to what
+    was last written and holding back entities written less than
+    min_interval seconds ago. Writes go through the integration's shared
+    keep-alive session.
+    """
+
+    def __init__(self, ha, flush_interval: float = 1.0, min_interval: float = 5.0, max_batch: int = 20):
+        self.ha = ha
+        self.flush_interval = flush_interval
+        self.min_interval = min_interval
+        self.max_batch = max_batch
+        self._pending = {}
+        self._published = {}
+        self._last_write = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self.stats = {'queued': 0, 'coalesced': 0, 'skipped_unchanged': 0, 'written': 0, 'failed': 0}
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='sensor-publisher', daemon=True)
+        self._thread.start()
+        logger.info("Sensor publisher started")
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def stop(self):
+        """Stop the flush thread after writing anything still pending"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush(force=True)
+
+    def publish(self, sensor_id: str, name: str, state: Any, attributes: Dict = None):
+        """Queue the latest state for a sensor, replacing any pending update"""
+        update = (name, state, attributes or {})
+        with self._lock:
+            if self._published.get(sensor_id) == update and sensor_id not in self._pending:
+                self.stats['skipped_unchanged'] += 1
+                return
+            if sensor_id in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[sensor_id] = update
+            self.stats['queued'] += 1
+
+    def flush(self, force: bool = False) -> int:
+        """Write up to max_batch due sensor updates, returning how many were written"""
+        now = time.monotonic()
+        batch = []
+        with self._lock:
+            for sensor_id, update in list(self._pending.items()):
+                if len(batch) >= self.max_batch and not force:
+                    break
+                if self._published.get(sensor_id) == update:
+                    # Changed and changed back before we got to it
+                    del self._pending[sensor_id]
+                    self.stats['skipped_unchanged'] += 1
+                    continue
+                if not force and now - self._last_write.get(sensor_id, float('-inf')) < self.min_interval:
+                    continue
+                batch.append((sensor_id, update))
+                del self._pending[sensor_id]
+
+        written = 0
+        for sensor_id, (name, state, attributes) in batch:
+            if self.ha.create_sensor(sensor_id, name, state, attributes):
+                written += 1
+                with self._lock:
+                    self._published[sensor_id] = (name, state, attributes)
+                    self._last_write[sensor_id] = time.monotonic()
+            else:
+                self.stats['failed'] += 1
+                with self._lock:
+                    # Retry on a later flush unless a newer value arrived meanwhile
+                    self._pending.setdefault(sensor_id, (name, state, attributes))
+                    self._last_write[sensor_id] = time.monotonic()
+
+        self.stats['written'] += written
+        return written
+
+    def get_stats(self) -> Dict:
+        """Get publisher counters"""
+        with self._lock:
+            return {**self.stats, 'pending': len(self._pending), 'entities': len(self._published)}
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing sensor updates: {e}")
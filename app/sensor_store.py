@@ -0,0 +1,435 @@
+"""
+Sensor Store
+Fixed-size ring buffers for soil moisture / EC readings and sensor-driven watering
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class RingBuffer:
+    """Fixed-capacity buffer of (timestamp, value) samples
+
+    Keeps running sums so mean and least-squares slope are O(1), and a
+    monotonic deque so the rolling minimum is amortized O(1). Sums are
+    rebuilt from the arrays once per capacity samples to stop float drift.
+    Statistics over only the newest samples are computed from the arrays.
+
+    numpy is imported on first use rather than with the module, so worker
+    processes that never hold sensor samples don't pay for it at startup.
+    """
+
+    __slots__ = ('capacity', '_times', '_values', '_head', '_count', '_seq', '_t0',
+                 '_sum_v', '_sum_t', '_sum_tt', '_sum_tv', '_min_queue', '_since_resync')
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1")
+        import numpy as np
+
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._head = 0
+        self._count = 0
+        self._seq = 0
+        self._t0 = None
+        self._sum_v = 0.0
+        self._sum_t = 0.0
+        self._sum_tt = 0.0
+        self._sum_tv = 0.0
+        self._min_queue = deque()
+        self._since_resync = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, value: float):
+        """Add a sample, evicting the oldest one when full"""
+        if self._t0 is None:
+            self._t0 = timestamp
+        t = timestamp - self._t0
+
+        if self._count == self.capacity:
+            old_t = self._times[self._head] - self._t0
+            old_v = self._values[self._head]
+            self._sum_v -= old_v
+            self._sum_t -= old_t
+            self._sum_tt -= old_t * old_t
+            self._sum_tv -= old_t * old_v
+        else:
+            self._count += 1
+
+        self._times[self._head] = timestamp
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._sum_v += value
+        self._sum_t += t
+        self._sum_tt += t * t
+        self._sum_tv += t * value
+
+        self._seq += 1
+        min_queue = self._min_queue
+        while min_queue and min_queue[-1][1] >= value:
+            min_queue.pop()
+        min_queue.append((self._seq, value))
+        while min_queue[0][0] <= self._seq - self.capacity:
+            min_queue.popleft()
+
+        self._since_resync += 1
+        if self._since_resync >= self.capacity:
+            self._resync()
+
+    def _resync(self):
+        """Recompute the running sums relative to the oldest sample"""
+        times, values = self.samples()
+        self._t0 = float(times[0])
+        t = times - self._t0
+        self._sum_v = float(values.sum())
+        self._sum_t = float(t.sum())
+        self._sum_tt = float((t * t).sum())
+        self._sum_tv = float((t * values).sum())
+        self._since_resync = 0
+
+    def samples(self) -> Tuple['np.ndarray', 'np.ndarray']:
+        """Get (times, values) ordered oldest first"""
+        import numpy as np
+
+        if self._count < self.capacity:
+            return self._times[:self._count].copy(), self._values[:self._count].copy()
+        order = np.r_[self._head:self.capacity, 0:self._head]
+        return self._times[order], self._values[order]
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        if not self._count:
+            return None
+        index = (self._head - 1) % self.capacity
+        return float(self._times[index]), float(self._values[index])
+
+    def _newest(self, last: int) -> 'np.ndarray':
+        """Array indexes of the newest `last` samples, oldest first"""
+        import numpy as np
+
+        return np.arange(self._head - last, self._head) % self.capacity
+
+    def _covers(self, last: Optional[int]) -> bool:
+        return last is None or last >= self._count
+
+    def mean(self, last: int = None) -> Optional[float]:
+        """Mean of every sample, or of the newest `last` samples"""
+        if not self._count:
+            return None
+        if self._covers(last):
+            return self._sum_v / self._count
+        if last < 1:
+            return None
+        return float(self._values[self._newest(last)].mean())
+
+    def min(self, last: int = None) -> Optional[float]:
+        """Minimum of every sample, or of the newest `last` samples"""
+        if not self._count:
+            return None
+        if self._covers(last):
+            return self._min_queue[0][1]
+        if last < 1:
+            return None
+        return float(self._values[self._newest(last)].min())
+
+    def slope(self, last: int = None) -> Optional[float]:
+        """Least-squares slope in units per second, over every sample or the newest `last`"""
+        if self._covers(last):
+            n = self._count
+            sum_t, sum_v, sum_tt, sum_tv = self._sum_t, self._sum_v, self._sum_tt, self._sum_tv
+        else:
+            n = last
+            if n < 2:
+                return None
+            indexes = self._newest(last)
+            t = self._times[indexes] - self._times[indexes[0]]
+            v = self._values[indexes]
+            sum_t, sum_v, sum_tt, sum_tv = float(t.sum()), float(v.sum()), float((t * t).sum()), float((t * v).sum())
+        if n < 2:
+            return None
+        denominator = n * sum_tt - sum_t * sum_t
+        if denominator <= 0:
+            return None
+        return (n * sum_tv - sum_t * sum_v) / denominator
+
+    def stats(self, last: int = None) -> Dict:
+        """Statistics over every sample, or over the newest `last` samples"""
+        latest = self.latest()
+        slope = self.slope(last)
+        return {
+            'count': self._count if self._covers(last) else max(last, 0),
+            'capacity': self.capacity,
+            'latest': latest[1] if latest else None,
+            'latest_at': latest[0] if latest else None,
+            'mean': self.mean(last),
+            'min': self.min(last),
+            'slope_per_hour': slope * 3600 if slope is not None else None
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self._times.nbytes + self._values.nbytes
+
+class SensorStore:
+    """Ring buffers keyed by Home Assistant sensor entity id"""
+
+    def __init__(self, default_capacity: int = 360, max_sensors: int = 1000):
+        self.default_capacity = default_capacity
+        self.max_sensors = max_sensors
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self.samples_ingested = 0
+        self.samples_dropped = 0
+        self.samples_rejected = 0
+
+    def ensure(self, entity_id: str, capacity: int = None) -> RingBuffer:
+        """Get the buffer for a sensor, creating or growing it as needed"""
+        capacity = capacity or self.default_capacity
+        with self._lock:
+            buffer = self._buffers.get(entity_id)
+            if buffer is None or buffer.capacity < capacity:
+                new_buffer = RingBuffer(capacity)
+                if buffer is not None:
+                    for t, v in zip(*buffer.samples()):
+                        new_buffer.append(float(t), float(v))
+                self._buffers[entity_id] = buffer = new_buffer
+            return buffer
+
+    def ingest(self, entity_id: str, value: float, timestamp: float = None):
+        """Record one sample"""
+        self.ingest_many([(entity_id, value, timestamp)])
+
+    def ingest_many(self, samples: Iterable[Tuple[str, float, Optional[float]]]) -> int:
+        """Record (entity_id, value, timestamp) samples, returning how many were stored
+
+        Samples whose value or timestamp isn't a finite number are skipped, so
+        one bad sample can't poison a sensor's running sums.
+        """
+        now = time.time()
+        count = 0
+        with self._lock:
+            buffers = self._buffers
+            for entity_id, value, timestamp in samples:
+                try:
+                    value = float(value)
+                    timestamp = float(timestamp) if timestamp is not None else now
+                except (TypeError, ValueError):
+                    self.samples_rejected += 1
+                    continue
+                if not (math.isfinite(value) and math.isfinite(timestamp)):
+                    self.samples_rejected += 1
+                    continue
+                buffer = buffers.get(entity_id)
+                if buffer is None:
+                    if len(buffers) >= self.max_sensors:
+                        # Keep memory bounded when something pushes unknown sensors
+                        self.samples_dropped += 1
+                        continue
+                    buffer = buffers[entity_id] = RingBuffer(self.default_capacity)
+                buffer.append(timestamp, value)
+                count += 1
+            self.samples_ingested += count
+        return count
+
+    def get(self, entity_id: str) -> Optional[RingBuffer]:
+        return self._buffers.get(entity_id)
+
+    def stats(self, entity_id: str, last: int = None) -> Optional[Dict]:
+        """A sensor's statistics, over its newest `last` samples if given
+
+        Taken under the store lock, so they never mix samples from before and
+        after a concurrent ingest.
+        """
+        with self._lock:
+            buffer = self._buffers.get(entity_id)
+            if buffer is None:
+                return None
+            return buffer.stats(last)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                'sensors': len(self._buffers),
+                'samples_ingested': self.samples_ingested,
+                'samples_dropped': self.samples_dropped,
+                'samples_rejected': self.samples_rejected,
+                'memory_bytes': sum(b.nbytes for b in self._buffers.values())
+            }
+
+class SensorMonitor:
+    """Polls bound Home Assistant sensors and triggers watering on thresholds
+
+    All bound sensors are read from one /api/states call per interval rather
+    than one request per probe.
+    """
+
+    def __init__(self, controller, store: SensorStore, interval: float = 10.0):
+        self.controller = controller
+        self.store = store
+        self.interval = interval
+        self._bindings = []
+        self._bindings_version = None
+        self._last_triggered = {}
+        self._running = False
+        self._thread = None
+        self.triggers_fired = 0
+
+    def start(self):
+        if self._running:
+            return
+        self.reload_bindings()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='sensor-monitor', daemon=True)
+        self._thread.start()
+        logger.info("Sensor monitor started")
+
+    def stop(self):
+        self._running = False
+
+    def reload_bindings(self):
+        """Reload zone sensor bindings from the database"""
+        self._bindings_version = self.controller.db.get_sensor_bindings_version()
+        self._bindings = [b for b in self.controller.db.get_zone_sensors() if b['active']]
+        for binding in self._bindings:
+            self.store.ensure(binding['entity_id'], binding['window'])
+        logger.info(f"Loaded {len(self._bindings)} sensor bindings")
+
+    def poll(self) -> int:
+        """Read all bound sensors from Home Assistant and evaluate triggers"""
+        entity_ids = {b['entity_id'] for b in self._bindings}
+        if not entity_ids:
+            return 0
+
+        samples = []
+        now = time.time()
+        for state in self.controller.ha.get_states():
+            if state.get('entity_id') not in entity_ids:
+                continue
+            try:
+                samples.append((state['entity_id'], float(state['state']), now))
+            except (TypeError, ValueError):
+                # unavailable / unknown
+                continue
+
+        count = self.store.ingest_many(samples)
+        self.share_stats(entity_ids)
+        self.evaluate()
+        return count
+
+    def sync(self) -> int:
+        """Pick up bindings changed and samples pushed through other worker processes
+
+        Runs on the leader; returns how many queued samples were ingested.
+        """
+        if self.controller.db.get_sensor_bindings_version() != self._bindings_version:
+            self.reload_bindings()
+        samples = self.controller.db.take_sensor_samples()
+        if not samples:
+            return 0
+        count = self.store.ingest_many(samples)
+        self.share_stats(entity_id for entity_id, _, _ in samples)
+        self.evaluate()
+        return count
+
+    def share_stats(self, entity_ids: Iterable[str]):
+        """Store statistics in the database so every worker can serve them"""
+        stats = {}
+        for entity_id in set(entity_ids):
+            entry = self.store.stats(entity_id)
+            if entry is not None:
+                stats[entity_id] = entry
+        self.controller.db.save_sensor_stats(stats)
+
+    def evaluate(self) -> List[str]:
+        """Start watering for zones whose sensors crossed a threshold"""
+        triggered = []
+        now = self.controller.clock.monotonic()
+        for binding in self._bindings:
+            zone_id = binding['zone_id']
+            if zone_id in self.controller.active_waterings or zone_id in triggered:
+                continue
+
+            last = self._last_triggered.get(zone_id)
+            if last is not None and now - last < binding['cooldown'] * 60:
+                continue
+
+            # The buffer may be larger than this binding's window if another binding shares the sensor
+            stats = self.store.stats(binding['entity_id'], binding['window'])
+            if stats is None or stats['count'] < min(binding['window'], 3):
+                continue
+
+            mean = stats['mean']
+            too_low = binding['min_value'] is not None and mean < binding['min_value']
+            too_high = binding['max_value'] is not None and mean > binding['max_value']
+            if not (too_low or too_high):
+                continue
+
+            logger.info(
+                f"Sensor {binding['entity_id']} ({binding['kind']}) mean {mean:.2f} "
+                f"(min {stats['min']:.2f}, slope {stats['slope_per_hour'] or 0:+.2f}/h over {stats['count']}) "
+                f"outside [{binding['min_value']}, {binding['max_value']}], watering zone {zone_id}"
+            )
+            self._last_triggered[zone_id] = now
+            self.triggers_fired += 1
+            triggered.append(zone_id)
+            self.controller.request_watering(zone_id, binding['duration'], 'sensor')
+
+        return triggered
+
+    def get_status(self) -> Dict:
+        return {
+            'running': self._running,
+            'bindings': len(self._bindings),
+            'triggers_fired': self.triggers_fired,
+            **self.store.summary()
+        }
+
+    def _run(self):
+        while self._running:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error polling sensors: {e}")
+            time.sleep(self.interval)
+
+def benchmark(sensors: int = 200, samples: int = 200000, capacity: int = 360) -> Dict:
+    """Measure ingestion throughput and memory for the sensor store"""
+    import numpy as np
+
+    store = SensorStore(default_capacity=capacity)
+    entity_ids = [f'sensor.probe_{i}' for i in range(sensors)]
+    rng = np.random.default_rng(0)
+    values = rng.uniform(20, 60, samples).tolist()
+    base = time.time()
+    batch = [(entity_ids[i % sensors], values[i], base + i) for i in range(samples)]
+
+    start = time.perf_counter()
+    store.ingest_many(batch)
+    ingest_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for entity_id in entity_ids:
+        store.stats(entity_id)
+    stats_seconds = time.perf_counter() - start
+
+    return {
+        'sensors': sensors,
+        'samples': samples,
+        'samples_per_second': round(samples / ingest_seconds),
+        'stats_us_per_sensor': round(stats_seconds / sensors * 1e6, 2),
+        'memory_bytes': store.summary()['memory_bytes']
+    }
+
+if __name__ == '__main__':
+    print(benchmark())
@@ -0,0 +1,250 @@
+"""
+Irrigation Simulator
+Replays days of schedules on a virtual clock against a recording Home Assistant stub
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from actuation import ActuationExecutor
+from clock import VirtualClock
+from database import IrrigationDatabase, WEEKDAYS, week_start
+from irrigation_controller import IrrigationController
+
+logger = logging.getLogger(__name__)
+
+class RecordingHomeAssistant:
+    """Stands in for HomeAssistantIntegration and records every switch call"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.actuations = []
+        self._states = {}
+
+    def _switch(self, entity_id: str, action: str) -> bool:
+        self.actuations.append({'at': self.clock.now(), 'entity_id': entity_id, 'action': action})
+        self._states[entity_id] = 'on' if action == 'turn_on' else 'off'
+        return True
+
+    def turn_on_switch(self, entity_id: str) -> bool:
+        return self._switch(entity_id, 'turn_on')
+
+    def turn_off_switch(self, entity_id: str) -> bool:
+        return self._switch(entity_id, 'turn_off')
+
+    def get_switch_state(self, entity_id: str) -> str:
+        return self._states.get(entity_id, 'off')
+
+    def get_states(self) -> List[Dict]:
+        return [{'entity_id': entity_id, 'state': state} for entity_id, state in self._states.items()]
+
+    def get_all_switches(self) -> List[Dict]:
+        return self.get_states()
+
+    def create_sensor(self, sensor_id: str, name: str, state, attributes: Dict = None) -> bool:
+        return True
+
+    def check_connection(self) -> bool:
+        return True
+
+    def get_health(self) -> Dict:
+        return {'connected': True, 'circuit': {'state': 'closed'}, 'queued_commands': 0}
+
+def build_fixture(db: IrrigationDatabase, zones: int, times_per_day: int = 4,
+                  zones_per_room: int = 20, weekly_share: float = 0.2, seed: int = 0) -> Dict[str, str]:
+    """Create rooms, zones and randomized schedules, returning solenoid entity -> zone id"""
+    rng = random.Random(seed)
+    rooms_out, zones_out, schedules_out = [], [], []
+    entity_zones = {}
+
+    for r in range((zones + zones_per_room - 1) // zones_per_room):
+        rooms_out.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'name': f'Room {r + 1}',
+            'type': rng.choice(('vegetative', 'flowering', 'drying')),
+            'description': ''
+        })
+
+    for z in range(zones):
+        zone_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        solenoid = f'switch.sim_zone_{z + 1}_valve'
+        entity_zones[solenoid] = zone_id
+        plant_count = rng.randint(1, 12)
+        zones_out.append({
+            'id': zone_id,
+            'name': f'Zone {z + 1}',
+            'room_id': rooms_out[z // zones_per_room]['id'],
+            'plant_count': plant_count,
+            'pump_entity': '',
+            'solenoid_entity': solenoid,
+            'flow_rate': 4.0 * plant_count,
+            'active': 1
+        })
+
+        weekly = rng.random() < weekly_share
+        minutes = sorted(rng.sample(range(24 * 60), times_per_day))
+        schedules_out.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'name': f'Zone {z + 1} schedule',
+            'zone_id': zone_id,
+            'duration': rng.randint(1, 15),
+            'frequency': 'weekly' if weekly else 'daily',
+            'times': [f'{m // 60:02d}:{m % 60:02d}' for m in minutes],
+            'days': sorted(rng.sample(WEEKDAYS, 3), key=WEEKDAYS.index) if weekly else [],
+            'active': 1
+        })
+
+    result = db.bulk_import(rooms_out, zones_out, schedules_out)
+    if not result['success']:
+        raise RuntimeError(f"Fixture import failed: {result.get('error')}")
+    return entity_zones
+
+def analyze(firings: List[Dict], actuations: List[Dict], entity_zones: Dict[str, str],
+            tolerance: timedelta) -> Dict:
+    """Check recorded actuations against the firings the index says were due"""
+    intervals = defaultdict(list)
+    open_since = {}
+    overlaps = 0
+    unmatched_stops = 0
+
+    for actuation in actuations:
+        zone_id = entity_zones.get(actuation['entity_id'])
+        if zone_id is None:
+            continue
+        if actuation['action'] == 'turn_on':
+            if zone_id in open_since:
+                overlaps += 1
+                continue
+            open_since[zone_id] = actuation['at']
+        else:
+            started = open_since.pop(zone_id, None)
+            if started is None:
+                unmatched_stops += 1
+                continue
+            intervals[zone_id].append((started, actuation['at']))
+
+    missed = []
+    skipped_busy = 0
+    max_start_delay = 0.0
+    max_stop_error = 0.0
+    started = 0
+    for firing in firings:
+        zone_id = firing['zone_id']
+        fire_at = firing['fire_at']
+        match = next(
+            (interval for interval in intervals[zone_id]
+             if fire_at <= interval[0] < fire_at + tolerance),
+            None
+        )
+        if match:
+            started += 1
+            max_start_delay = max(max_start_delay, (match[0] - fire_at).total_seconds())
+            actual = (match[1] - match[0]).total_seconds()
+            max_stop_error = max(max_stop_error, abs(actual - firing['duration'] * 60))
+        elif any(start <= fire_at < end for start, end in intervals[zone_id]):
+            # A previous watering of the same zone was still running
+            skipped_busy += 1
+        else:
+            missed.append(firing)
+
+    return {
+        'firings_due': len(firings),
+        'started': started,
+        'completed': sum(len(zone_intervals) for zone_intervals in intervals.values()),
+        'skipped_busy': skipped_busy,
+        'missed': len(missed),
+        'missed_examples': [
+            {**firing, 'fire_at': firing['fire_at'].isoformat()} for firing in missed[:10]
+        ],
+        'overlaps': overlaps,
+        'unmatched_stops': unmatched_stops,
+        'still_open': len(open_since),
+        'max_start_delay_s': round(max_start_delay, 3),
+        'max_stop_error_s': round(max_stop_error, 3)
+    }
+
+def simulate(zones: int = 1000, days: float = 1, times_per_day: int = 4, tick: float = 60,
+             seed: int = 0, start: datetime = None, dump_path: str = None, workdir: str = None) -> Dict:
+    """Run the real controller through simulated days and report what happened
+
+    The scheduler is ticked every `tick` simulated seconds, offset by one
+    second from the minute so each tick's window includes the minute it
+    lands on, as the one second production loop does.
+    """
+    start = start or week_start(datetime(2025, 1, 6))
+    end = start + timedelta(days=days)
+
+    with tempfile.TemporaryDirectory(prefix='irrigation-sim-', dir=workdir) as tmp:
+        db = IrrigationDatabase(os.path.join(tmp, 'irrigation.db'))
+        entity_zones = build_fixture(db, zones, times_per_day, seed=seed)
+
+        clock = VirtualClock(start)
+        ha = RecordingHomeAssistant(clock)
+        controller = IrrigationController(db=db, ha=ha, clock=clock, actuator=ActuationExecutor(inline=True))
+        controller.is_leader = True
+        controller.schedule_runner.start(start)
+
+        wall_start = time.perf_counter()
+        next_tick = start + timedelta(seconds=1)
+        while next_tick <= end:
+            clock.advance_to(next_tick)
+            controller.run_pending()
+            next_tick += timedelta(seconds=tick)
+        # Let waterings started near the end run to completion
+        clock.advance_to(end + timedelta(days=1))
+        wall_seconds = time.perf_counter() - wall_start
+
+        firings = db.get_firings_in_window(start, end)
+        report = analyze(firings, ha.actuations, entity_zones, timedelta(seconds=tick + 1))
+        report['usage_logged'] = len(db.get_usage_events())
+
+        if dump_path:
+            with open(dump_path, 'w') as f:
+                for actuation in ha.actuations:
+                    f.write(json.dumps({**actuation, 'at': actuation['at'].isoformat(),
+                                        'zone_id': entity_zones.get(actuation['entity_id'])}) + '\n')
+
+    simulated_seconds = (end - start).total_seconds()
+    return {
+        'zones': zones,
+        'days': days,
+        'tick_s': tick,
+        'actuations': len(ha.actuations),
+        'wall_seconds': round(wall_seconds, 2),
+        'speedup': round(simulated_seconds / wall_seconds) if wall_seconds else None,
+        'firings_per_second': round(len(firings) / wall_seconds) if wall_seconds else None,
+        'scheduler': controller.schedule_runner.get_stats(),
+        **report
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay irrigation schedules on a virtual clock')
+    parser.add_argument('--zones', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=1)
+    parser.add_argument('--times-per-day', type=int, default=4)
+    parser.add_argument('--tick', type=float, default=60, help='Scheduler tick in simulated seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dump', help='Write every actuation to this JSON lines file')
+    parser.add_argument('--workdir', help='Directory for the scratch database (e.g. /dev/shm)')
+    parser.add_argument('--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = simulate(args.zones, args.days, args.times_per_day, args.tick, args.seed,
+                      dump_path=args.dump, workdir=args.workdir)
+    print(json.dumps(report, indent=2))
+    return 0 if report['missed'] == 0 and report['overlaps'] == 0 else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+"""
+Soak Test
+Runs the controller through a simulated week and fails if resident memory outgrows a budget
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from actuation import ActuationExecutor
+from clock import VirtualClock
+from database import IrrigationDatabase, week_start
+from diagnostics import rss_bytes, subsystem_counters, top_growth
+from entity_index import EntityIndex
+from ha_integration import HomeAssistantIntegration
+from irrigation_controller import IrrigationController
+from simulator import RecordingHomeAssistant, build_fixture
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+class SoakHomeAssistant(RecordingHomeAssistant):
+    """Recording stub whose /api/states payload looks like a busy install
+
+    Every get_states() decodes the full payload afresh, as a real response
+    would, and keeps the slimmed copy HomeAssistantIntegration keeps.
+    """
+
+    def __init__(self, clock, entities: int = 2000, seed: int = 0):
+        super().__init__(clock)
+        rng = random.Random(seed)
+        states = []
+        for i in range(entities):
+            domain = rng.choice(('sensor', 'sensor', 'light', 'switch', 'binary_sensor', 'weather'))
+            attributes = {'friendly_name': f'Entity {i}', 'icon': 'mdi:water'}
+            if domain == 'weather':
+                # Forecasts are the usual reason /api/states runs to megabytes
+                attributes['forecast'] = [{'datetime': f'2025-01-{d + 1:02d}T00:00:00', 'temperature': 20 + d,
+                                           'condition': 'sunny', 'precipitation': 0.1 * d}
+                                          for d in range(14)]
+            states.append({'entity_id': f'{domain}.soak_{i}', 'state': str(rng.randint(0, 100)),
+                           'attributes': attributes, 'last_changed': '2025-01-06T00:00:00+00:00',
+                           'context': {'id': f'{i:026d}', 'parent_id': None, 'user_id': None}})
+        self._body = json.dumps(states)
+        self._last_states = []
+        self.switch_calls = 0
+
+    def _switch(self, entity_id: str, action: str) -> bool:
+        # Counted rather than recorded, so the stub doesn't grow through the week
+        self.switch_calls += 1
+        self._states[entity_id] = 'on' if action == 'turn_on' else 'off'
+        return True
+
+    def get_states(self) -> List[Dict]:
+        states = json.loads(self._body) + super().get_states()
+        self._last_states = [HomeAssistantIntegration._slim_state(state) for state in states]
+        return self._last_states
+
+    @property
+    def cached_states(self) -> list:
+        return self._last_states
+
+def soak(zones: int = 200, days: float = 7, tick: float = 60, read_interval: float = 300,
+         warmup_days: float = 1, budget_mb: float = 8, entities: int = 2000, trace: bool = False,
+         seed: int = 0, workdir: str = None) -> Dict:
+    """Run schedules, dashboard reads and sensor publishing for simulated days
+
+    Every read_interval simulated seconds a short-lived thread makes the
+    reads a dashboard refresh makes, as Flask's threaded server would, and
+    zone sensors are published and flushed. Resident memory is measured after
+    a garbage collection once warmup_days have passed and again at the end;
+    growth between the two is held to budget_mb.
+    """
+    start = week_start(datetime(2025, 1, 6))
+    warmup_end = start + timedelta(days=warmup_days)
+    end = warmup_end + timedelta(days=days)
+
+    with tempfile.TemporaryDirectory(prefix='irrigation-soak-', dir=workdir) as tmp:
+        db = IrrigationDatabase(os.path.join(tmp, 'irrigation.db'))
+        build_fixture(db, zones, seed=seed)
+
+        clock = VirtualClock(start)
+        ha = SoakHomeAssistant(clock, entities, seed)
+        controller = IrrigationController(db=db, ha=ha, clock=clock, actuator=ActuationExecutor(db, inline=True))
+        controller.is_leader = True
+        controller.schedule_runner.start(start)
+        entity_index = EntityIndex(ha, max_age=read_interval)
+
+        def dashboard_reads():
+            controller.get_status()
+            controller.get_detailed_stats()
+            [zone.to_dict() for zone in controller.get_zones(limit=50)]
+            controller.get_schedules()
+            entity_index.apply(ha.get_states())
+            entity_index.search('soak', limit=20)
+
+        errors = []
+
+        def read_once():
+            try:
+                dashboard_reads()
+            except Exception as e:
+                errors.append(repr(e))
+
+        baseline = None
+        snapshot = None
+        samples = []
+        next_tick = start + timedelta(seconds=1)
+        next_read = start
+        next_sample = start
+        wall_start = time.perf_counter()
+        while next_tick <= end:
+            clock.advance_to(next_tick)
+            controller.run_pending()
+
+            if next_tick >= next_read:
+                reader = threading.Thread(target=read_once, name='soak-reader')
+                reader.start()
+                reader.join()
+                controller.publish_sensors()
+                controller.publisher.flush(force=True)
+                next_read += timedelta(seconds=read_interval)
+
+            if baseline is None and next_tick >= warmup_end:
+                gc.collect()
+                baseline = rss_bytes()
+                if trace:
+                    tracemalloc.start(10)
+                    snapshot = tracemalloc.take_snapshot()
+
+            if next_tick >= next_sample:
+                samples.append(rss_bytes())
+                next_sample += timedelta(hours=1)
+            next_tick += timedelta(seconds=tick)
+
+        clock.advance_to(end + timedelta(days=1))
+        wall_seconds = time.perf_counter() - wall_start
+        gc.collect()
+        final = rss_bytes()
+        # tracemalloc's own bookkeeping isn't the controller's growth
+        overhead = tracemalloc.get_tracemalloc_memory() if snapshot is not None else 0
+        growth = final - baseline - overhead
+        counters = subsystem_counters(controller, entity_index=len(entity_index))
+
+        report = {
+            'zones': zones,
+            'days': days,
+            'warmup_days': warmup_days,
+            'entities': entities,
+            'wall_seconds': round(wall_seconds, 2),
+            'actuations': ha.switch_calls,
+            'usage_logged': len(db.get_usage_events()),
+            'read_errors': len(errors),
+            'read_error_examples': errors[:5],
+            'rss_baseline_mb': round(baseline / MB, 2),
+            'rss_final_mb': round(final / MB, 2),
+            'rss_peak_mb': round(max(samples) / MB, 2),
+            'rss_growth_mb': round(growth / MB, 2),
+            'tracemalloc_overhead_mb': round(overhead / MB, 2),
+            'budget_mb': budget_mb,
+            'passed': growth <= budget_mb * MB and not errors,
+            # One sample per simulated day
+            'rss_daily_mb': [round(sample / MB, 2) for sample in samples[::24]],
+            'subsystems': counters
+        }
+        if snapshot is not None:
+            report['top_growth'] = top_growth(snapshot, tracemalloc.take_snapshot())
+            tracemalloc.stop()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the controller through a simulated week and check memory growth')
+    parser.add_argument('--zones', type=int, default=200)
+    parser.add_argument('--days', type=float, default=7, help='Simulated days measured after warmup')
+    parser.add_argument('--warmup-days', type=float, default=1)
+    parser.add_argument('--tick', type=float, default=60, help='Scheduler tick in simulated seconds')
+    parser.add_argument('--read-interval', type=float, default=300,
+                        help='Simulated seconds between dashboard reads and sensor publishes')
+    parser.add_argument('--entities', type=int, default=2000, help='Entities in the simulated /api/states')
+    parser.add_argument('--budget-mb', type=float, default=8, help='Allowed resident memory growth after warmup')
+    parser.add_argument('--trace', action='store_true', help='Report the largest allocation growth by line (runs several times slower)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help='Directory for the scratch database (e.g. /dev/shm)')
+    parser.add_argument('--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = soak(args.zones, args.days, args.tick, args.read_interval, args.warmup_days, args.budget_mb,
+                  args.entities, args.trace, args.seed, args.workdir)
+    print(json.dumps(report, indent=2))
+    return 0 if report['passed'] else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+"""
+Startup sequencing and readiness tracking
+Runs the independent startup phases in parallel and records how long each took
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class StartupTracker:
+    """Records startup phase timings and whether the service is ready"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.started_at_wall = datetime.now()
+        self.phases = {}
+        self.ready_at = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._ready_event = threading.Event()
+
+    def run_phase(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        """Run a startup phase and record its duration"""
+        with self._lock:
+            self.phases[name] = {'status': 'running', 'duration_ms': None}
+
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.phases[name] = {
+                    'status': 'failed',
+                    'duration_ms': round((time.monotonic() - start) * 1000, 1),
+                    'error': str(e)
+                }
+            logger.error(f"Startup phase '{name}' failed: {e}")
+            raise
+
+        duration_ms = round((time.monotonic() - start) * 1000, 1)
+        with self._lock:
+            self.phases[name] = {'status': 'done', 'duration_ms': duration_ms}
+        logger.info(f"Startup phase '{name}' completed in {duration_ms}ms")
+        return result
+
+    def mark_ready(self):
+        """Mark the service as ready to handle API requests"""
+        self.ready_at = time.monotonic()
+        self._ready_event.set()
+        logger.info(f"Service ready in {self.time_to_ready_ms}ms")
+
+    def mark_failed(self, error: Exception):
+        """Record a fatal startup error"""
+        self.error = str(error)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready_event.is_set()
+
+    @property
+    def time_to_ready_ms(self) -> Optional[float]:
+        if self.ready_at is None:
+            return None
+        return round((self.ready_at - self.started_at) * 1000, 1)
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        """Block until the service is ready or the timeout expires"""
+        return self._ready_event.wait(timeout)
+
+    def report(self) -> Dict:
+        """Get the startup timing report"""
+        with self._lock:
+            phases = {name: dict(info) for name, info in self.phases.items()}
+
+        if self.is_ready:
+            status = 'ready'
+        elif self.error:
+            status = 'failed'
+        else:
+            status = 'starting'
+
+        return {
+            'status': status,
+            'started_at': self.started_at_wall.isoformat(),
+            'uptime_ms': round((time.monotonic() - self.started_at) * 1000, 1),
+            'time_to_ready_ms': self.time_to_ready_ms,
+            'phases': phases,
+            'error': self.error
+        }
+
+def _import_modules() -> Dict:
+    """Import the heavy application modules"""
+    from irrigation_controller import IrrigationController
+    from database import IrrigationDatabase
+    from ha_integration import HomeAssistantIntegration
+    return {
+        'IrrigationController': IrrigationController,
+        'IrrigationDatabase': IrrigationDatabase,
+        'HomeAssistantIntegration': HomeAssistantIntegration
+    }
+
+def start_services(tracker: StartupTracker, election=None, data_dir: str = '/data') -> Dict:
+    """Bring up the database, HA client and controller
+
+    The database and Home Assistant client are initialized in parallel since
+    neither depends on the other. If this process wins the leader election it
+    then loads schedules and starts actuation; otherwise it serves the web/API
+    tier and keeps trying to take over in the background.
+    """
+    modules = tracker.run_phase('imports', _import_modules)
+
+    def init_database():
+        return modules['IrrigationDatabase'](os.path.join(data_dir, 'irrigation.db'))
+
+    def init_ha_client():
+        ha = modules['HomeAssistantIntegration'](os.path.join(data_dir, 'ha_commands.db'))
+        # Open the keep-alive connection now so the first actuation doesn't pay for it
+        ha.check_connection()
+        return ha
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='startup') as pool:
+        db_future = pool.submit(tracker.run_phase, 'database', init_database)
+        ha_future = pool.submit(tracker.run_phase, 'ha_client', init_ha_client)
+        db = db_future.result()
+        ha = ha_future.result()
+
+    controller = tracker.run_phase(
+        'controller', modules['IrrigationController'], db=db, ha=ha
+    )
+    
+    if election is None or tracker.run_phase('leader_election', election.try_acquire):
+        controller.become_leader(tracker.run_phase)
+    else:
+        election.wait_for_leadership(controller.become_leader)
+
+    return {'controller': controller, 'ha_integration': ha}
@@ -0,0 +1,100 @@
+"""
+Startup Check
+Starts the add-on against a fixture database and fails if it isn't ready within a time budget
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict
+
+from database import IrrigationDatabase
+from simulator import build_fixture
+
+logger = logging.getLogger(__name__)
+
+# Time to ready allowed on the armv7 boards the add-on targets (Raspberry Pi 3 class);
+# faster hosts can pass a tighter --budget-s
+ARMV7_BUDGET_S = 20.0
+
+def _get_json(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+
+def check(zones: int = 1000, budget_s: float = ARMV7_BUDGET_S, port: int = 18099,
+          timeout_s: float = 120, workdir: str = None) -> Dict:
+    """Time a fresh `python3 main.py` from launch until /health/ready answers 200
+
+    The clock starts before the interpreter does, so imports count against
+    the budget as they do on a real boot. Home Assistant is left unreachable,
+    so the ha_client phase includes a failed connection check.
+    """
+    with tempfile.TemporaryDirectory(prefix='irrigation-startup-', dir=workdir) as data_dir:
+        build_fixture(IrrigationDatabase(os.path.join(data_dir, 'irrigation.db')), zones)
+
+        env = {key: value for key, value in os.environ.items() if key != 'SUPERVISOR_TOKEN'}
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'),
+                   '--port', str(port), '--data-dir', data_dir, '--log-level', 'warning']
+        start = time.monotonic()
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        ready_s = None
+        report = None
+        try:
+            while time.monotonic() - start < timeout_s and process.poll() is None:
+                try:
+                    status, report = _get_json(f'http://127.0.0.1:{port}/health/ready')
+                except (urllib.error.URLError, ConnectionError, OSError):
+                    status = None
+                if status == 200:
+                    ready_s = time.monotonic() - start
+                    break
+                if report and report.get('status') == 'failed':
+                    break
+                time.sleep(0.05)
+        finally:
+            process.terminate()
+            try:
+                _, stderr = process.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                _, stderr = process.communicate()
+
+    return {
+        'zones': zones,
+        'budget_s': budget_s,
+        'ready_s': round(ready_s, 2) if ready_s is not None else None,
+        # From the startup tracker's creation, i.e. after main.py's imports
+        'tracker_time_to_ready_ms': report.get('time_to_ready_ms') if report else None,
+        'phases': report.get('phases') if report else None,
+        'error': (report or {}).get('error') or (None if ready_s is not None
+                                                 else stderr.decode(errors='replace')[-2000:] or 'timed out'),
+        'passed': ready_s is not None and ready_s <= budget_s
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the add-on becomes ready within a time budget')
+    parser.add_argument('--zones', type=int, default=1000, help='Zones (with schedules) in the fixture database')
+    parser.add_argument('--budget-s', type=float, default=ARMV7_BUDGET_S,
+                        help='Allowed seconds from launch to /health/ready (default: the armv7 budget)')
+    parser.add_argument('--port', type=int, default=18099)
+    parser.add_argument('--timeout-s', type=float, default=120, help='Give up waiting after this long')
+    parser.add_argument('--workdir', help='Directory for the scratch data directory (e.g. /dev/shm)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = check(args.zones, args.budget_s, args.port, args.timeout_s, args.workdir)
+    print(json.dumps(report, indent=2))
+    return 0 if report['passed'] else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,333 @@
+"""
+Usage Archive
+Columnar Parquet archive of closed days of water usage, and analytics over it
+"""
+
+import importlib.util
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, time as dt_time, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY_COLUMNS = {
+    'room_type': ['room_type'],
+    'room': ['room_id', 'room_name'],
+    'zone': ['zone_id', 'zone_name', 'room_name'],
+    'plant_count': ['plant_count'],
+    'weekday': ['weekday'],
+    'month': ['year', 'month'],
+    'date': ['date'],
+}
+
+def _local(timestamp: str) -> datetime:
+    """A UTC 'YYYY-MM-DD HH:MM:SS' from SQLite as naive local time"""
+    utc = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return utc.astimezone().replace(tzinfo=None)
+
+def _utc_midnight(day: date) -> str:
+    """Local midnight starting day, as a UTC timestamp comparable with SQLite's"""
+    return datetime.combine(day, dt_time.min).astimezone().astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+class UsageArchive:
+    """Writes closed days of water_usage to Parquet under /data and queries them
+
+    Files are laid out as <root>/year=YYYY/month=MM/YYYY-MM-DD.parquet, one per
+    day, and compacted into a single YYYY-MM.parquet once the month is over so
+    multi-year scans open a few dozen files rather than thousands. Days and
+    weekdays are local, so evening watering lands on the day it happened;
+    `timestamp` stays UTC. The exporter
+    only reads SQLite through a separate read-only connection and keeps its
+    progress in a file beside the archive, so it never writes to the live
+    database.
+    """
+
+    def __init__(self, db_path: str, root: str = '/data/archive/water_usage'):
+        self.db_path = db_path
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        # pyarrow has no wheels for some add-on architectures (e.g. armv7 musl). It is
+        # imported where it's used, so startup doesn't pay for it before the nightly run.
+        return importlib.util.find_spec('pyarrow') is not None
+
+    def _schema(self):
+        import pyarrow as pa
+
+        return pa.schema([
+            ('id', pa.int64()),
+            ('zone_id', pa.string()),
+            ('room_id', pa.string()),
+            ('zone_name', pa.string()),
+            ('room_name', pa.string()),
+            ('room_type', pa.string()),
+            ('plant_count', pa.int32()),
+            ('amount', pa.float64()),
+            ('duration', pa.int32()),
+            ('timestamp', pa.timestamp('s')),
+            ('date', pa.date32()),
+            ('weekday', pa.int8()),
+        ])
+
+    def last_archived_day(self) -> Optional[str]:
+        """Get the most recent archived day"""
+        try:
+            with open(os.path.join(self.root, '_last_day')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _last_archived_id(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.root, '_last_id')) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_marker(self, name: str, value: str):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f'{name}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(value)
+        os.replace(tmp_path, os.path.join(self.root, name))
+
+    def reconcile(self) -> Dict:
+        """Bring archive progress back in line with a database restored from a backup
+
+        A restore rolls water_usage ids back, so progress past the restored
+        table's highest id would skip every new row. Progress is clamped to
+        it; rows that reuse ids of already archived ones are told apart by
+        zone and time when merged.
+        """
+        with self._lock:
+            last_id = self._last_archived_id()
+            if last_id is None:
+                return {'success': True, 'last_id': None}
+            try:
+                conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=10)
+                try:
+                    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM water_usage').fetchone()[0]
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Error reconciling usage archive: {e}")
+                return {'success': False, 'error': str(e)}
+            if max_id < last_id:
+                self._write_marker('_last_id', str(max_id))
+                logger.warning(f"Usage archive progress moved back from row {last_id} to {max_id} after restore")
+            return {'success': True, 'last_id': min(last_id, max_id)}
+
+    def _archive_files(self) -> List[str]:
+        files = []
+        if not os.path.isdir(self.root):
+            return files
+        for dirpath, _, filenames in os.walk(self.root):
+            files.extend(os.path.join(dirpath, f) for f in filenames if f.endswith('.parquet'))
+        return sorted(files)
+
+    def archive_closed_days(self) -> Dict:
+        """Write every closed day not yet archived to Parquet"""
+        if not self.available:
+            return {'success': False, 'error': 'pyarrow is not installed'}
+
+        with self._lock:
+            last_day = self.last_archived_day()
+            last_id = self._last_archived_id()
+            # Progress is kept by row id; archives written before that only have the (UTC) last day
+            if last_id is not None:
+                since, params = 'AND w.id > ?', (_utc_midnight(date.today()), last_id)
+            elif last_day:
+                since, params = "AND w.timestamp >= DATE(?, '+1 day')", (_utc_midnight(date.today()), last_day)
+            else:
+                since, params = '', (_utc_midnight(date.today()),)
+
+            try:
+                conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=10)
+                try:
+                    rows = conn.execute(f'''
+                        SELECT w.id, w.zone_id, w.room_id, z.name, r.name, r.type,
+                               z.plant_count, w.amount, w.duration, w.timestamp
+                        FROM water_usage w
+                        LEFT JOIN zones z ON w.zone_id = z.id
+                        LEFT JOIN rooms r ON w.room_id = r.id
+                        WHERE w.timestamp < ? {since}
+                        ORDER BY w.timestamp
+                    ''', params).fetchall()
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Error reading water usage for archive: {e}")
+                return {'success': False, 'error': str(e)}
+
+            by_day = {}
+            for row in rows:
+                local = _local(row[9])
+                by_day.setdefault(local.date().isoformat(), []).append((*row[:9], row[9], local))
+
+            for day, day_rows in by_day.items():
+                self._write_day(day, day_rows)
+
+            if by_day:
+                # Written after the files; a crash in between re-archives rows, which merging drops
+                self._write_marker('_last_id', str(max(row[0] for row in rows)))
+                self._write_marker('_last_day', max(by_day))
+                self._compact_closed_months()
+                logger.info(f"Archived {len(rows)} water usage rows across {len(by_day)} days")
+            return {'success': True, 'days': sorted(by_day), 'rows': len(rows)}
+
+    def _write_day(self, day: str, rows: List[tuple]):
+        import pyarrow as pa
+
+        timestamps = [datetime.strptime(row[9], '%Y-%m-%d %H:%M:%S') for row in rows]
+        local = [row[10] for row in rows]
+        table = pa.table({
+            'id': [row[0] for row in rows],
+            'zone_id': [row[1] for row in rows],
+            'room_id': [row[2] for row in rows],
+            'zone_name': [row[3] for row in rows],
+            'room_name': [row[4] for row in rows],
+            'room_type': [row[5] for row in rows],
+            'plant_count': [row[6] for row in rows],
+            'amount': [row[7] for row in rows],
+            'duration': [row[8] for row in rows],
+            'timestamp': timestamps,
+            'date': [ts.date() for ts in local],
+            'weekday': [ts.weekday() for ts in local],
+        }, schema=self._schema())
+
+        directory = os.path.join(self.root, f'year={day[:4]}', f'month={day[5:7]}')
+        os.makedirs(directory, exist_ok=True)
+        self._replace(os.path.join(directory, f'{day}.parquet'), [table])
+
+    def _replace(self, path: str, tables: List):
+        """Write tables, merged with any existing file at path and deduplicated, then rename into place
+
+        Readers never see a partial file, and writing the same rows twice,
+        e.g. when a crash interrupted the previous run, leaves them once. Rows
+        are matched by zone and time rather than id, since a restore can hand
+        an archived row's id to a new one.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if os.path.exists(path):
+            tables = [pq.read_table(path, schema=self._schema())] + tables
+        table = pa.concat_tables(tables)
+        seen = set()
+        keep = [not (key in seen or seen.add(key))
+                for key in zip(table['zone_id'].to_pylist(), table['timestamp'].to_pylist())]
+        if not all(keep):
+            table = table.filter(pa.array(keep))
+        # The dot prefix keeps dataset discovery from picking up the temporary file
+        tmp_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.tmp')
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+    def _compact_closed_months(self):
+        """Merge the daily files of finished months into one file per month"""
+        import pyarrow.parquet as pq
+
+        current_month = date.today().strftime('%Y-%m')
+        by_month = {}
+        for path in self._archive_files():
+            name = os.path.basename(path)[:-len('.parquet')]
+            if len(name) == 10 and name[:7] < current_month:
+                by_month.setdefault(name[:7], []).append(path)
+
+        for month, paths in by_month.items():
+            month_path = os.path.join(os.path.dirname(paths[0]), f'{month}.parquet')
+            # Daily files are removed only once the month file holds their rows; if
+            # that is interrupted, the next run merges them again without duplicates
+            self._replace(month_path, [pq.read_table(path, schema=self._schema()) for path in paths])
+            for path in paths:
+                os.remove(path)
+
+    def _live_files(self) -> List[str]:
+        """Archive files to query, leaving out daily files already merged into their month"""
+        files = self._archive_files()
+        months = {os.path.basename(path)[:-len('.parquet')] for path in files}
+        return [path for path in files
+                if not (len(os.path.basename(path)) == len('YYYY-MM-DD.parquet')
+                        and os.path.basename(path)[:7] in months)]
+
+    def query_usage(self, group_by: str = 'room_type', start: Optional[date] = None,
+                    end: Optional[date] = None) -> Dict:
+        """Aggregate archived usage between two dates (inclusive)
+
+        Batches are aggregated as they are scanned from memory-mapped files,
+        so memory stays flat however many years are covered.
+        """
+        if not self.available:
+            return {'success': False, 'error': 'pyarrow is not installed'}
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        from pyarrow import fs as pafs
+
+        if group_by not in GROUP_BY_COLUMNS:
+            return {'success': False, 'error': f"group_by must be one of {sorted(GROUP_BY_COLUMNS)}"}
+        files = self._live_files()
+        if not files:
+            return {'success': True, 'group_by': group_by, 'rows': []}
+
+        keys = GROUP_BY_COLUMNS[group_by]
+        dataset = ds.dataset(
+            files,
+            format='parquet',
+            partitioning='hive',
+            partition_base_dir=self.root,
+            filesystem=pafs.LocalFileSystem(use_mmap=True)
+        )
+
+        condition = None
+        if start:
+            condition = ds.field('year') >= start.year
+            condition &= ds.field('date') >= pa.scalar(start, pa.date32())
+        if end:
+            end_condition = (ds.field('year') <= end.year) & (ds.field('date') <= pa.scalar(end, pa.date32()))
+            condition = end_condition if condition is None else condition & end_condition
+
+        projected = [k for k in keys if k not in ('year', 'month')] + ['amount', 'duration']
+        if group_by == 'month':
+            projected.append('date')
+        scanner = dataset.scanner(columns=projected, filter=condition, batch_size=64 * 1024)
+
+        partials = []
+        for batch in scanner.to_batches():
+            if batch.num_rows == 0:
+                continue
+            table = pa.Table.from_batches([batch])
+            if group_by == 'month':
+                table = table.append_column('year', pc.year(table['date']))
+                table = table.append_column('month', pc.month(table['date']))
+            partials.append(table.group_by(keys).aggregate([
+                ('amount', 'sum'), ('amount', 'count'), ('duration', 'sum')
+            ]))
+
+        if not partials:
+            return {'success': True, 'group_by': group_by, 'rows': []}
+
+        combined = pa.concat_tables(partials).group_by(keys).aggregate([
+            ('amount_sum', 'sum'), ('amount_count', 'sum'), ('duration_sum', 'sum')
+        ]).rename_columns(keys + ['water_used', 'waterings', 'minutes'])
+
+        rows = combined.sort_by([(k, 'ascending') for k in keys]).to_pylist()
+        for row in rows:
+            if 'date' in row and row['date'] is not None:
+                row['date'] = row['date'].isoformat()
+        return {'success': True, 'group_by': group_by, 'rows': rows}
+
+    def get_status(self) -> Dict:
+        """Get a summary of the archive"""
+        files = self._archive_files()
+        return {
+            'available': self.available,
+            'last_day': self.last_archived_day(),
+            'files': len(files),
+            'size_bytes': sum(os.path.getsize(path) for path in files)
+        }
@@ -0,0 +1,12 @@
+"""
+WSGI entry point for running the web/API tier under gunicorn with several workers
+Each worker starts its own services; the leader election picks one to own watering
+"""
+
+import os
+import logging
+from main import app, start_background_services
+
+logging.getLogger().setLevel(getattr(logging, os.getenv('LOG_LEVEL', 'info').upper()))
+
+start_background_services()
@@ -0,0 +1,192 @@
+// Shared data client for the Irrigation dashboard cards
+//
+// Every card on a dashboard talks to the add-on through one client per
+// addon_url: identical in-flight requests are shared, the last zones/status
+// snapshot is cached for a short TTL, and a single Socket.IO connection pushes
+// status updates to all subscribed cards. While that connection is down, or
+// the Socket.IO client couldn't be loaded, the snapshot is polled every TTL.
+
+const DEFAULT_TTL = 10000;
+
+let socketIoLoader = null;
+
+// The add-on serves its own copy of the Socket.IO client, so offline installs
+// and strict CSPs don't depend on a CDN
+function loadSocketIo(addonUrl) {
+    if (window.io) return Promise.resolve(window.io);
+    if (!socketIoLoader) {
+        socketIoLoader = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = `${addonUrl}/vendor/socket.io.js`;
+            script.onload = () => resolve(window.io);
+            script.onerror = () => {
+                socketIoLoader = null;
+                script.remove();
+                reject(new Error('Failed to load Socket.IO client'));
+            };
+            document.head.appendChild(script);
+        });
+    }
+    return socketIoLoader;
+}
+
+class IrrigationDataClient {
+    constructor(addonUrl, options = {}) {
+        this.addonUrl = addonUrl.replace(/\/+$/, '');
+        this.ttl = options.ttl || DEFAULT_TTL;
+        this.snapshot = null;
+        this.fetchedAt = 0;
+        this.error = null;
+        this._inflight = new Map();
+        this._refreshing = null;
+        this._listeners = new Set();
+        this._socket = null;
+        this._pollTimer = null;
+    }
+
+    // GET a JSON endpoint, sharing the request with any identical one already in flight
+    fetchJson(path) {
+        const pending = this._inflight.get(path);
+        if (pending) return pending;
+
+        const request = fetch(`${this.addonUrl}${path}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`${path} returned ${response.status}`);
+                return response.json();
+            })
+            .finally(() => this._inflight.delete(path));
+        this._inflight.set(path, request);
+        return request;
+    }
+
+    // Get the zones/status snapshot, fetching it only when the cache has expired
+    getSnapshot({ force = false } = {}) {
+        if (!force && this.snapshot && Date.now() - this.fetchedAt < this.ttl) {
+            return Promise.resolve(this.snapshot);
+        }
+        if (this._refreshing) return this._refreshing;
+
+        this._refreshing = Promise.all([this.fetchJson('/api/zones'), this.fetchJson('/api/status')])
+            .then(([zones, status]) => {
+                this.snapshot = { zones, status };
+                this.fetchedAt = Date.now();
+                this.error = null;
+                this._notify();
+                return this.snapshot;
+            })
+            .catch(error => {
+                this.error = error;
+                this._notify();
+                throw error;
+            })
+            .finally(() => { this._refreshing = null; });
+        return this._refreshing;
+    }
+
+    // Drop the cached snapshot so the next read goes to the add-on
+    invalidate() {
+        this.fetchedAt = 0;
+    }
+
+    // Register a card callback (snapshot, error); returns an unsubscribe function
+    subscribe(callback) {
+        this._listeners.add(callback);
+        if (this.snapshot || this.error) callback(this.snapshot, this.error);
+        this.getSnapshot().catch(() => {});
+        this._connect();
+
+        return () => {
+            this._listeners.delete(callback);
+            if (this._listeners.size === 0) this._disconnect();
+        };
+    }
+
+    async manualWater(zoneId, duration) {
+        const response = await fetch(`${this.addonUrl}/api/manual-water`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ zone_id: zoneId, duration })
+        });
+        const result = await response.json();
+        if (result.success) {
+            this.invalidate();
+            this.getSnapshot().catch(() => {});
+        }
+        return result;
+    }
+
+    _notify() {
+        for (const callback of this._listeners) {
+            try {
+                callback(this.snapshot, this.error);
+            } catch (error) {
+                console.error('Irrigation card update failed:', error);
+            }
+        }
+    }
+
+    async _connect() {
+        if (this._socket) return;
+        this._socket = 'connecting';
+        try {
+            const io = await loadSocketIo(this.addonUrl);
+            if (this._socket !== 'connecting') return;
+
+            const socket = io(this.addonUrl, { transports: ['websocket'] });
+            socket.on('connect', () => {
+                this._stopPolling();
+                // Anything could have changed while we were disconnected
+                this.getSnapshot({ force: true }).catch(() => {});
+            });
+            // Socket.IO keeps reconnecting by itself; poll until it succeeds
+            socket.on('connect_error', () => this._startPolling());
+            socket.on('disconnect', () => this._startPolling());
+            socket.on('status_update', status => {
+                if (!this.snapshot) return;
+                this.snapshot = { ...this.snapshot, status };
+                this._notify();
+            });
+            this._socket = socket;
+        } catch (error) {
+            if (!this._pollTimer) console.warn('Irrigation live updates unavailable, polling instead:', error);
+            this._socket = null;
+            this._startPolling();
+        }
+    }
+
+    _startPolling() {
+        if (this._pollTimer || this._listeners.size === 0) return;
+        this._pollTimer = setInterval(() => {
+            this.getSnapshot({ force: true }).catch(() => {});
+            // Try the client again in case the add-on was unreachable when it first loaded
+            if (!this._socket) this._connect();
+        }, this.ttl);
+    }
+
+    _stopPolling() {
+        clearInterval(this._pollTimer);
+        this._pollTimer = null;
+    }
+
+    _disconnect() {
+        this._stopPolling();
+        if (this._socket && this._socket !== 'connecting') {
+            this._socket.disconnect();
+        }
+        this._socket = null;
+    }
+}
+
+// Keep the registry on window so cards loaded from different resource URLs
+// (e.g. with a ?v= cache buster) still share one client per add-on
+const clients = window.__irrigationDataClients = window.__irrigationDataClients || new Map();
+
+export function getIrrigationClient(addonUrl, options) {
+    const key = addonUrl.replace(/\/+$/, '');
+    let client = clients.get(key);
+    if (!client) {
+        client = new IrrigationDataClient(key, options);
+        clients.set(key, client);
+    }
+    return client;
+}
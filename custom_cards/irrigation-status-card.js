@@ -1,5 +1,7 @@
 // Irrigation Status Card for Home Assistant Dashboard
 
+import { getIrrigationClient } from './irrigation-data-client.js';
+
 class IrrigationStatusCard extends HTMLElement {
     constructor() {
         super();
@@ -10,13 +12,36 @@ class IrrigationStatusCard extends HTMLElement {
         if (!config.addon_url) {
             throw new Error('You need to define addon_url');
         }
+        this._unsubscribe();
         this.config = config;
+        this.client = getIrrigationClient(config.addon_url);
         this.render();
+        if (this.isConnected) this._subscribe();
     }
 
     set hass(hass) {
         this._hass = hass;
-        this.updateCard();
+    }
+
+    connectedCallback() {
+        this._subscribe();
+    }
+
+    disconnectedCallback() {
+        this._unsubscribe();
+    }
+
+    _subscribe() {
+        if (this.client && !this._unsubscribeClient) {
+            this._unsubscribeClient = this.client.subscribe((snapshot, error) => this.updateCard(snapshot, error));
+        }
+    }
+
+    _unsubscribe() {
+        if (this._unsubscribeClient) {
+            this._unsubscribeClient();
+            this._unsubscribeClient = null;
+        }
     }
 
     render() {
@@ -127,59 +152,61 @@ class IrrigationStatusCard extends HTMLElement {
         `;
     }
 
-    async updateCard() {
-        if (!this.config.addon_url) return;
+    updateCard(snapshot, error) {
+        const content = this.shadowRoot.getElementById('content');
+        if (!snapshot) {
+            if (error) content.innerHTML = `<div class="error">Error loading irrigation status</div>`;
+            return;
+        }
 
-        try {
-            const response = await fetch(`${this.config.addon_url}/api/status`);
-            const status = await response.json();
-            
-            const content = this.shadowRoot.getElementById('content');
-            content.innerHTML = `
-                <div class="status-grid">
-                    <div class="status-item">
-                        <div class="status-value">${status.active_zones.length}</div>
-                        <div class="status-label">Active Zones</div>
-                    </div>
-                    <div class="status-item">
-                        <div class="status-value">${status.water_usage_today.toFixed(1)}L</div>
-                        <div class="status-label">Water Today</div>
-                    </div>
-                    <div class="status-item">
-                        <div class="status-value">${status.system_active ? 'ON' : 'OFF'}</div>
-                        <div class="status-label">System Status</div>
-                    </div>
+        const status = snapshot.status;
+        const zoneNames = new Map(snapshot.zones.map(zone => [zone.id, zone.name]));
+        content.innerHTML = `
+            <div class="status-grid">
+                <div class="status-item">
+                    <div class="status-value">${status.active_zones.length}</div>
+                    <div class="status-label">Active Zones</div>
                 </div>
-                
-                ${status.active_zones.length > 0 ? `
-                    <div class="active-zones">
-                        <h4>Active Watering</h4>
-                        ${status.active_zones.map(zone => `
-                            <div class="zone-item">
-                                <span>Zone ${zone}</span>
-                                <span>Watering...</span>
-                            </div>
-                        `).join('')}
-                    </div>
-                ` : ''}
-                
-                <div class="controls">
-                    <button class="btn btn-primary" onclick="window.open('${this.config.addon_url}', '_blank')">
-                        Open Controller
-                    </button>
-                    <button class="btn btn-secondary" onclick="this.refreshStatus()">
-                        Refresh
-                    </button>
+                <div class="status-item">
+                    <div class="status-value">${status.water_usage_today.toFixed(1)}L</div>
+                    <div class="status-label">Water Today</div>
                 </div>
-            `;
-        } catch (error) {
-            const content = this.shadowRoot.getElementById('content');
-            content.innerHTML = `<div class="error">Error loading irrigation status</div>`;
-        }
+                <div class="status-item">
+                    <div class="status-value">${status.system_active ? 'ON' : 'OFF'}</div>
+                    <div class="status-label">System Status</div>
+                </div>
+            </div>
+            
+            ${status.active_zones.length > 0 ? `
+                <div class="active-zones">
+                    <h4>Active Watering</h4>
+                    ${status.active_zones.map(zone => `
+                        <div class="zone-item">
+                            <span>${zoneNames.get(zone) || `Zone ${zone}`}</span>
+                            <span>Watering...</span>
+                        </div>
+                    `).join('')}
+                </div>
+            ` : ''}
+            
+            <div class="controls">
+                <button class="btn btn-primary" id="open-button">
+                    Open Controller
+                </button>
+                <button class="btn btn-secondary" id="refresh-button">
+                    Refresh
+                </button>
+            </div>
+        `;
+
+        this.shadowRoot.getElementById('open-button')
+            .addEventListener('click', () => window.open(this.config.addon_url, '_blank'));
+        this.shadowRoot.getElementById('refresh-button')
+            .addEventListener('click', () => this.refreshStatus());
     }
 
     refreshStatus() {
-        this.updateCard();
+        this.client.getSnapshot({ force: true }).catch(() => {});
     }
 
     getCardSize() {
@@ -1,5 +1,7 @@
 // Irrigation Zone Control Card for Home Assistant Dashboard
 
+import { getIrrigationClient } from './irrigation-data-client.js';
+
 class IrrigationZoneCard extends HTMLElement {
     constructor() {
         super();
@@ -13,13 +15,36 @@ class IrrigationZoneCard extends HTMLElement {
         if (!config.zone_id) {
             throw new Error('You need to define zone_id');
         }
+        this._unsubscribe();
         this.config = config;
+        this.client = getIrrigationClient(config.addon_url);
         this.render();
+        if (this.isConnected) this._subscribe();
     }
 
     set hass(hass) {
         this._hass = hass;
-        this.updateCard();
+    }
+
+    connectedCallback() {
+        this._subscribe();
+    }
+
+    disconnectedCallback() {
+        this._unsubscribe();
+    }
+
+    _subscribe() {
+        if (this.client && !this._unsubscribeClient) {
+            this._unsubscribeClient = this.client.subscribe((snapshot, error) => this.updateCard(snapshot, error));
+        }
+    }
+
+    _unsubscribe() {
+        if (this._unsubscribeClient) {
+            this._unsubscribeClient();
+            this._unsubscribeClient = null;
+        }
     }
 
     render() {
@@ -202,32 +227,21 @@ class IrrigationZoneCard extends HTMLElement {
         `;
     }
 
-    async updateCard() {
-        if (!this.config.addon_url || !this.config.zone_id) return;
-
-        try {
-            // Get zone information
-            const zonesResponse = await fetch(`${this.config.addon_url}/api/zones`);
-            const zones = await zonesResponse.json();
-            const zone = zones.find(z => z.id === this.config.zone_id);
-
-            if (!zone) {
-                throw new Error('Zone not found');
-            }
+    updateCard(snapshot, error) {
+        const content = this.shadowRoot.getElementById('content');
+        if (!snapshot) {
+            if (error) content.innerHTML = `<div class="error">Error loading zone information</div>`;
+            return;
+        }
 
-            // Get system status
-            const statusResponse = await fetch(`${this.config.addon_url}/api/status`);
-            const status = await statusResponse.json();
-            
-            const isWatering = status.active_zones.includes(this.config.zone_id);
-            
-            this.updateDisplay(zone, isWatering);
-            
-        } catch (error) {
-            console.error('Error updating irrigation zone card:', error);
-            const content = this.shadowRoot.getElementById('content');
-            content.innerHTML = `<div class="error">Error loading zone information</div>`;
+        const zone = snapshot.zones.find(z => z.id === this.config.zone_id);
+        if (!zone) {
+            content.innerHTML = `<div class="error">Zone not found</div>`;
+            return;
         }
+
+        const isWatering = snapshot.status.active_zones.includes(this.config.zone_id);
+        this.updateDisplay(zone, isWatering);
     }
 
     updateDisplay(zone, isWatering) {
@@ -265,7 +279,7 @@ class IrrigationZoneCard extends HTMLElement {
                     Currently watering...
                 </div>
                 <div class="controls">
-                    <button class="btn btn-stop" onclick="this.stopWatering()">
+                    <button class="btn btn-stop" id="stop-button">
                         <ha-icon icon="mdi:stop"></ha-icon>
                         Stop
                     </button>
@@ -275,7 +289,7 @@ class IrrigationZoneCard extends HTMLElement {
                     <input type="number" class="duration-input" id="duration-input" 
                            value="${this.config.default_duration || 2}" 
                            min="1" max="60" placeholder="Minutes">
-                    <button class="btn btn-water" onclick="this.startWatering()" 
+                    <button class="btn btn-water" id="water-button"
                             ${!zone.active ? 'disabled' : ''}>
                         <ha-icon icon="mdi:play"></ha-icon>
                         Water
@@ -283,6 +297,11 @@ class IrrigationZoneCard extends HTMLElement {
                 </div>
             `}
         `;
+
+        const waterButton = this.shadowRoot.getElementById('water-button');
+        if (waterButton) waterButton.addEventListener('click', () => this.startWatering());
+        const stopButton = this.shadowRoot.getElementById('stop-button');
+        if (stopButton) stopButton.addEventListener('click', () => this.stopWatering());
     }
 
     async startWatering() {
@@ -290,22 +309,8 @@ class IrrigationZoneCard extends HTMLElement {
         const duration = parseInt(durationInput.value) || 2;
 
         try {
-            const response = await fetch(`${this.config.addon_url}/api/manual-water`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    zone_id: this.config.zone_id,
-                    duration: duration
-                })
-            });
-
-            const result = await response.json();
-            if (result.success) {
-                // Update display immediately
-                setTimeout(() => this.updateCard(), 500);
-            } else {
+            const result = await this.client.manualWater(this.config.zone_id, duration);
+            if (!result.success) {
                 console.error('Failed to start watering:', result.error);
             }
         } catch (error) {
@@ -316,7 +321,7 @@ class IrrigationZoneCard extends HTMLElement {
     async stopWatering() {
         // This would require an API endpoint to stop watering
         // For now, just refresh the card
-        this.updateCard();
+        this.client.getSnapshot({ force: true }).catch(() => {});
     }
 
     getCardSize() {
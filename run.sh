@@ -2,11 +2,27 @@
 
 # Get configuration
 LOG_LEVEL=$(bashio::config 'log_level')
+WORKERS=$(bashio::config 'workers' 1)
+export READ_CONCURRENCY=$(bashio::config 'read_concurrency' 4)
+export ACTUATION_WORKERS=$(bashio::config 'actuation_workers' 4)
+export SQLITE_CACHE_KIB=$(bashio::config 'sqlite_cache_kib' 512)
+export BACKUP_KEEP=$(bashio::config 'backup_keep' 7)
+export BACKUP_COMPRESS=$(bashio::config 'backup_compress' true)
 
 bashio::log.info "Starting Smart Irrigation Controller..."
 bashio::log.info "Log level: ${LOG_LEVEL}"
 bashio::log.info "Using ingress on port 8099"
 
-# Start the irrigation controller
 cd /app
-python3 main.py --log-level="${LOG_LEVEL}"
\ No newline at end of file
+
+if [ "${WORKERS}" -gt 1 ]; then
+    # Local broker so Socket.IO events reach clients on every worker
+    bashio::log.info "Starting ${WORKERS} web workers with local Redis message queue"
+    redis-server --bind 127.0.0.1 --port 6379 --save '' --appendonly no --daemonize yes
+    export SOCKETIO_MESSAGE_QUEUE="redis://127.0.0.1:6379/0"
+    export LOG_LEVEL
+    exec gunicorn --workers "${WORKERS}" --threads 32 --bind 0.0.0.0:8099 wsgi:app
+fi
+
+# Start the irrigation controller
+python3 main.py --log-level="${LOG_LEVEL}"
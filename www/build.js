@@ -0,0 +1,81 @@
+#!/usr/bin/env node
+/*
+ * Static asset build
+ * Minifies src/ into content-hashed bundles under static/dist with
+ * precompressed .gz and .br siblings and a manifest.json for Flask.
+ * Vendored browser libraries are copied in the same way, so the UI and the
+ * dashboard cards load them from the add-on rather than a CDN.
+ */
+
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const zlib = require('zlib');
+const { minify } = require('terser');
+const CleanCSS = require('clean-css');
+
+const SRC_DIR = path.join(__dirname, 'src');
+const OUT_DIR = path.join(__dirname, 'static', 'dist');
+const ASSETS = ['js/app.js', 'css/style.css'];
+// Already minified; served under the name on the left
+const VENDOR = {
+    'js/socket.io.js': require.resolve('socket.io-client/dist/socket.io.min.js')
+};
+
+async function minifyAsset(name, source) {
+    if (name.endsWith('.js')) {
+        // Top-level names stay intact: the templates call them from onclick handlers
+        const result = await minify(source, { compress: true, mangle: true });
+        return result.code;
+    }
+    const result = new CleanCSS({ level: 2 }).minify(source);
+    if (result.errors.length) {
+        throw new Error(`${name}: ${result.errors.join(', ')}`);
+    }
+    return result.styles;
+}
+
+function writeAsset(manifest, name, contents) {
+    const outName = hashedName(name, contents);
+    const outPath = path.join(OUT_DIR, outName);
+
+    fs.mkdirSync(path.dirname(outPath), { recursive: true });
+    fs.writeFileSync(outPath, contents);
+    fs.writeFileSync(`${outPath}.gz`, zlib.gzipSync(contents, { level: 9 }));
+    fs.writeFileSync(`${outPath}.br`, zlib.brotliCompressSync(contents, {
+        params: { [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY }
+    }));
+
+    manifest[name] = outName;
+    return outName;
+}
+
+function hashedName(name, contents) {
+    const hash = crypto.createHash('sha256').update(contents).digest('hex').slice(0, 12);
+    const ext = path.extname(name);
+    return `${name.slice(0, -ext.length)}.${hash}${ext}`;
+}
+
+async function build() {
+    fs.rmSync(OUT_DIR, { recursive: true, force: true });
+    const manifest = {};
+
+    for (const name of ASSETS) {
+        const source = fs.readFileSync(path.join(SRC_DIR, name), 'utf8');
+        const contents = Buffer.from(await minifyAsset(name, source));
+        const outName = writeAsset(manifest, name, contents);
+        console.log(`${name} -> ${outName} (${source.length} -> ${contents.length} bytes)`);
+    }
+
+    for (const [name, file] of Object.entries(VENDOR)) {
+        const contents = fs.readFileSync(file);
+        console.log(`${name} -> ${writeAsset(manifest, name, contents)} (vendored, ${contents.length} bytes)`);
+    }
+
+    fs.writeFileSync(path.join(OUT_DIR, 'manifest.json'), JSON.stringify(manifest, null, 2));
+}
+
+build().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
@@ -1,13 +1,17 @@
 // Smart Irrigation Controller JavaScript
 
-// Initialize Socket.IO connection
-const socket = io();
+// Initialize Socket.IO connection. WebSocket-only so any web worker can
+// serve the connection without sticky sessions.
+const socket = io({ transports: ['websocket'] });
 
 // Global variables
 let rooms = [];
 let zones = [];
 let schedules = [];
-let entities = [];
+
+// Entity search returns one page of matches; the server holds the full index
+const ENTITY_PAGE_SIZE = 20;
+const ENTITY_SEARCH_DELAY_MS = 200;
 
 
 
@@ -20,7 +24,7 @@ window.manualWater = manualWater;
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Smart Irrigation Controller JavaScript loaded');
-    loadData();
+    waitForReady().then(loadData);
     setupSocketListeners();
     setupEventListeners();
     
@@ -53,6 +57,30 @@ function setupEventListeners() {
             }
         });
     });
+
+    // Search entities as the user types in the zone form
+    document.querySelectorAll('.entity-search').forEach(input => {
+        let timer = null;
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(() => searchEntities(input.value, input.list), ENTITY_SEARCH_DELAY_MS);
+        });
+    });
+}
+
+// Wait for the controller to finish starting up before loading data
+async function waitForReady() {
+    while (true) {
+        try {
+            const response = await fetch('/health/ready');
+            if (response.ok) {
+                return;
+            }
+        } catch (error) {
+            console.error('Error checking readiness:', error);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
 }
 
 // Load initial data
@@ -134,16 +162,25 @@ async function loadDetailedStats() {
     }
 }
 
-// Load Home Assistant entities
+// Load the first page of Home Assistant entities as initial suggestions
 async function loadEntities() {
+    await Promise.all(
+        Array.from(document.querySelectorAll('.entity-search')).map(input => searchEntities('', input.list))
+    );
+}
+
+// Fill a datalist with the entities matching a query
+async function searchEntities(query, datalist) {
+    if (!datalist) {
+        return;
+    }
     try {
-        const response = await fetch('/api/entities');
+        const params = new URLSearchParams({ q: query.trim(), limit: ENTITY_PAGE_SIZE });
+        const response = await fetch(`/api/entities?${params}`);
         const data = await response.json();
-        entities = data.switches || [];
-        updateEntitySelects();
+        updateEntityOptions(datalist, data.entities || []);
     } catch (error) {
-        console.error('Error loading entities:', error);
-        entities = [];
+        console.error('Error searching entities:', error);
     }
 }
 
@@ -388,17 +425,9 @@ function updateZoneSelects() {
     });
 }
 
-// Update entity select options
-function updateEntitySelects() {
-    const selects = document.querySelectorAll('#pumpEntity, #solenoidEntity');
-    selects.forEach(select => {
-        const currentValue = select.value;
-        select.innerHTML = '<option value="">Select entity...</option>' +
-            entities.map(entity => `<option value="${entity.id}">${entity.name}</option>`).join('');
-        if (currentValue) {
-            select.value = currentValue;
-        }
-    });
+// Update entity search suggestions
+function updateEntityOptions(datalist, entities) {
+    datalist.innerHTML = entities.map(entity => `<option value="${entity.id}">${entity.name}</option>`).join('');
 }
 
 // Update manual control options